@@ -0,0 +1,307 @@
+"""
+Headless runner: video pipelines and telemetry from a JSON config, without Qt.
+
+    python3 -m omnilink.headless --config relay.json
+    python3 -m omnilink.headless --example > relay.json
+
+SIGHUP re-reads the config and applies telemetry changes to the running router.
+"""
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import json
+import logging
+import queue
+import signal
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from omnilink.process import restart_summary
+from omnilink.telemetry.primer import PrimerSettings
+from omnilink.telemetry.router_config import RouterSettings, parse_targets_with_rules
+from omnilink.telemetry.service import RouterService, TelemetryConfig
+from omnilink.utils import setup_logging
+from omnilink.video.mediamtx import MediaMtxServer
+from omnilink.video.pipeline import Rendition
+from omnilink.video.service import (
+    EVENT_EXITED,
+    EVENT_MODE,
+    EVENT_RESTARTED,
+    EVENT_RESTARTING,
+    EVENT_STARTUP_FAILED,
+    EVENT_STREAM_READY,
+    PipelineManager,
+    VideoConfig,
+)
+
+log = logging.getLogger("omnilink.headless")
+
+STATUS_INTERVAL_S = 30.0
+
+# Name of the pipeline built from the "video" section; its ffmpeg log stays ffmpeg.log.
+VIDEO_PIPELINE = "video"
+# Event sources of the main loop, not usable as pipeline names.
+RESERVED_NAMES = {"main", "telemetry", MediaMtxServer.NAME}
+
+
+def _build(cls, data: Dict[str, Any], section: str):
+    names = {f.name for f in dataclasses.fields(cls)}
+    unknown = sorted(set(data) - names)
+    if unknown:
+        raise ValueError(f"{section}: kunci tidak dikenal: {', '.join(unknown)}")
+    return cls(**data)
+
+
+def _video_config(data: Dict[str, Any], section: str) -> VideoConfig:
+    data["renditions"] = [_build(Rendition, r, f"{section}.renditions") for r in data.get("renditions") or []]
+    return _build(VideoConfig, data, section)
+
+
+def load_config(data: Dict[str, Any]) -> Tuple[Dict[str, VideoConfig], Optional[TelemetryConfig]]:
+    """
+    {"video": {...VideoConfig fields..., "renditions": [{...Rendition fields...}]},
+     "pipelines": [{"name": "fpv", ...VideoConfig fields...}],
+     "telemetry": {...RouterSettings fields..., "engine", "router_bin", "sudo", "primer": {...}}}
+    A missing section or "enabled": false disables that part. "video" and every entry of
+    "pipelines" run as separate pipelines on one MediaMTX, so they must agree on out_port
+    and mediamtx_bin. Targets may be a list of "IP:PORT [rules]" strings (see
+    parse_targets_with_rules).
+    """
+    unknown = sorted(set(data) - {"video", "pipelines", "telemetry"})
+    if unknown:
+        raise ValueError(f"kunci tidak dikenal: {', '.join(unknown)}")
+
+    video: Dict[str, VideoConfig] = {}
+    v = dict(data.get("video") or {})
+    if v and v.pop("enabled", True):
+        video[VIDEO_PIPELINE] = _video_config(v, "video")
+    for i, raw in enumerate(data.get("pipelines") or []):
+        p = dict(raw)
+        name = str(p.pop("name", "") or f"pipeline{i + 1}")
+        if not p.pop("enabled", True):
+            continue
+        if name in video or name in RESERVED_NAMES:
+            raise ValueError(f"pipelines: nama tidak valid atau duplikat: {name}")
+        video[name] = _video_config(p, f"pipelines.{name}")
+    if len({(c.out_port, c.mediamtx_bin) for c in video.values()}) > 1:
+        raise ValueError("pipelines: out_port dan mediamtx_bin harus sama (satu MediaMTX)")
+
+    telemetry: Optional[TelemetryConfig] = None
+    t = dict(data.get("telemetry") or {})
+    if t and t.pop("enabled", True):
+        service_keys = {f.name for f in dataclasses.fields(TelemetryConfig)} - {"router", "primer"}
+        svc = {k: t.pop(k) for k in list(t) if k in service_keys}
+        primer = _build(PrimerSettings, t.pop("primer", {}) or {}, "telemetry.primer")
+        targets = t.pop("targets", [])
+        if isinstance(targets, list):
+            targets = "\n".join(str(x) for x in targets)
+        router = _build(RouterSettings, t, "telemetry")
+        router.targets, router.target_rules = parse_targets_with_rules(str(targets))
+        telemetry = TelemetryConfig(router=router, primer=primer, **svc)
+    return video, telemetry
+
+
+def example_config() -> Dict[str, Any]:
+    video = dataclasses.asdict(VideoConfig(renditions=[Rendition(path="qgc_low", resolution="854x480", bitrate_kbps=600)]))
+    fpv = dataclasses.asdict(VideoConfig(input_kind="v4l2", device="/dev/video0", out_path="fpv"))
+    fpv = {"name": "fpv", "enabled": False, **fpv}
+    router = dataclasses.asdict(RouterSettings())
+    router.pop("target_rules")
+    router["targets"] = ["127.0.0.1:14550", "127.0.0.1:14551 deny=RAW_IMU rate=ATTITUDE:10"]
+    telemetry = dataclasses.asdict(TelemetryConfig())
+    telemetry.pop("router")
+    telemetry.update(router)
+    return {"video": video, "pipelines": [fpv], "telemetry": telemetry}
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("-c", "--config", help="JSON config file")
+    ap.add_argument("--example", action="store_true", help="print an example config and exit")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    if args.example:
+        json.dump(example_config(), sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return 0
+    if not args.config:
+        ap.error("--config wajib diisi")
+
+    log_path = setup_logging(logging.DEBUG if args.verbose else logging.INFO)
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    logging.getLogger().addHandler(console)
+
+    try:
+        with open(args.config, encoding="utf-8") as f:
+            video_cfgs, tele_cfg = load_config(json.load(f))
+    except (OSError, ValueError) as e:
+        log.error("config %s: %s", args.config, e)
+        return 2
+    if not video_cfgs and tele_cfg is None:
+        log.error("config %s: video dan telemetry tidak aktif", args.config)
+        return 2
+
+    # Everything the services report is handled on this thread.
+    events: "queue.Queue[Tuple[str, str, Any]]" = queue.Queue()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda _s, _f: events.put(("main", "stop", None)))
+    signal.signal(signal.SIGHUP, lambda _s, _f: events.put(("main", "reload", None)))
+
+    video: Optional[PipelineManager] = None
+    active: List[str] = []
+    router: Optional[RouterService] = None
+    try:
+        if tele_cfg is not None:
+            router = RouterService(
+                tele_cfg,
+                on_link_change=lambda up: events.put(("telemetry", "link", up)),
+                on_exit=lambda code: events.put(("telemetry", EVENT_EXITED, code)),
+            )
+            router.start()
+            log.info("telemetry started (%s, tcp server %s)", tele_cfg.engine, router.tcp_server_port)
+        if video_cfgs:
+            first = next(iter(video_cfgs.values()))
+            video = PipelineManager(
+                first.mediamtx_bin, first.out_port,
+                on_event=lambda source, kind, value: events.put((source, kind, value)),
+                auto_restart=all(c.auto_restart for c in video_cfgs.values()),
+            )
+            for name, cfg in video_cfgs.items():
+                video.add(name, cfg, proc_name="ffmpeg" if name == VIDEO_PIPELINE else "")
+                video.start_pipeline(name)
+                active.append(name)
+                for path in cfg.path_names:
+                    log.info("%s started: rtsp://<this-host>:%s/%s", name, cfg.out_port, path)
+    except (ValueError, OSError) as e:
+        log.error("start gagal: %s", e)
+        if video is not None:
+            video.stop()
+        if router is not None:
+            router.stop()
+        return 1
+
+    log.info("running; logs in %s", log_path.parent)
+    code = 0
+    try:
+        while active or router is not None:
+            try:
+                source, kind, value = events.get(timeout=STATUS_INTERVAL_S)
+            except queue.Empty:
+                _log_status(video, router)
+                continue
+            if source == "main":
+                if kind == "reload":
+                    _reload_telemetry(args.config, router)
+                    continue
+                break
+            if source == "telemetry":
+                if kind == "link":
+                    log.info("telemetry RX %s", "detected" if value else "lost")
+                else:
+                    log.error("mavlink-routerd gave up (last exit %s); telemetry stopped", value)
+                    router.stop()
+                    router = None
+                    code = 1
+                continue
+            if source != MediaMtxServer.NAME and source not in active:
+                continue
+            if kind == EVENT_MODE:
+                log.info("%s mode %s (%s)", source, *value)
+            elif kind == EVENT_STREAM_READY:
+                log.info("%s stream live after %.0f ms", source, value)
+            elif kind == EVENT_RESTARTING:
+                log.warning("%s: restarting %s in %.1f s", source, *value)
+            elif kind == EVENT_RESTARTED:
+                log.info("%s: %s restarted (%d)", source, *value)
+            elif kind == EVENT_STARTUP_FAILED:
+                log.error("%s: %s", source, value)
+                if video.pipelines[source].ff is None:
+                    video.stop_pipeline(source)
+                    active.remove(source)
+                    code = 1
+            elif kind == EVENT_EXITED:
+                name, rc = value
+                if source == MediaMtxServer.NAME:
+                    log.error("mediamtx gave up (last exit %s); video stopped", rc)
+                    video.stop()
+                    active.clear()
+                else:
+                    log.error("%s: %s gave up (last exit %s); pipeline stopped", source, name, rc)
+                    video.stop_pipeline(source)
+                    active.remove(source)
+                code = 1
+    finally:
+        if video is not None:
+            video.stop()
+        if router is not None:
+            router.stop()
+        log.info("stopped")
+    return code
+
+
+def _reload_telemetry(path: str, router: Optional[RouterService]) -> None:
+    if router is None:
+        log.warning("reload: telemetry tidak berjalan")
+        return
+    try:
+        with open(path, encoding="utf-8") as f:
+            _video, cfg = load_config(json.load(f))
+        if cfg is None:
+            raise ValueError("telemetry tidak aktif di config")
+        diff = router.reconfigure(cfg)
+    except (OSError, ValueError) as e:
+        log.error("reload gagal: %s", e)
+        return
+    how = "mavlink-routerd restarted" if diff.restart else "live"
+    log.info("telemetry reloaded (%s, %.1f ms): %s", how, diff.switch_s * 1000.0, diff.describe())
+
+
+def _log_status(video: Optional[PipelineManager], router: Optional[RouterService]) -> None:
+    if video is not None:
+        stats = {st.name: st for st in video.stats()}
+        for name, pipe in video.pipelines.items():
+            st = stats.get(name)
+            s = pipe.encoder_stats.latest() if pipe.ff is not None else None
+            if s is None or st is None:
+                continue
+            br = "?" if s.bitrate_kbps is None else f"{s.bitrate_kbps:.0f}"
+            sp = "?" if s.speed is None else f"{s.speed:.2f}x"
+            c = "?" if st.cpu_pct is None else f"{st.cpu_pct:.0f}%"
+            log.info(
+                "%s: %.1f fps, %s kbps, drop %d, dup %d, speed %s, cpu %s",
+                name, s.fps, br, s.drop_frames, s.dup_frames, sp, c,
+            )
+            r = st.recording
+            if r is not None:
+                log.info(
+                    "%s recording: %.0f kbps to disk, queue peak %d kB, dropped %d kB, %d segments, %.0f MB on disk",
+                    name, r.write_kbps, r.queue_peak_bytes // 1024, r.dropped_bytes // 1024,
+                    r.segments, r.disk_bytes / 1e6,
+                )
+                if r.error:
+                    log.warning("%s recording: cannot open segment: %s", name, r.error)
+        server_cpu = video.server_cpu_percent()
+        if server_cpu is not None:
+            log.info("mediamtx: cpu %.0f%%", server_cpu)
+        summary = restart_summary(video.restart_stats())
+        if summary:
+            log.info("video restarts: %s", summary)
+    if router is not None:
+        summary = restart_summary(router.restart_stats())
+        if summary:
+            log.info("telemetry restarts: %s", summary)
+        for m in router.link_metrics():
+            log.info(
+                "telemetry sysid %d: %.1f msg/s, loss %.1f%%, crc %.1f%%",
+                m.sysid, m.msgs_per_s, m.loss_pct, m.crc_error_pct,
+            )
+        clients = router.clients()
+        if clients:
+            log.info("telemetry clients: %s", ", ".join(f"{c.address}:{c.port}" for c in clients))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
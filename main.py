@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import signal
 import sys
+import time
+from typing import Set
 
 from PyQt5 import QtCore, QtGui, QtWidgets
 
 from omnilink.telemetry.router_widget import RouterWidget
+from omnilink.utils import setup_logging
 from omnilink.video.widget import VideoWidget
 
 
@@ -36,6 +39,17 @@ class MainWindow(QtWidgets.QMainWindow):
 
         self.statusBar().showMessage("Ready")
 
+        # Start All / Stop All: components still running their async step, and the result line.
+        self._pending: Set[str] = set()
+        self._action = ""
+        self._action_t0 = 0.0
+        self._last_action = ""
+        self._close_when_stopped = False
+        self.video.started.connect(lambda _ok: self._component_done("video"))
+        self.video.stopped.connect(lambda: self._component_done("video"))
+        self.router.started.connect(lambda _ok: self._component_done("router"))
+        self.router.stopped.connect(lambda: self._component_done("router"))
+
         self._ui_timer = QtCore.QTimer(self)
         self._ui_timer.setInterval(900)
         self._ui_timer.timeout.connect(self._refresh_statusbar)
@@ -45,27 +59,63 @@ class MainWindow(QtWidgets.QMainWindow):
     def _refresh_statusbar(self):
         v = "ON" if self.video.is_running() else "OFF"
         r = "ON" if self.router.is_running() else "OFF"
-        self.statusBar().showMessage(f"Video: {v} | Router: {r}")
+        msg = f"Video: {v} | Router: {r}"
+        if self._pending:
+            msg += f" | {self._action}..."
+        elif self._last_action:
+            msg += f" | {self._last_action}"
+        self.statusBar().showMessage(msg)
+
+    def _begin(self, action: str) -> None:
+        self._action = action
+        self._action_t0 = time.monotonic()
+        self._pending = set()
+
+    def _component_done(self, name: str) -> None:
+        if name not in self._pending:
+            return
+        self._pending.discard(name)
+        if self._pending:
+            return
+        self._last_action = f"{self._action}: {(time.monotonic() - self._action_t0) * 1000.0:.0f} ms"
+        self._refresh_statusbar()
+        if self._close_when_stopped:
+            self.close()
 
+    # Both components start/stop concurrently; the total is the slowest one, not the sum.
     def start_all(self):
-        self.router.start()
-        self.video.start_stream()
+        self._begin("Start All")
+        if self.router.start():
+            self._pending.add("router")
+        if self.video.start_stream():
+            self._pending.add("video")
 
     def stop_all(self):
+        self._begin("Stop All")
+        # False means a stop is already in flight; it still reports `stopped`, so wait
+        # for it too (closeEvent must not tear Qt down under it).
         self.video.stop_stream()
         self.router.stop()
+        self._pending |= {"video", "router"}
 
     def closeEvent(self, e: QtGui.QCloseEvent):
-        try:
-            self.stop_all()
-        finally:
+        if self._close_when_stopped and not self._pending:
             e.accept()
+            return
+        # Stop children off the GUI thread, then close once both report back.
+        e.ignore()
+        if not self._close_when_stopped:
+            self._close_when_stopped = True
+            self.stop_all()
+            if not self._pending:
+                e.accept()
 
 
 def main():
     if sys.platform.startswith("linux"):
         signal.signal(signal.SIGINT, signal.SIG_DFL)
 
+    setup_logging()
     app = QtWidgets.QApplication([])
     w = MainWindow()
     w.show()
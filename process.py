@@ -0,0 +1,400 @@
+from __future__ import annotations
+
+import collections
+import logging
+import os
+import random
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Optional
+
+from omnilink.utils import ProcessLogPump
+
+log = logging.getLogger(__name__)
+
+# on_exit(returncode, expected) from the reader thread. expected is True after stop().
+ExitCallback = Callable[[int, bool], None]
+
+STOP_TIMEOUT_S = 1.2
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def _stat_cpu_seconds(path: str) -> Optional[float]:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        # comm (field 2) may contain spaces; utime/stime are fields 14/15.
+        fields = data[data.rindex(b")") + 2:].split()
+        return (int(fields[11]) + int(fields[12])) / CLK_TCK
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of a process from /proc/<pid>/stat, None if it is gone."""
+    return _stat_cpu_seconds(f"/proc/{pid}/stat")
+
+
+def thread_cpu_seconds(tid: int) -> Optional[float]:
+    """CPU time of one thread of this process (threading.Thread.native_id)."""
+    return _stat_cpu_seconds(f"/proc/self/task/{tid}/stat")
+
+
+class CpuMeter:
+    """
+    CPU use of one process between two sample() calls, in percent of one core (may exceed
+    100 for multi-threaded encoders). Starts over when the pid changes.
+    """
+
+    def __init__(self):
+        self._pid: Optional[int] = None
+        self._t = 0.0
+        self._cpu = 0.0
+        self.percent: Optional[float] = None
+
+    def sample(self, pid: Optional[int]) -> Optional[float]:
+        cpu = cpu_seconds(pid) if pid else None
+        now = time.monotonic()
+        if cpu is None:
+            self._pid = None
+            self.percent = None
+        elif pid != self._pid:
+            self._pid, self._t, self._cpu = pid, now, cpu
+            self.percent = None
+        elif now - self._t >= 0.2:
+            self.percent = (cpu - self._cpu) / (now - self._t) * 100.0
+            self._t, self._cpu = now, cpu
+        return self.percent
+
+
+class ManagedProcess:
+    """
+    Qt-free child process: merged stdout/stderr are streamed into a ProcessLogPump by a reader
+    thread, `on_exit` fires once the child is gone, and stop() does terminate -> wait -> kill.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        argv: List[str],
+        log_pump: Optional[ProcessLogPump] = None,
+        on_exit: Optional[ExitCallback] = None,
+        stdin: bool = False,
+    ):
+        self.name = name
+        self.argv = list(argv)
+        self.log_pump = log_pump
+        self.on_exit = on_exit
+        self.stdin = stdin
+        self.returncode: Optional[int] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+        self._stopping = False
+        self._cpu = CpuMeter()
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._proc.pid if self._proc is not None else None
+
+    @property
+    def popen(self) -> Optional[subprocess.Popen]:
+        return self._proc
+
+    def running(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    def cpu_percent(self) -> Optional[float]:
+        """CPU use since the previous call (None on the first call or once the child is gone)."""
+        return self._cpu.sample(self.pid if self.running() else None)
+
+    def start(self) -> None:
+        """
+        Raises OSError if the program cannot be executed. Calling start() again after the
+        child exited runs it again (used by Supervisor).
+        """
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                return
+            if self._reader is not None and self._reader is not threading.current_thread():
+                self._reader.join(1.0)
+        if self.log_pump is not None:
+            self.log_pump.mark(f"start {' '.join(self.argv)}")
+        self._stopping = False
+        self.returncode = None
+        self._proc = subprocess.Popen(
+            self.argv,
+            stdin=subprocess.PIPE if self.stdin else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            close_fds=True,
+        )
+        self._reader = threading.Thread(target=self._read, name=f"omnilink-proc-{self.name}", daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        proc = self._proc
+        fd = proc.stdout.fileno()
+        try:
+            while True:
+                try:
+                    data = os.read(fd, 65536)
+                except OSError:
+                    break
+                if not data:
+                    break
+                if self.log_pump is not None:
+                    self.log_pump.feed(data)
+        finally:
+            code = proc.wait()
+            proc.stdout.close()
+            self.returncode = code
+            if self.log_pump is not None:
+                self.log_pump.mark(f"exit {code}")
+            if self.on_exit is not None:
+                try:
+                    self.on_exit(code, self._stopping)
+                except Exception:
+                    log.exception("%s exit callback failed", self.name)
+
+    def stop(self, timeout: float = STOP_TIMEOUT_S) -> Optional[int]:
+        proc = self._proc
+        if proc is None:
+            return self.returncode
+        self._stopping = True
+        if proc.poll() is None:
+            try:
+                proc.terminate()
+                proc.wait(timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                try:
+                    proc.wait(timeout)
+                except subprocess.TimeoutExpired:
+                    log.warning("%s (pid %s) did not exit after SIGKILL", self.name, proc.pid)
+            except OSError:
+                pass
+        if self._reader is not None and self._reader is not threading.current_thread():
+            self._reader.join(timeout)
+        if proc.stdin is not None:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+        self._proc = None
+        self._reader = None
+        return proc.returncode
+
+
+class AsyncLifecycle(ABC):
+    """
+    Mixin for services with blocking start()/stop(): start_async()/stop_async() run them on a
+    private single worker thread, in call order, so a front end never blocks on process
+    startup or shutdown. The returned Future carries the call's exception, if any;
+    done-callbacks run on the worker thread.
+    """
+
+    _ops: Optional[ThreadPoolExecutor] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._ops is None:
+            self._ops = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"omnilink-{type(self).__name__}")
+        return self._ops
+
+    @abstractmethod
+    def start(self) -> None:
+        ...
+
+    @abstractmethod
+    def stop(self) -> None:
+        ...
+
+    def start_async(self) -> Future:
+        return self._executor().submit(self.start)
+
+    def stop_async(self) -> Future:
+        return self._executor().submit(self.stop)
+
+
+# Supervisor events: on_event(kind, child name, value).
+SUP_RESTARTING = "restarting"    # value: delay in seconds
+SUP_RESTARTED = "restarted"      # value: restart count
+SUP_GAVE_UP = "gave_up"          # value: last exit code (None if it could not be started)
+
+CHILD_RUNNING = "running"
+CHILD_BACKOFF = "backoff"
+CHILD_FAILED = "failed"
+
+
+@dataclass
+class RestartPolicy:
+    initial_s: float = 0.5
+    max_s: float = 30.0
+    factor: float = 2.0
+    # Each delay is scaled by a random factor in [1 - jitter, 1 + jitter].
+    jitter: float = 0.2
+    # Crash-loop limit: give up after `max_restarts` restarts within `window_s`.
+    max_restarts: int = 10
+    window_s: float = 300.0
+    # A child that ran at least this long before exiting starts again from `initial_s`.
+    stable_s: float = 10.0
+
+    def delay(self, failures: int) -> float:
+        base = min(self.max_s, self.initial_s * (self.factor ** max(0, failures)))
+        return max(0.0, base * (1.0 + random.uniform(-self.jitter, self.jitter)))
+
+
+@dataclass
+class ChildStats:
+    name: str
+    state: str
+    restarts: int
+    last_exit_code: Optional[int]
+    downtime_s: float
+    watched_s: float
+
+    @property
+    def availability(self) -> float:
+        return 1.0 - self.downtime_s / self.watched_s if self.watched_s > 0 else 1.0
+
+
+class _Child:
+    def __init__(self, proc: ManagedProcess, now: float):
+        self.proc = proc
+        self.state = CHILD_RUNNING
+        self.watched_at = now
+        self.started_at = now
+        self.down_since: Optional[float] = None
+        self.downtime = 0.0
+        self.restarts = 0
+        self.failures = 0
+        self.last_exit_code: Optional[int] = None
+        self.history: Deque[float] = collections.deque()
+        self.timer: Optional[threading.Timer] = None
+
+
+class Supervisor:
+    """
+    Restarts ManagedProcess children that exit on their own, one child at a time, with
+    jittered exponential backoff. A child restarted `max_restarts` times within `window_s`
+    is given up (SUP_GAVE_UP) and left stopped. Restart counts and downtime (from exit
+    until the replacement process is running) are kept per child for availability figures.
+
+    watch() takes over the child's on_exit callback; unwatch() before stopping a child.
+    """
+
+    def __init__(self, policy: Optional[RestartPolicy] = None, on_event: Optional[Callable[[str, str, object], None]] = None):
+        self.policy = policy or RestartPolicy()
+        self.on_event = on_event
+        self._children: Dict[str, _Child] = {}
+        self._lock = threading.Lock()
+
+    def watch(self, proc: ManagedProcess) -> None:
+        with self._lock:
+            self._children[proc.name] = _Child(proc, time.monotonic())
+        proc.on_exit = lambda code, expected, name=proc.name: self._on_exit(name, code, expected)
+
+    def unwatch(self, name: str) -> None:
+        with self._lock:
+            child = self._children.pop(name, None)
+        if child is not None and child.timer is not None:
+            child.timer.cancel()
+
+    def clear(self) -> None:
+        for name in list(self._children):
+            self.unwatch(name)
+
+    def stats(self) -> List[ChildStats]:
+        now = time.monotonic()
+        out: List[ChildStats] = []
+        with self._lock:
+            for name, c in self._children.items():
+                down = c.downtime + (now - c.down_since if c.down_since is not None else 0.0)
+                out.append(ChildStats(name, c.state, c.restarts, c.last_exit_code, down, now - c.watched_at))
+        return out
+
+    def _emit(self, kind: str, name: str, value: object) -> None:
+        if self.on_event is not None:
+            try:
+                self.on_event(kind, name, value)
+            except Exception:
+                log.exception("supervisor event callback failed")
+
+    def _on_exit(self, name: str, code: Optional[int], expected: bool) -> None:
+        if expected:
+            return
+        now = time.monotonic()
+        p = self.policy
+        with self._lock:
+            c = self._children.get(name)
+            if c is None:
+                return
+            c.last_exit_code = code
+            if c.down_since is None:
+                c.down_since = now
+            if now - c.started_at >= p.stable_s:
+                c.failures = 0
+            while c.history and now - c.history[0] > p.window_s:
+                c.history.popleft()
+            if len(c.history) >= p.max_restarts:
+                c.state = CHILD_FAILED
+                give_up = True
+            else:
+                give_up = False
+                c.state = CHILD_BACKOFF
+                delay = p.delay(c.failures)
+                c.failures += 1
+                c.timer = threading.Timer(delay, self._restart, args=(name, c))
+                c.timer.daemon = True
+                c.timer.start()
+        if give_up:
+            log.error("%s: giving up after %d restarts in %.0f s", name, len(c.history), p.window_s)
+            self._emit(SUP_GAVE_UP, name, code)
+        else:
+            log.warning("%s exited with %s, restarting in %.2f s", name, code, delay)
+            self._emit(SUP_RESTARTING, name, delay)
+
+    def _restart(self, name: str, c: _Child) -> None:
+        with self._lock:
+            if self._children.get(name) is not c:
+                return
+            c.timer = None
+            c.history.append(time.monotonic())
+            c.restarts += 1
+        try:
+            c.proc.start()
+        except OSError as e:
+            log.warning("%s restart failed: %s", name, e)
+            self._on_exit(name, None, False)
+            return
+        now = time.monotonic()
+        with self._lock:
+            stale = self._children.get(name) is not c
+            if not stale:
+                c.state = CHILD_RUNNING
+                c.started_at = now
+                if c.down_since is not None:
+                    c.downtime += now - c.down_since
+                    c.down_since = None
+        if stale:
+            # Unwatched (owner stopping) while it was being started: the owner's stop() may
+            # already have run, so do not leave the new process behind.
+            c.proc.stop()
+            return
+        self._emit(SUP_RESTARTED, name, c.restarts)
+
+
+def restart_summary(stats: List[ChildStats]) -> str:
+    """
+    "ffmpeg 2x, 99.4% up" style text for status labels and logs; "" while nothing restarted.
+    """
+    restarted = [s for s in stats if s.restarts or s.state != CHILD_RUNNING]
+    if not restarted:
+        return ""
+    parts = [f"{s.name} {s.restarts}x" for s in restarted]
+    avail = min(s.availability for s in stats) * 100.0
+    return f"{', '.join(parts)}, {avail:.1f}% up"
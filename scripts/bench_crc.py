@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+X.25 CRC micro-benchmark: per-byte bit math vs table lookup vs batch.
+
+Run from the directory containing the omnilink package:
+    python3 -m omnilink.scripts.bench_crc --frames 20000
+"""
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import os
+import random
+import time
+from typing import Callable, List
+
+from omnilink.telemetry.mavlink_utils import (
+    CRC_EXTRA,
+    x25_crc_accumulate,
+    x25_crc_accumulate_buf,
+    x25_crc_batch,
+    x25_crc_init,
+)
+
+
+def crc_bitwise(data) -> int:
+    # Pre-table implementation: one function call with bit math per byte.
+    crc = x25_crc_init()
+    for bb in data:
+        crc = x25_crc_accumulate(crc, bb)
+    return crc
+
+
+def make_frames(count: int, seed: int) -> tuple[bytes, List[int], List[int], List[int]]:
+    """
+    Packed buffer of MAVLink v2 frames with realistic payload sizes. Returns the buffer and,
+    per frame, the offset/length of the checksummed range (header after STX + payload) and CRC_EXTRA.
+    """
+    rnd = random.Random(seed)
+    sizes = {30: 28, 27: 26, 33: 28, 0: 9, 74: 20, 1: 31, 253: 51}
+    msgids = list(sizes)
+    buf = bytearray()
+    offsets: List[int] = []
+    lengths: List[int] = []
+    extras: List[int] = []
+    for seq in range(count):
+        msgid = rnd.choice(msgids)
+        plen = sizes[msgid]
+        header = bytes([plen, 0, 0, seq & 0xFF, 1, 1, msgid & 0xFF, 0, 0])
+        payload = os.urandom(plen)
+        start = len(buf)
+        buf += b"\xfd" + header + payload + b"\x00\x00"
+        offsets.append(start + 1)
+        lengths.append(len(header) + plen)
+        extras.append(CRC_EXTRA[msgid])
+    return bytes(buf), offsets, lengths, extras
+
+
+def run_single(fn: Callable, buf: bytes, offsets, lengths, extras) -> List[int]:
+    mv = memoryview(buf)
+    out = []
+    for off, ln, ex in zip(offsets, lengths, extras):
+        crc = fn(mv[off:off + ln]) if fn is crc_bitwise else fn(x25_crc_init(), mv[off:off + ln])
+        out.append(x25_crc_accumulate(crc, ex))
+    return out
+
+
+def timed(label: str, count: int, fn: Callable[[], List[int]], repeat: int) -> List[int]:
+    best = float("inf")
+    result: List[int] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"{label:<28} {count / best:>14,.0f} frames/s  ({best * 1000:.1f} ms)")
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--frames", type=int, default=20000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    buf, offsets, lengths, extras = make_frames(args.frames, args.seed)
+    n = args.frames
+
+    ref = timed("bitwise (per-byte call)", n, lambda: run_single(crc_bitwise, buf, offsets, lengths, extras), args.repeat)
+    tab = timed("table", n, lambda: run_single(x25_crc_accumulate_buf, buf, offsets, lengths, extras), args.repeat)
+    bat = timed("batch", n, lambda: x25_crc_batch(buf, offsets, lengths, extras), args.repeat)
+
+    if importlib.util.find_spec("numpy") is None:
+        print("batch backend: table loop (numpy not installed)")
+    else:
+        print("batch backend: numpy")
+
+    if tab != ref or bat != ref:
+        raise SystemExit("CRC mismatch between implementations")
+    print("outputs identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Fan-out cost benchmark: N unicast targets vs one multicast group with N listeners.
+
+The built-in router engine forwards a paced MAVLink stream; the CPU time of its thread
+per input frame is reported together with the share of frames every listener received.
+Unicast cost grows with N, multicast cost should stay flat.
+
+Run from the directory containing the omnilink package:
+    python3 -m omnilink.scripts.bench_multicast --listeners 1,4,16,32
+"""
+from __future__ import annotations
+
+import argparse
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import List, Tuple
+
+from omnilink.process import thread_cpu_seconds
+from omnilink.telemetry.mavlink_utils import CRC_EXTRA, x25_crc_accumulate, x25_crc_accumulate_buf, x25_crc_init
+from omnilink.telemetry.multicast import open_multicast_receiver
+from omnilink.telemetry.router_config import RouterSettings
+from omnilink.telemetry.router_engine import RouterEngine
+
+ATTITUDE = 30
+
+
+def attitude_frame(seq: int) -> bytes:
+    header = bytes([0xFD, 28, 0, 0, seq & 0xFF, 1, 1, ATTITUDE, 0, 0])
+    body = header + bytes(28)
+    crc = x25_crc_accumulate(x25_crc_accumulate_buf(x25_crc_init(), body[1:]), CRC_EXTRA[ATTITUDE])
+    return body + struct.pack("<H", crc)
+
+
+class Drain(threading.Thread):
+    """Reads every receiver socket so none overflows; counts datagrams per socket."""
+
+    def __init__(self, socks: List[socket.socket]):
+        super().__init__(daemon=True)
+        self.socks = socks
+        self.counts = [0] * len(socks)
+        self.stop_evt = threading.Event()
+
+    def run(self) -> None:
+        sel = selectors.DefaultSelector()
+        for i, s in enumerate(self.socks):
+            s.setblocking(False)
+            sel.register(s, selectors.EVENT_READ, i)
+        while not self.stop_evt.is_set():
+            for key, _ev in sel.select(0.1):
+                try:
+                    while True:
+                        key.fileobj.recv(2048)
+                        self.counts[key.data] += 1
+                except BlockingIOError:
+                    pass
+        sel.close()
+
+
+def run_case(mode: str, listeners: int, frames: int, rate: float, base_port: int, group: str) -> Tuple[float, float]:
+    """Returns (router CPU microseconds per input frame, minimum delivery % over listeners)."""
+    if mode == "unicast":
+        socks = []
+        for i in range(listeners):
+            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            s.bind(("127.0.0.1", base_port + 1 + i))
+            socks.append(s)
+        targets = [("127.0.0.1", base_port + 1 + i) for i in range(listeners)]
+    else:
+        socks = [open_multicast_receiver(group, base_port + 1) for _ in range(listeners)]
+        targets = [(group, base_port + 1)]
+    for s in socks:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+
+    engine = RouterEngine(RouterSettings(listen_port=base_port, tcp_server_port=0, targets=targets))
+    engine.start()
+    drain = Drain(socks)
+    drain.start()
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    pkts = [attitude_frame(i) for i in range(256)]
+    try:
+        tid = engine._thread.native_id
+        cpu0 = thread_cpu_seconds(tid) or 0.0
+        t0 = time.perf_counter()
+        for i in range(frames):
+            tx.sendto(pkts[i & 0xFF], ("127.0.0.1", base_port))
+            due = t0 + (i + 1) / rate
+            while time.perf_counter() < due:
+                pass
+        time.sleep(0.3)
+        cpu = (thread_cpu_seconds(tid) or 0.0) - cpu0
+    finally:
+        drain.stop_evt.set()
+        drain.join()
+        engine.stop()
+        tx.close()
+        for s in socks:
+            s.close()
+    return cpu / frames * 1e6, min(drain.counts) * 100.0 / frames
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--listeners", default="1,4,16,32", help="comma separated listener counts")
+    ap.add_argument("--frames", type=int, default=5000)
+    ap.add_argument("--rate", type=float, default=2000.0, help="input frames per second")
+    ap.add_argument("--port", type=int, default=24550, help="router listen port; targets use the ports above it")
+    ap.add_argument("--group", default="239.255.14.55")
+    args = ap.parse_args()
+
+    print(f"{'listeners':>9}  {'unicast us/frame':>16}  {'delivered':>9}  {'multicast us/frame':>18}  {'delivered':>9}")
+    for n in [int(x) for x in args.listeners.split(",") if x.strip()]:
+        uc, ud = run_case("unicast", n, args.frames, args.rate, args.port, args.group)
+        mc, md = run_case("multicast", n, args.frames, args.rate, args.port, args.group)
+        print(f"{n:>9}  {uc:>16.1f}  {ud:>8.1f}%  {mc:>18.1f}  {md:>8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
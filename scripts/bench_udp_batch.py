@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+UDP fan-out benchmark for the built-in router: per-datagram asyncio sockets (naive)
+vs recvmmsg/sendmmsg batching, on loopback.
+
+A sender process offers timestamped MAVLink frames to the router's listen port at each
+rate and one process per target receives them; forwarded packets/s, loss, p50/p99 forwarding
+latency and router thread CPU per input frame are reported for both modes.
+
+Run from the directory containing the omnilink package:
+    python3 -m omnilink.scripts.bench_udp_batch --targets 4 --rates 2000,10000,40000
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import socket
+import struct
+import time
+from typing import Dict, List
+
+from omnilink.process import thread_cpu_seconds
+from omnilink.telemetry.batch_io import HAVE_MMSG
+from omnilink.telemetry.router_config import RouterSettings
+from omnilink.telemetry.router_engine import RouterEngine
+
+# Vendor-range msgid without CRC_EXTRA: the router's parser does not checksum it.
+BENCH_MSGID = 42000
+PAYLOAD_LEN = 28
+STAMP = struct.Struct("<Q")
+
+
+def bench_frame(seq: int, stamp_ns: int) -> bytes:
+    header = bytes([0xFD, PAYLOAD_LEN, 0, 0, seq & 0xFF, 1, 1,
+                    BENCH_MSGID & 0xFF, (BENCH_MSGID >> 8) & 0xFF, BENCH_MSGID >> 16])
+    return header + STAMP.pack(stamp_ns) + bytes(PAYLOAD_LEN - STAMP.size) + b"\0\0"
+
+
+def percentile(values: List[int], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100.0 * len(values)))]
+
+
+def sink_worker(port: int, stop, ready, out) -> None:
+    """One process per target so receiving is never the bottleneck being measured."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+    s.bind(("127.0.0.1", port))
+    s.settimeout(0.05)
+    ready.set()
+    buf = bytearray(2048)
+    latencies: List[int] = []
+    off = 10
+    while True:
+        try:
+            s.recv_into(buf)
+        except socket.timeout:
+            if stop.is_set():
+                break
+            continue
+        latencies.append(time.perf_counter_ns() - STAMP.unpack_from(buf, off)[0])
+    out.put(latencies)
+
+
+def send_worker(listen_port: int, rate: float, duration: float, out) -> None:
+    tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    dest = ("127.0.0.1", listen_port)
+    sent = 0
+    t0 = time.perf_counter()
+    end = t0 + duration
+    # Paced in 1 ms slots so the offered rate holds without a busy loop per frame.
+    while True:
+        now = time.perf_counter()
+        if now >= end:
+            break
+        due = int((now - t0) * rate)
+        while sent < due:
+            tx.sendto(bench_frame(sent, time.perf_counter_ns()), dest)
+            sent += 1
+        time.sleep(0.001)
+    out.put(sent)
+
+
+def run_case(batch: bool, rate: float, targets: int, duration: float, port: int) -> Dict[str, float]:
+    target_ports = [port + 1 + i for i in range(targets)]
+    settings = RouterSettings(
+        listen_port=port,
+        tcp_server_port=0,
+        targets=[("127.0.0.1", p) for p in target_ports],
+        batch_io=batch,
+    )
+    ctx = multiprocessing.get_context("spawn")
+    stop = ctx.Event()
+    out = ctx.Queue()
+    sinks = []
+    for p in target_ports:
+        ready = ctx.Event()
+        proc = ctx.Process(target=sink_worker, args=(p, stop, ready, out))
+        proc.start()
+        ready.wait(10)
+        sinks.append(proc)
+    engine = RouterEngine(settings)
+    engine.start()
+    try:
+        tid = engine._thread.native_id
+        cpu0 = thread_cpu_seconds(tid) or 0.0
+        sender = ctx.Process(target=send_worker, args=(port, rate, duration, out))
+        sender.start()
+        sent = out.get(timeout=duration + 30)
+        sender.join(5)
+        time.sleep(0.3)
+        cpu = (thread_cpu_seconds(tid) or 0.0) - cpu0
+    finally:
+        stop.set()
+        engine.stop()
+    latencies: List[int] = []
+    for _p in sinks:
+        latencies += out.get(timeout=30)
+    for proc in sinks:
+        proc.join(5)
+    forwarded = len(latencies) / targets
+    return {
+        "pps": len(latencies) / duration,
+        "loss_pct": 100.0 * (1.0 - forwarded / sent) if sent else 0.0,
+        "p50_us": percentile(latencies, 50) / 1000.0,
+        "p99_us": percentile(latencies, 99) / 1000.0,
+        # Per input frame that made it through, i.e. per fan-out of `targets` sends.
+        "cpu_us": cpu / forwarded * 1e6 if forwarded else 0.0,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--targets", type=int, default=4)
+    ap.add_argument("--rates", default="2000,10000,40000", help="offered input frames/s, comma separated")
+    ap.add_argument("--duration", type=float, default=3.0)
+    ap.add_argument("--port", type=int, default=24650, help="router listen port; targets use the ports above it")
+    args = ap.parse_args()
+
+    modes = [("naive", False)]
+    if HAVE_MMSG:
+        modes.append(("batched", True))
+    else:
+        print("recvmmsg/sendmmsg not available: naive only")
+
+    print(f"{args.targets} targets, {args.duration:g} s per case")
+    print(f"{'mode':<8} {'offered/s':>10} {'forwarded/s':>12} {'loss %':>7} {'p50 us':>8} {'p99 us':>9} {'cpu us/frame':>13}")
+    for rate in [float(x) for x in args.rates.split(",") if x.strip()]:
+        for label, batch in modes:
+            r = run_case(batch, rate, args.targets, args.duration, args.port)
+            print(
+                f"{label:<8} {rate:>10,.0f} {r['pps']:>12,.0f} {r['loss_pct']:>7.2f} "
+                f"{r['p50_us']:>8.0f} {r['p99_us']:>9.0f} {r['cpu_us']:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
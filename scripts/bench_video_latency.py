@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Video pipeline latency benchmark (loopback only).
+
+A synthetic source (scrolling ramp + a binary frame-number barcode) is piped into ffmpeg,
+encoded with the same arguments the Video tab uses, published over RTSP to a local MediaMTX
+(or, without MediaMTX, to an ffmpeg listening as the RTSP server), pulled back, decoded and
+matched by frame number. Latency is measured from handing the raw frame to the encoder until
+the decoded frame is read back, for every resolution x fps x x264 parameter set.
+
+Run from the directory containing the omnilink package:
+    python3 -m omnilink.scripts.bench_video_latency --duration 5
+    python3 -m omnilink.scripts.bench_video_latency --res 1280x720 --fps 30 --compare old.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from omnilink.utils import find_free_tcp_port, port_listening, user_log_dir, user_state_dir, which
+from omnilink.video.constants import FPS_CHOICES, MEDIAMTX_BIN_DEFAULT, RES_CHOICES, X264_PARAMS
+from omnilink.video.pipeline import (
+    ENCODE_TRANSCODE,
+    INPUT_V4L2,
+    StreamConfig,
+    build_encode_args,
+    build_global_args,
+    build_output_args,
+    mediamtx_cfg_text,
+    rtsp_describe_status,
+    wait_until,
+)
+
+BITS = 16
+WHITE = 235
+BLACK = 16
+PATH_NAME = "bench"
+
+X264_SETS: Dict[str, str] = {
+    "default": X264_PARAMS,
+    "single-thread": X264_PARAMS.replace("sliced-threads=1", "sliced-threads=0") + ":threads=1",
+}
+
+
+def _patch_mean(gray: memoryview, w: int, x: int, y: int) -> float:
+    total = 0
+    for yy in (y - 1, y, y + 1):
+        total += sum(gray[yy * w + x - 2:yy * w + x + 3])
+    return total / 15.0
+
+
+# -------------------------
+# Synthetic source
+# -------------------------
+class FrameSource:
+    """
+    yuv420p frames: two barcode bands (frame number and its complement) over a ramp that
+    scrolls every frame so the encoder has real motion to deal with.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.w = width
+        self.h = height
+        self.band = max(16, (height // 8) // 16 * 16)
+        self.cell = width // BITS
+        self._ramp = bytes((x * 2) & 0xFF for x in range(width + 128))
+        self._chroma = bytes([128]) * (2 * (width // 2) * (height // 2))
+
+    def _band_row(self, idx: int, invert: bool) -> bytes:
+        cells = []
+        for i in range(BITS):
+            bit = (idx >> (BITS - 1 - i)) & 1
+            cells.append(bytes([WHITE if bit != invert else BLACK]) * self.cell)
+        row = b"".join(cells)
+        return row + bytes([BLACK]) * (self.w - len(row))
+
+    def frame(self, idx: int) -> bytes:
+        shift = (idx * 4) % 128
+        bg = self._ramp[shift:shift + self.w]
+        return b"".join((
+            self._band_row(idx, False) * self.band,
+            self._band_row(idx, True) * self.band,
+            bg * (self.h - 2 * self.band),
+            self._chroma,
+        ))
+
+    def decode(self, gray: memoryview) -> Optional[int]:
+        """Frame number from a decoded gray frame, or None if the barcode is not readable."""
+        w = self.w
+        ya = self.band // 2
+        yb = self.band + self.band // 2
+        idx = 0
+        for i in range(BITS):
+            x = i * self.cell + self.cell // 2
+            a = _patch_mean(gray, w, x, ya)
+            b = _patch_mean(gray, w, x, yb)
+            if abs(a - b) < 60:
+                return None
+            idx = (idx << 1) | (1 if a > b else 0)
+        return idx
+
+
+# -------------------------
+# One measurement
+# -------------------------
+def _percentile(sorted_vals: List[float], pct: float) -> float:
+    if not sorted_vals:
+        return float("nan")
+    k = max(0, min(len(sorted_vals) - 1, int(round(pct / 100.0 * len(sorted_vals) + 0.5)) - 1))
+    return sorted_vals[k]
+
+
+def _stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(1.5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait(1.5)
+
+
+class Run:
+    def __init__(self, args: argparse.Namespace, server: str, res: str, fps: int, x264_name: str, log):
+        self.args = args
+        self.server = server
+        self.res = res
+        self.fps = fps
+        self.x264_name = x264_name
+        self.log = log
+        w, h = (int(v) for v in res.split("x"))
+        self.src = FrameSource(w, h)
+        self.port = find_free_tcp_port(args.port)
+        self.url = f"rtsp://127.0.0.1:{self.port}/{PATH_NAME}"
+        self.sent: Dict[int, float] = {}
+        self.recv: Dict[int, float] = {}
+        self.undecoded = 0
+        self.first_recv: Optional[float] = None
+        self._stop = threading.Event()
+
+    def _publisher_cmd(self) -> List[str]:
+        cfg = StreamConfig(
+            input_kind=INPUT_V4L2,
+            resolution=self.res,
+            fps=self.fps,
+            bitrate_kbps=self.args.bitrate,
+            publish_url=self.url,
+            encode=ENCODE_TRANSCODE,
+            x264_params=X264_SETS[self.x264_name],
+        )
+        return (
+            [self.args.ffmpeg]
+            + build_global_args(cfg)
+            + ["-f", "rawvideo", "-pix_fmt", "yuv420p", "-video_size", self.res, "-framerate", str(self.fps), "-i", "pipe:0"]
+            + build_encode_args(cfg)
+            + build_output_args(cfg)
+        )
+
+    def _puller_cmd(self, listen: bool) -> List[str]:
+        cmd = [self.args.ffmpeg, "-loglevel", "error", "-fflags", "nobuffer", "-flags", "low_delay", "-threads", "1"]
+        if listen:
+            cmd += ["-rtsp_flags", "listen"]
+        else:
+            cmd += ["-rtsp_transport", "tcp"]
+        return cmd + ["-i", self.url, "-an", "-vsync", "0", "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+
+    def _write_frames(self, pub: subprocess.Popen) -> None:
+        period = 1.0 / self.fps
+        t0 = time.monotonic()
+        end = t0 + self.args.duration + self.args.warmup
+        idx = 0
+        try:
+            while not self._stop.is_set():
+                due = t0 + idx * period
+                now = time.monotonic()
+                if now >= end:
+                    break
+                if due > now:
+                    time.sleep(due - now)
+                data = self.src.frame(idx & 0xFFFF)
+                self.sent[idx & 0xFFFF] = time.monotonic()
+                pub.stdin.write(data)
+                idx += 1
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+        finally:
+            try:
+                pub.stdin.close()
+            except OSError:
+                pass
+
+    def _read_frames(self, pull: subprocess.Popen) -> None:
+        size = self.src.w * self.src.h
+        buf = bytearray(size)
+        mv = memoryview(buf)
+        f = pull.stdout
+        while not self._stop.is_set():
+            got = 0
+            while got < size:
+                n = f.readinto(mv[got:])
+                if not n:
+                    return
+                got += n
+            now = time.monotonic()
+            if self.first_recv is None:
+                self.first_recv = now
+            idx = self.src.decode(mv)
+            if idx is None:
+                self.undecoded += 1
+            elif idx not in self.recv:
+                self.recv[idx] = now
+
+    def run(self) -> dict:
+        procs: List[subprocess.Popen] = []
+        tmp = tempfile.TemporaryDirectory(prefix="omnilink-bench-")
+        threads: List[threading.Thread] = []
+        try:
+            listen = self.server == "standin"
+            pull: Optional[subprocess.Popen] = None
+            if listen:
+                pull = subprocess.Popen(self._puller_cmd(True), stdout=subprocess.PIPE, stderr=self.log)
+                procs.append(pull)
+                if not wait_until(lambda: port_listening("tcp", self.port), 5.0):
+                    raise RuntimeError("ffmpeg listen server tidak siap")
+            else:
+                cfg_path = Path(tmp.name) / "mediamtx.yml"
+                cfg_path.write_text(mediamtx_cfg_text([PATH_NAME], self.port, host="127.0.0.1"))
+                procs.append(subprocess.Popen([self.args.mediamtx, str(cfg_path)], stdout=self.log, stderr=self.log))
+                if not wait_until(lambda: port_listening("tcp", self.port), 5.0):
+                    raise RuntimeError(f"mediamtx tidak siap di port {self.port}")
+
+            pub = subprocess.Popen(self._publisher_cmd(), stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.log)
+            procs.append(pub)
+            writer = threading.Thread(target=self._write_frames, args=(pub,), daemon=True)
+            writer.start()
+            threads.append(writer)
+
+            if not listen:
+                ok = wait_until(lambda: rtsp_describe_status("127.0.0.1", self.port, PATH_NAME) == 200, 10.0)
+                if not ok:
+                    raise RuntimeError("stream belum tersedia di mediamtx")
+                pull = subprocess.Popen(self._puller_cmd(False), stdout=subprocess.PIPE, stderr=self.log)
+                procs.append(pull)
+
+            reader = threading.Thread(target=self._read_frames, args=(pull,), daemon=True)
+            reader.start()
+            threads.append(reader)
+
+            writer.join()
+            time.sleep(self.args.drain)
+        finally:
+            self._stop.set()
+            for p in reversed(procs):
+                _stop(p)
+            for t in threads:
+                t.join(2.0)
+            tmp.cleanup()
+        return self._result()
+
+    def _result(self) -> dict:
+        start = (self.first_recv or 0.0) + self.args.warmup
+        window = [i for i, t in self.sent.items() if t >= start]
+        lat = sorted((self.recv[i] - self.sent[i]) * 1000.0 for i in window if i in self.recv and self.recv[i] >= self.sent[i])
+        n = len(window)
+        return {
+            "res": self.res,
+            "fps": self.fps,
+            "x264": self.x264_name,
+            "bitrate_kbps": self.args.bitrate,
+            "server": self.server,
+            "frames": n,
+            "received": len(lat),
+            "lost_pct": round(100.0 * (n - len(lat)) / n, 2) if n else None,
+            "undecoded": self.undecoded,
+            "mean_ms": round(sum(lat) / len(lat), 2) if lat else None,
+            "p50_ms": round(_percentile(lat, 50), 2) if lat else None,
+            "p90_ms": round(_percentile(lat, 90), 2) if lat else None,
+            "p95_ms": round(_percentile(lat, 95), 2) if lat else None,
+            "p99_ms": round(_percentile(lat, 99), 2) if lat else None,
+            "max_ms": round(lat[-1], 2) if lat else None,
+        }
+
+
+# -------------------------
+# Results
+# -------------------------
+def _key(r: dict) -> Tuple[str, int, str]:
+    return r["res"], int(r["fps"]), r["x264"]
+
+
+def _fmt(v) -> str:
+    return "-" if v is None else f"{v:.1f}"
+
+
+def print_row(r: dict) -> None:
+    print(
+        f"{r['res']:>10} {r['fps']:>4} {r['x264']:<14} "
+        f"p50 {_fmt(r['p50_ms']):>7}  p95 {_fmt(r['p95_ms']):>7}  p99 {_fmt(r['p99_ms']):>7}  "
+        f"max {_fmt(r['max_ms']):>7} ms  lost {_fmt(r['lost_pct'])}%",
+        flush=True,
+    )
+
+
+def compare(old_path: str, results: List[dict], tolerance_pct: float, min_ms: float) -> int:
+    """Print p95 deltas against a previous results file. Returns the number of regressions."""
+    old = {_key(r): r for r in json.loads(Path(old_path).read_text()).get("results", [])}
+    regressions = 0
+    print(f"\ncompare with {old_path} (regression: p95 +{tolerance_pct:.0f}% and +{min_ms:.1f} ms, or more loss)")
+    for r in results:
+        o = old.get(_key(r))
+        if o is None or o.get("p95_ms") is None or r.get("p95_ms") is None:
+            continue
+        d = r["p95_ms"] - o["p95_ms"]
+        bad = d > min_ms and r["p95_ms"] > o["p95_ms"] * (1.0 + tolerance_pct / 100.0)
+        bad = bad or (r["lost_pct"] or 0.0) > (o.get("lost_pct") or 0.0) + 1.0
+        regressions += bad
+        flag = "REGRESSION" if bad else ""
+        print(f"{r['res']:>10} {r['fps']:>4} {r['x264']:<14} p95 {o['p95_ms']:>7.1f} -> {r['p95_ms']:>7.1f} ms ({d:+.1f}) {flag}")
+    return regressions
+
+
+def _tool_version(cmd: List[str]) -> str:
+    try:
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=5, text=True).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return (out.strip().splitlines() or [""])[0]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--res", action="append", choices=RES_CHOICES, help="repeatable; default: all")
+    ap.add_argument("--fps", action="append", choices=FPS_CHOICES, help="repeatable; default: all")
+    ap.add_argument("--x264", action="append", choices=sorted(X264_SETS), help="repeatable; default: all")
+    ap.add_argument("--bitrate", type=int, default=2500, help="kbps")
+    ap.add_argument("--duration", type=float, default=5.0, help="measured seconds per combination")
+    ap.add_argument("--warmup", type=float, default=1.0, help="seconds after the first frame not measured")
+    ap.add_argument("--drain", type=float, default=1.0)
+    ap.add_argument("--server", choices=("auto", "mediamtx", "standin"), default="auto")
+    ap.add_argument("--mediamtx", default=which("mediamtx") or MEDIAMTX_BIN_DEFAULT)
+    ap.add_argument("--ffmpeg", default=which("ffmpeg") or "ffmpeg")
+    ap.add_argument("--port", type=int, default=18554)
+    ap.add_argument("--out", help="results JSON (default: <state dir>/bench/video-latency-<time>.json)")
+    ap.add_argument("--compare", metavar="OLD_JSON")
+    ap.add_argument("--tolerance", type=float, default=10.0, help="allowed p95 increase in percent")
+    ap.add_argument("--min-delta", type=float, default=2.0, help="ignore p95 increases below this many ms")
+    args = ap.parse_args()
+
+    server = args.server
+    if server == "auto":
+        server = "mediamtx" if os.access(args.mediamtx, os.X_OK) else "standin"
+    if server == "mediamtx" and not os.access(args.mediamtx, os.X_OK):
+        raise SystemExit(f"mediamtx tidak ditemukan: {args.mediamtx}")
+
+    log_path = user_log_dir() / "bench-video.log"
+    results: List[dict] = []
+    with open(log_path, "ab") as log:
+        for res in args.res or RES_CHOICES:
+            for fps in args.fps or FPS_CHOICES:
+                for name in args.x264 or sorted(X264_SETS):
+                    try:
+                        r = Run(args, server, res, int(fps), name, log).run()
+                    except RuntimeError as e:
+                        print(f"{res:>10} {fps:>4} {name:<14} gagal: {e}", flush=True)
+                        continue
+                    results.append(r)
+                    print_row(r)
+
+    meta = {
+        "ts": round(time.time(), 3),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "python": sys.version.split()[0],
+        "ffmpeg": _tool_version([args.ffmpeg, "-version"]),
+        "server": server,
+        "duration_s": args.duration,
+    }
+    out = Path(args.out) if args.out else user_state_dir() / "bench" / time.strftime("video-latency-%Y%m%d-%H%M%S.json")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"meta": meta, "results": results}, indent=2) + "\n")
+    print(f"results: {out}  (child output: {log_path})")
+
+    if args.compare:
+        if compare(args.compare, results, args.tolerance, args.min_delta):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Multicast telemetry receiver: joins a group the router publishes to and prints what
+arrives once per second, to check delivery on a GCS machine.
+
+Run from the directory containing the omnilink package:
+    python3 -m omnilink.scripts.mcast_listen 239.255.14.55:14550 --seconds 10
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+
+from omnilink.telemetry.multicast import MulticastListener
+from omnilink.utils import is_multicast_ip, is_valid_port
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("group", help="GROUP:PORT, e.g. 239.255.14.55:14550")
+    ap.add_argument("--iface", default="", help="local IP of the interface to join on (default: routing table)")
+    ap.add_argument("--seconds", type=float, default=0.0, help="stop after this long (0 = until Ctrl+C)")
+    args = ap.parse_args()
+
+    group, _sep, ps = args.group.rpartition(":")
+    if not is_multicast_ip(group) or not ps.isdigit() or not is_valid_port(int(ps)):
+        ap.error("group harus GROUP:PORT dengan alamat 224.0.0.0/4")
+
+    listener = MulticastListener(group, int(ps), args.iface)
+    print(f"listening on {group}:{ps}")
+    elapsed = 0.0
+    last_frames = 0
+    try:
+        while not args.seconds or elapsed < args.seconds:
+            listener.poll(1.0)
+            elapsed += 1.0
+            st = listener.stats()
+            print(
+                f"{elapsed:5.0f} s  {st.frames - last_frames:6d} frames/s  total {st.frames}  "
+                f"loss {st.loss_pct:.2f}%  crc err {st.crc_errors}"
+            )
+            last_frames = st.frames
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+    return 0 if listener.stats().frames else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import socket
+import struct
+import sys
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Datagrams per recvmmsg/sendmmsg call and the largest datagram a batch slot holds (jumbo
+# frame). A longer received datagram is counted in `truncated` and dropped; a longer one
+# to send bypasses the batch.
+BATCH_SIZE = 32
+MAX_DATAGRAM = 9216
+
+_MSG_DONTWAIT = 0x40
+_MSG_TRUNC = 0x20
+_SOCKADDR_IN_LEN = 16
+# Entries per address cache (both directions); discovered clients come and go on new
+# ports, so a full cache is cleared rather than grown.
+_ADDR_CACHE_MAX = 1024
+# Not exported by the socket module; values from <asm-generic/socket.h>.
+_SO_SNDBUFFORCE = getattr(socket, "SO_SNDBUFFORCE", 32 if sys.platform.startswith("linux") else None)
+_SO_RCVBUFFORCE = getattr(socket, "SO_RCVBUFFORCE", 33 if sys.platform.startswith("linux") else None)
+
+
+class _IoVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(_IoVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None, None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        recv, send = libc.recvmmsg, libc.sendmmsg
+    except (OSError, AttributeError):
+        return None, None
+    recv.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recv.restype = ctypes.c_int
+    send.argtypes = [ctypes.c_int, ctypes.POINTER(_MMsgHdr), ctypes.c_uint, ctypes.c_int]
+    send.restype = ctypes.c_int
+    return recv, send
+
+
+_recvmmsg, _sendmmsg = _load_libc()
+
+# recvmmsg/sendmmsg usable (Linux, glibc or musl); otherwise callers use plain sockets.
+HAVE_MMSG = _recvmmsg is not None
+
+
+def tune_socket_buffers(sock: socket.socket, rcvbuf: int, sndbuf: int) -> Tuple[int, int]:
+    """
+    Ask for kernel socket buffers of the given size in bytes (0 leaves one alone). The
+    *FORCE options go past net.core.rmem_max/wmem_max when running as root. Returns the
+    sizes the kernel reports (Linux doubles the request for bookkeeping).
+    """
+    for size, force, opt in (
+        (rcvbuf, _SO_RCVBUFFORCE, socket.SO_RCVBUF),
+        (sndbuf, _SO_SNDBUFFORCE, socket.SO_SNDBUF),
+    ):
+        if size <= 0:
+            continue
+        try:
+            if force is None:
+                raise PermissionError
+            sock.setsockopt(socket.SOL_SOCKET, force, size)
+        except OSError:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, opt, size)
+            except OSError as e:
+                log.debug("socket buffer %d: %s", size, e)
+    return (
+        sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+        sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF),
+    )
+
+
+def _sockaddr_in(addr: Tuple[str, int]) -> ctypes.Array:
+    raw = struct.pack("=H", socket.AF_INET) + struct.pack("!H", addr[1]) + socket.inet_aton(addr[0])
+    return ctypes.create_string_buffer(raw.ljust(_SOCKADDR_IN_LEN, b"\0"), _SOCKADDR_IN_LEN)
+
+
+class _MsgVector:
+    """`count` preallocated mmsghdr entries, each with one iovec over its own buffer."""
+
+    def __init__(self, count: int, bufsize: int):
+        self.count = count
+        self.bufsize = bufsize
+        self.hdrs = (_MMsgHdr * count)()
+        self.iovs = (_IoVec * count)()
+        self.data = ctypes.create_string_buffer(count * bufsize)
+        self.names = ctypes.create_string_buffer(count * _SOCKADDR_IN_LEN)
+        base = ctypes.addressof(self.data)
+        names = ctypes.addressof(self.names)
+        self.buf_addr = [base + i * bufsize for i in range(count)]
+        for i in range(count):
+            self.iovs[i].iov_base = self.buf_addr[i]
+            self.iovs[i].iov_len = bufsize
+            h = self.hdrs[i].msg_hdr
+            h.msg_name = names + i * _SOCKADDR_IN_LEN
+            h.msg_namelen = _SOCKADDR_IN_LEN
+            h.msg_iov = ctypes.pointer(self.iovs[i])
+            h.msg_iovlen = 1
+
+
+class BatchDatagramTransport(asyncio.DatagramTransport):
+    """
+    asyncio datagram transport over recvmmsg/sendmmsg.
+
+    A readable socket is drained up to BATCH_SIZE datagrams per syscall and each one is
+    handed to protocol.datagram_received(). sendto() only queues; the queue is flushed
+    with sendmmsg once the current loop callback is done, so every datagram a receive
+    batch fans out to this socket leaves in one syscall. Datagrams over MAX_DATAGRAM are
+    sent on their own, never cut. A full send buffer drops the rest of the batch instead
+    of queueing (late telemetry is worthless); every datagram not sent is counted in
+    `dropped`.
+
+    Linux only (HAVE_MMSG); use create_batch_datagram_endpoint().
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, sock: socket.socket, protocol: asyncio.DatagramProtocol):
+        super().__init__(extra={"socket": sock, "sockname": sock.getsockname()})
+        self._loop = loop
+        self._sock = sock
+        self._fd = sock.fileno()
+        self._protocol = protocol
+        self._rx = _MsgVector(BATCH_SIZE, MAX_DATAGRAM)
+        self._tx = _MsgVector(BATCH_SIZE, MAX_DATAGRAM)
+        self._tx_names: List[Optional[Tuple[str, int]]] = [None] * BATCH_SIZE
+        self._sockaddrs: Dict[Tuple[str, int], ctypes.Array] = {}
+        self._addrs: Dict[bytes, Tuple[str, int]] = {}
+        self._queue: List[Tuple[bytes, Tuple[str, int]]] = []
+        self._flush_pending = False
+        self._closing = False
+        self.rx_calls = 0
+        self.tx_calls = 0
+        self.dropped = 0
+        self.truncated = 0
+        loop.add_reader(self._fd, self._on_readable)
+
+    # -------------------------
+    # Receive
+    # -------------------------
+    def _on_readable(self) -> None:
+        rx = self._rx
+        n = _recvmmsg(self._fd, rx.hdrs, rx.count, _MSG_DONTWAIT, None)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                self._protocol.error_received(OSError(err, "recvmmsg failed"))
+            return
+        self.rx_calls += 1
+        names = rx.names.raw
+        addrs = self._addrs
+        proto = self._protocol
+        for i in range(n):
+            h = rx.hdrs[i]
+            if h.msg_hdr.msg_flags & _MSG_TRUNC:
+                self.truncated += 1
+                continue
+            key = names[i * _SOCKADDR_IN_LEN + 2:i * _SOCKADDR_IN_LEN + 8]
+            addr = addrs.get(key)
+            if addr is None:
+                if len(addrs) >= _ADDR_CACHE_MAX:
+                    addrs.clear()
+                addr = (socket.inet_ntoa(key[2:]), (key[0] << 8) | key[1])
+                addrs[key] = addr
+            proto.datagram_received(ctypes.string_at(rx.buf_addr[i], h.msg_len), addr)
+
+    # -------------------------
+    # Send
+    # -------------------------
+    def sendto(self, data, addr=None) -> None:
+        if self._closing or addr is None:
+            return
+        if len(data) > self._tx.bufsize:
+            # Does not fit a batch slot: send what is queued first to keep the order.
+            if self._queue:
+                self._flush()
+            try:
+                self._sock.sendto(data, addr)
+            except OSError as e:
+                self.dropped += 1
+                if not isinstance(e, BlockingIOError):
+                    self._protocol.error_received(e)
+            return
+        self._queue.append((data, addr))
+        if not self._flush_pending:
+            self._flush_pending = True
+            self._loop.call_soon(self._flush)
+
+    def get_write_buffer_size(self) -> int:
+        return sum(len(d) for d, _a in self._queue)
+
+    def _flush(self) -> None:
+        self._flush_pending = False
+        queue, self._queue = self._queue, []
+        tx = self._tx
+        names = self._tx_names
+        start = 0
+        while start < len(queue):
+            chunk = queue[start:start + tx.count]
+            if len(self._sockaddrs) > _ADDR_CACHE_MAX - tx.count:
+                # Only between chunks: the headers of this one point into these buffers.
+                self._sockaddrs.clear()
+                names[:] = [None] * len(names)
+            for i, (data, addr) in enumerate(chunk):
+                ctypes.memmove(tx.buf_addr[i], data, len(data))
+                tx.iovs[i].iov_len = len(data)
+                if names[i] != addr:
+                    sa = self._sockaddrs.get(addr)
+                    if sa is None:
+                        sa = self._sockaddrs[addr] = _sockaddr_in(addr)
+                    tx.hdrs[i].msg_hdr.msg_name = ctypes.addressof(sa)
+                    names[i] = addr
+            n = _sendmmsg(self._fd, tx.hdrs, len(chunk), _MSG_DONTWAIT)
+            self.tx_calls += 1
+            if n < 0:
+                err = ctypes.get_errno()
+                if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    self.dropped += len(queue) - start
+                    return
+                # The first datagram failed (e.g. ICMP port unreachable reported late): skip it.
+                if err != errno.EINTR:
+                    self._protocol.error_received(OSError(err, "sendmmsg failed"))
+                    self.dropped += 1
+                    start += 1
+                continue
+            start += n
+
+    # -------------------------
+    # Lifecycle
+    # -------------------------
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def close(self) -> None:
+        if self._closing:
+            return
+        if self._queue:
+            self._flush()
+        self._closing = True
+        self._loop.remove_reader(self._fd)
+        self._sock.close()
+        self._loop.call_soon(self._protocol.connection_lost, None)
+
+    def abort(self) -> None:
+        self.close()
+
+
+async def create_batch_datagram_endpoint(
+    protocol_factory,
+    local_addr: Optional[Tuple[str, int]] = None,
+    sock: Optional[socket.socket] = None,
+) -> Tuple[BatchDatagramTransport, asyncio.DatagramProtocol]:
+    """
+    Counterpart of loop.create_datagram_endpoint() for the batched transport (IPv4 only).
+    Raises OSError when `local_addr` cannot be bound.
+    """
+    loop = asyncio.get_running_loop()
+    if sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            if local_addr is not None:
+                sock.bind(local_addr)
+        except OSError:
+            sock.close()
+            raise
+    sock.setblocking(False)
+    protocol = protocol_factory()
+    transport = BatchDatagramTransport(loop, sock, protocol)
+    protocol.connection_made(transport)
+    return transport, protocol
@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import errno
+import logging
+import selectors
+import socket
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from omnilink.telemetry.link_stats import LinkQuality
+from omnilink.telemetry.mavlink_parser import MavlinkParser
+
+log = logging.getLogger(__name__)
+
+# on_change(name, up) from the monitor thread.
+LinkCallback = Callable[[str, bool], None]
+
+RECV_SIZE = 65536
+# Reads per readiness event: a flooded link must not starve the others. The selector is
+# level-triggered, so whatever is left is picked up on the next pass.
+RECVS_PER_EVENT = 64
+
+
+class _Watch:
+    def __init__(self, name: str, kind: str, host: str, port: int, link_quality: Optional[LinkQuality]):
+        self.name = name
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.link_quality = link_quality
+        self.sock: Optional[socket.socket] = None
+        self.connecting = False
+        self.retry_at = 0.0
+        self.up = False
+        self.last_valid = 0.0
+        self.parser = self._new_parser()
+
+    def _new_parser(self) -> MavlinkParser:
+        lq = self.link_quality
+        return MavlinkParser(
+            on_frame=lq.on_frame if lq else None,
+            on_crc_error=lq.on_crc_error if lq else None,
+        )
+
+
+class LinkMonitor:
+    """
+    Watches any number of MAVLink endpoints from one selector (epoll) thread.
+
+    TCP watches connect to host:port (non-blocking, reconnecting every `reconnect_s`).
+    UDP watches bind a local port and listen. Each endpoint keeps a parser running for its
+    whole lifetime; a link is reported up on the first checksum-valid frame and down as soon
+    as the connection drops or no valid frame arrived for `silence_s`.
+    """
+
+    def __init__(self, on_change: Optional[LinkCallback] = None, silence_s: float = 1.0, reconnect_s: float = 0.1):
+        self.on_change = on_change
+        self.silence_s = float(silence_s)
+        self.reconnect_s = float(reconnect_s)
+        self._watches: Dict[str, _Watch] = {}
+        self._pending: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self._sel: Optional[selectors.BaseSelector] = None
+        self._wake_r: Optional[socket.socket] = None
+        self._wake_w: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+
+    # -------------------------
+    # Public API (any thread)
+    # -------------------------
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop = False
+        self._sel = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._sel.register(self._wake_r, selectors.EVENT_READ, None)
+        self._thread = threading.Thread(target=self._run, name="omnilink-linkmon", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 1.0) -> None:
+        if self._thread is None:
+            return
+        self._stop = True
+        self._wake()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def add_tcp(self, name: str, host: str, port: int, link_quality: Optional[LinkQuality] = None) -> None:
+        self._call(lambda: self._add(_Watch(name, "tcp", host, int(port), link_quality)))
+
+    def add_udp(self, name: str, port: int, host: str = "0.0.0.0", link_quality: Optional[LinkQuality] = None) -> None:
+        self._call(lambda: self._add(_Watch(name, "udp", host, int(port), link_quality)))
+
+    def remove(self, name: str) -> None:
+        self._call(lambda: self._remove(name))
+
+    def is_up(self, name: str) -> bool:
+        w = self._watches.get(name)
+        return bool(w and w.up)
+
+    def parser(self, name: str) -> Optional[MavlinkParser]:
+        w = self._watches.get(name)
+        return w.parser if w else None
+
+    # -------------------------
+    # Monitor thread
+    # -------------------------
+    def _call(self, fn: Callable[[], None]) -> None:
+        with self._lock:
+            self._pending.append(fn)
+        self._wake()
+
+    def _wake(self) -> None:
+        if self._wake_w is not None:
+            try:
+                self._wake_w.send(b"\0")
+            except OSError:
+                pass
+
+    def _add(self, w: _Watch) -> None:
+        self._remove(w.name)
+        self._watches[w.name] = w
+        self._open(w, time.monotonic())
+
+    def _remove(self, name: str) -> None:
+        w = self._watches.pop(name, None)
+        if w is not None:
+            self._close(w)
+            self._set_up(w, False)
+
+    def _open(self, w: _Watch, now: float) -> None:
+        try:
+            if w.kind == "udp":
+                s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                s.setblocking(False)
+                s.bind((w.host, w.port))
+                w.sock = s
+                self._sel.register(s, selectors.EVENT_READ, w)
+                return
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setblocking(False)
+            w.sock = s
+            err = s.connect_ex((w.host, w.port))
+            if err in (0, errno.EINPROGRESS):
+                w.connecting = err != 0
+                self._sel.register(s, selectors.EVENT_WRITE if w.connecting else selectors.EVENT_READ, w)
+                return
+            raise OSError(err, errno.errorcode.get(err, "connect failed"))
+        except OSError as e:
+            log.debug("link %s: %s", w.name, e)
+            self._close(w)
+            w.retry_at = now + self.reconnect_s
+
+    def _close(self, w: _Watch) -> None:
+        if w.sock is not None:
+            try:
+                self._sel.unregister(w.sock)
+            except (KeyError, ValueError):
+                pass
+            try:
+                w.sock.close()
+            except OSError:
+                pass
+            w.sock = None
+        w.connecting = False
+
+    def _set_up(self, w: _Watch, up: bool) -> None:
+        if w.up == up:
+            return
+        w.up = up
+        if self.on_change is not None:
+            try:
+                self.on_change(w.name, up)
+            except Exception:
+                log.exception("link callback failed")
+
+    def _drop(self, w: _Watch, now: float) -> None:
+        self._close(w)
+        self._set_up(w, False)
+        w.parser = w._new_parser()
+        w.retry_at = now + self.reconnect_s
+
+    def _on_ready(self, w: _Watch, mask: int, now: float) -> None:
+        s = w.sock
+        if s is None:
+            return
+        if w.connecting:
+            err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                self._drop(w, now)
+                return
+            w.connecting = False
+            self._sel.modify(s, selectors.EVENT_READ, w)
+            return
+
+        verified = w.parser.verified
+        try:
+            for _ in range(RECVS_PER_EVENT):
+                data = s.recv(RECV_SIZE)
+                if not data and w.kind == "tcp":
+                    self._drop(w, now)
+                    return
+                w.parser.feed(data)
+                if w.kind == "tcp" and len(data) < RECV_SIZE:
+                    break
+        except BlockingIOError:
+            pass
+        except OSError:
+            if w.kind == "tcp":
+                self._drop(w, now)
+                return
+        if w.parser.verified != verified:
+            w.last_valid = now
+            self._set_up(w, True)
+
+    def _next_timeout(self, now: float) -> float:
+        t = self.silence_s
+        for w in self._watches.values():
+            if w.sock is None:
+                t = min(t, w.retry_at - now)
+            elif w.up:
+                t = min(t, w.last_valid + self.silence_s - now)
+        return max(0.0, t)
+
+    def _run(self) -> None:
+        sel = self._sel
+        try:
+            while not self._stop:
+                with self._lock:
+                    pending, self._pending = self._pending, []
+                for fn in pending:
+                    fn()
+
+                now = time.monotonic()
+                for key, mask in sel.select(self._next_timeout(now)):
+                    if key.data is None:
+                        try:
+                            self._wake_r.recv(4096)
+                        except BlockingIOError:
+                            pass
+                        continue
+                    self._on_ready(key.data, mask, time.monotonic())
+
+                now = time.monotonic()
+                for w in list(self._watches.values()):
+                    if w.sock is None and now >= w.retry_at:
+                        self._open(w, now)
+                    elif w.up and now - w.last_valid >= self.silence_s:
+                        self._set_up(w, False)
+        finally:
+            for w in list(self._watches.values()):
+                self._close(w)
+            self._watches.clear()
+            sel.close()
+            self._wake_r.close()
+            self._wake_w.close()
+            self._sel = None
+            self._wake_r = None
+            self._wake_w = None
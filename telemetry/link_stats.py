@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+HEARTBEAT_MSGID = 0
+
+
+@dataclass
+class LinkMetrics:
+    sysid: int
+    msgs_per_s: float
+    bytes_per_s: float
+    loss_pct: float
+    crc_error_pct: float
+    since_heartbeat_s: Optional[float]
+
+
+class _SysRing:
+    """
+    Fixed-size ring of time buckets for one sysid. A bucket is reused once its epoch
+    (bucket number since the monotonic clock origin) falls out of the window.
+    """
+
+    __slots__ = ("epoch", "frames", "nbytes", "lost", "crc_errors", "first_seen", "last_heartbeat", "last_seq")
+
+    def __init__(self, n: int, now: float):
+        self.epoch = array("q", [-1] * n)
+        self.frames = array("q", [0] * n)
+        self.nbytes = array("q", [0] * n)
+        self.lost = array("q", [0] * n)
+        self.crc_errors = array("q", [0] * n)
+        self.first_seen = now
+        self.last_heartbeat: Optional[float] = None
+        self.last_seq: Dict[int, int] = {}
+
+    def bucket(self, e: int, n: int) -> int:
+        i = e % n
+        if self.epoch[i] != e:
+            self.epoch[i] = e
+            self.frames[i] = 0
+            self.nbytes[i] = 0
+            self.lost[i] = 0
+            self.crc_errors[i] = 0
+        return i
+
+
+class LinkQuality:
+    """
+    Rolling per-sysid link metrics: msgs/s, bytes/s, loss % from MAVLink sequence gaps,
+    CRC error rate and time since the last HEARTBEAT.
+
+    Memory is bounded: one ring of `buckets` slots per sysid (at most 256 sysids).
+    Hook it up as MavlinkParser(on_frame=lq.on_frame, on_crc_error=lq.on_crc_error).
+    Updates come from the receiving thread; snapshot() may be called from any thread.
+    """
+
+    def __init__(self, window_s: float = 5.0, buckets: int = 10):
+        self.buckets = max(2, int(buckets))
+        self.bucket_s = max(0.05, float(window_s) / self.buckets)
+        self._rings: Dict[int, _SysRing] = {}
+
+    def reset(self) -> None:
+        self._rings = {}
+
+    def _ring(self, sysid: int, now: float) -> _SysRing:
+        r = self._rings.get(sysid)
+        if r is None:
+            r = _SysRing(self.buckets, now)
+            self._rings[sysid] = r
+        return r
+
+    def on_frame(self, frame: memoryview, sysid: int, compid: int, msgid: int, seq: int) -> None:
+        self.observe(sysid, compid, msgid, seq, len(frame))
+
+    def on_crc_error(self, sysid: int, compid: int) -> None:
+        now = time.monotonic()
+        r = self._rings.get(sysid)
+        if r is None:
+            # Do not create entries for sysids that only ever appear in corrupted headers.
+            return
+        i = r.bucket(int(now / self.bucket_s), self.buckets)
+        r.crc_errors[i] += 1
+
+    def observe(self, sysid: int, compid: int, msgid: int, seq: int, nbytes: int, now: Optional[float] = None) -> None:
+        if now is None:
+            now = time.monotonic()
+        r = self._ring(sysid, now)
+        i = r.bucket(int(now / self.bucket_s), self.buckets)
+        r.frames[i] += 1
+        r.nbytes[i] += nbytes
+
+        last = r.last_seq.get(compid)
+        if last is not None:
+            gap = (seq - last - 1) & 0xFF
+            if gap < 128:
+                r.lost[i] += gap
+        r.last_seq[compid] = seq
+
+        if msgid == HEARTBEAT_MSGID:
+            r.last_heartbeat = now
+
+    def snapshot(self, now: Optional[float] = None) -> List[LinkMetrics]:
+        if now is None:
+            now = time.monotonic()
+        n = self.buckets
+        e_now = int(now / self.bucket_s)
+        oldest = e_now - n + 1
+        out: List[LinkMetrics] = []
+        for sysid, r in sorted(list(self._rings.items())):
+            frames = nbytes = lost = crc = 0
+            for i in range(n):
+                if r.epoch[i] >= oldest:
+                    frames += r.frames[i]
+                    nbytes += r.nbytes[i]
+                    lost += r.lost[i]
+                    crc += r.crc_errors[i]
+            span = (n - 1) * self.bucket_s + (now - e_now * self.bucket_s)
+            span = max(self.bucket_s, min(span, now - r.first_seen))
+            out.append(LinkMetrics(
+                sysid=sysid,
+                msgs_per_s=frames / span,
+                bytes_per_s=nbytes / span,
+                loss_pct=100.0 * lost / (frames + lost) if frames + lost else 0.0,
+                crc_error_pct=100.0 * crc / (frames + crc) if frames + crc else 0.0,
+                since_heartbeat_s=(now - r.last_heartbeat) if r.last_heartbeat is not None else None,
+            ))
+        return out
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from omnilink.telemetry.mavlink_utils import (
+    CRC_EXTRA,
+    MAVLINK_CHECKSUM_LEN,
+    MAVLINK_IFLAG_SIGNED,
+    MAVLINK_SIGNATURE_LEN,
+    MAVLINK_STX_V1,
+    MAVLINK_STX_V2,
+    MAVLINK_V1_HEADER_LEN,
+    MAVLINK_V2_HEADER_LEN,
+    x25_crc_accumulate,
+    x25_crc_accumulate_buf,
+    x25_crc_init,
+)
+
+# on_frame(frame, sysid, compid, msgid, seq); `frame` is only valid during the call.
+FrameCallback = Callable[[memoryview, int, int, int, int], None]
+# on_crc_error(sysid, compid) as read from the (untrusted) header of the rejected frame.
+CrcErrorCallback = Callable[[int, int], None]
+
+# Sequence jumps this large are duplicates or reordering from a routing loop, not loss.
+_SEQ_GAP_MAX = 128
+
+_STX_V1 = bytes([MAVLINK_STX_V1])
+_STX_V2 = bytes([MAVLINK_STX_V2])
+
+
+def _next_stx(src, start: int) -> int:
+    a = src.find(_STX_V2, start)
+    b = src.find(_STX_V1, start)
+    if a < 0:
+        return b
+    if b < 0 or a < b:
+        return a
+    return b
+
+
+class MavlinkParser:
+    """
+    Incremental MAVLink v1/v2 frame parser.
+
+    feed() takes arbitrary stream chunks (TCP segments, UDP datagrams). Complete frames are
+    passed to `on_frame` as a memoryview into the receive buffer, so no per-frame bytes
+    object is created. Frames whose msgid has a known CRC_EXTRA are checksum validated;
+    other frames are accepted only when followed by another STX or the end of the chunk.
+    A rejected frame resyncs one byte after the false STX.
+
+    Counters are kept per (sysid, compid) source and per (sysid, compid, msgid).
+    """
+
+    def __init__(
+        self,
+        on_frame: Optional[FrameCallback] = None,
+        crc_extra: Optional[Dict[int, int]] = None,
+        on_crc_error: Optional[CrcErrorCallback] = None,
+    ):
+        self.on_frame = on_frame
+        self.on_crc_error = on_crc_error
+        self.crc_extra: Dict[int, int] = dict(CRC_EXTRA)
+        if crc_extra:
+            self.crc_extra.update(crc_extra)
+        self._buf = bytearray()
+        self.reset()
+
+    def reset(self) -> None:
+        self._buf = bytearray()
+        self.frames = 0
+        self.bytes = 0
+        self.verified = 0
+        self.crc_errors = 0
+        self.garbage_bytes = 0
+        # (sysid << 8 | compid) -> [frames, crc_errors, seq_gaps, last_seq]
+        self._src: Dict[int, List[int]] = {}
+        # (sysid << 32 | compid << 24 | msgid) -> [frames, bytes]
+        self._msg: Dict[int, List[int]] = {}
+
+    @property
+    def link_valid(self) -> bool:
+        """True once at least one checksum-validated frame has been parsed."""
+        return self.verified > 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._buf)
+
+    def feed(self, data) -> int:
+        """
+        Parse a chunk and return the number of complete frames found in it.
+        """
+        if not self._buf and isinstance(data, (bytes, bytearray)):
+            # Common case (one or more whole frames per chunk): parse in place.
+            with memoryview(data) as mv:
+                used, count = self._parse(data, mv)
+                if used < len(mv):
+                    self._buf += mv[used:]
+            return count
+
+        self._buf += data
+        buf = self._buf
+        with memoryview(buf) as mv:
+            used, count = self._parse(buf, mv)
+        if used:
+            try:
+                del buf[:used]
+            except BufferError:
+                # A callback kept a view alive; leave it pointing at the old buffer.
+                self._buf = bytearray(buf[used:])
+        return count
+
+    def _parse(self, src, mv: memoryview) -> Tuple[int, int]:
+        n = len(mv)
+        i = 0
+        count = 0
+        extras = self.crc_extra
+        srcs = self._src
+        msgs = self._msg
+        cb = self.on_frame
+
+        while i < n:
+            stx = mv[i]
+            if stx != MAVLINK_STX_V2 and stx != MAVLINK_STX_V1:
+                j = _next_stx(src, i + 1)
+                if j < 0:
+                    self.garbage_bytes += n - i
+                    return n, count
+                self.garbage_bytes += j - i
+                i = j
+                continue
+
+            if stx == MAVLINK_STX_V1:
+                if n - i < MAVLINK_V1_HEADER_LEN:
+                    break
+                plen = mv[i + 1]
+                hdr = MAVLINK_V1_HEADER_LEN
+                total = hdr + plen + MAVLINK_CHECKSUM_LEN
+                if n - i < total:
+                    break
+                seq = mv[i + 2]
+                sysid = mv[i + 3]
+                compid = mv[i + 4]
+                msgid = mv[i + 5]
+            else:
+                if n - i < MAVLINK_V2_HEADER_LEN:
+                    break
+                iflags = mv[i + 2]
+                if iflags & ~MAVLINK_IFLAG_SIGNED:
+                    self.garbage_bytes += 1
+                    i += 1
+                    continue
+                plen = mv[i + 1]
+                hdr = MAVLINK_V2_HEADER_LEN
+                total = hdr + plen + MAVLINK_CHECKSUM_LEN
+                if iflags & MAVLINK_IFLAG_SIGNED:
+                    total += MAVLINK_SIGNATURE_LEN
+                if n - i < total:
+                    break
+                seq = mv[i + 4]
+                sysid = mv[i + 5]
+                compid = mv[i + 6]
+                msgid = mv[i + 7] | (mv[i + 8] << 8) | (mv[i + 9] << 16)
+
+            sk = (sysid << 8) | compid
+            st = srcs.get(sk)
+
+            extra = extras.get(msgid)
+            if extra is not None:
+                crc_at = i + hdr + plen
+                crc = x25_crc_accumulate_buf(x25_crc_init(), mv[i + 1:crc_at])
+                crc = x25_crc_accumulate(crc, extra)
+                if crc != (mv[crc_at] | (mv[crc_at + 1] << 8)):
+                    self.crc_errors += 1
+                    if st is not None:
+                        st[1] += 1
+                    if self.on_crc_error is not None:
+                        self.on_crc_error(sysid, compid)
+                    self.garbage_bytes += 1
+                    i += 1
+                    continue
+                self.verified += 1
+            else:
+                # No checksum to go by: only trust the frame when the next frame starts right after it.
+                nxt = i + total
+                if nxt < n and mv[nxt] != MAVLINK_STX_V2 and mv[nxt] != MAVLINK_STX_V1:
+                    self.garbage_bytes += 1
+                    i += 1
+                    continue
+
+            if st is None:
+                srcs[sk] = [1, 0, 0, seq]
+            else:
+                st[0] += 1
+                gap = (seq - st[3] - 1) & 0xFF
+                if gap < _SEQ_GAP_MAX:
+                    st[2] += gap
+                st[3] = seq
+
+            mk = (sk << 24) | msgid
+            ms = msgs.get(mk)
+            if ms is None:
+                msgs[mk] = [1, total]
+            else:
+                ms[0] += 1
+                ms[1] += total
+
+            self.frames += 1
+            self.bytes += total
+            count += 1
+
+            if cb is not None:
+                frame = mv[i:i + total]
+                try:
+                    cb(frame, sysid, compid, msgid, seq)
+                finally:
+                    frame.release()
+
+            i += total
+
+        return i, count
+
+    # -------------------------
+    # Statistics
+    # -------------------------
+    def source_stats(self) -> Dict[tuple[int, int], Dict[str, int]]:
+        out: Dict[tuple[int, int], Dict[str, int]] = {}
+        for sk, (frames, crc_errors, seq_gaps, _last) in list(self._src.items()):
+            out[(sk >> 8, sk & 0xFF)] = {"frames": frames, "crc_errors": crc_errors, "seq_gaps": seq_gaps}
+        return out
+
+    def message_stats(self) -> Dict[tuple[int, int, int], Dict[str, int]]:
+        out: Dict[tuple[int, int, int], Dict[str, int]] = {}
+        for mk, (frames, nbytes) in list(self._msg.items()):
+            out[(mk >> 32, (mk >> 24) & 0xFF, mk & 0xFFFFFF)] = {"frames": frames, "bytes": nbytes}
+        return out
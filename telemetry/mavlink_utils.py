@@ -1,6 +1,13 @@
 from __future__ import annotations
 
 import struct
+from typing import List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:
+    # x25_crc_batch falls back to the table loop.
+    np = None
 
 
 def x25_crc_init() -> int:
@@ -14,12 +21,63 @@ def x25_crc_accumulate(crc: int, b: int) -> int:
     return crc
 
 
+# x25_crc_accumulate(crc, b) == (crc >> 8) ^ _X25_TABLE[(crc ^ b) & 0xFF]
+_X25_TABLE = tuple(x25_crc_accumulate(0, i) for i in range(256))
+_X25_TABLE_NP = np.asarray(_X25_TABLE, dtype=np.uint16) if np is not None else None
+
+
 def x25_crc_accumulate_buf(crc: int, data: bytes) -> int:
+    tbl = _X25_TABLE
     for bb in data:
-        crc = x25_crc_accumulate(crc, bb)
+        crc = (crc >> 8) ^ tbl[(crc ^ bb) & 0xFF]
     return crc
 
 
+def x25_crc_batch(data, offsets: Sequence[int], lengths: Sequence[int], extras: Optional[Sequence[int]] = None) -> List[int]:
+    """
+    Checksum many byte ranges of one packed buffer in a single call.
+    Range k is data[offsets[k]:offsets[k] + lengths[k]], optionally followed by extras[k]
+    (the MAVLink CRC_EXTRA). Results are identical to x25_crc_accumulate_buf.
+    Uses NumPy when installed (all ranges advance one byte per vectorized step),
+    otherwise falls back to the table loop.
+    """
+    if np is None or len(offsets) < 8:
+        out: List[int] = []
+        mv = memoryview(data)
+        for k, (off, ln) in enumerate(zip(offsets, lengths)):
+            crc = x25_crc_accumulate_buf(x25_crc_init(), mv[off:off + ln])
+            if extras is not None:
+                crc = x25_crc_accumulate(crc, extras[k])
+            out.append(crc)
+        return out
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    tbl = _X25_TABLE_NP
+    off = np.asarray(offsets, dtype=np.int64)
+    ln = np.asarray(lengths, dtype=np.int64)
+    crc = np.full(off.shape, x25_crc_init(), dtype=np.uint16)
+
+    # Process ranges in order of decreasing length so step j only touches the
+    # prefix of ranges that still have a byte j.
+    order = np.argsort(-ln, kind="stable")
+    off_s = off[order]
+    ln_s = ln[order]
+    crc_s = crc[order]
+    max_len = int(ln_s[0]) if len(ln_s) else 0
+    active = len(ln_s)
+    for j in range(max_len):
+        while active and ln_s[active - 1] <= j:
+            active -= 1
+        c = crc_s[:active]
+        b = buf[off_s[:active] + j]
+        crc_s[:active] = (c >> 8) ^ tbl[(c ^ b) & 0xFF]
+    if extras is not None:
+        ex = np.asarray(extras, dtype=np.uint16)[order]
+        crc_s = (crc_s >> 8) ^ tbl[(crc_s ^ ex) & 0xFF]
+    crc[order] = crc_s
+    return crc.tolist()
+
+
 def mavlink_v1_heartbeat_packet(
     seq: int,
     sysid: int = 255,
@@ -56,3 +114,48 @@ def mavlink_v1_heartbeat_packet(
     crc = x25_crc_accumulate(crc, 50)  # CRC extra for HEARTBEAT
 
     return bytes([stx]) + header + payload + struct.pack("<H", crc)
+
+
+MAVLINK_STX_V1 = 0xFE
+MAVLINK_STX_V2 = 0xFD
+MAVLINK_V1_HEADER_LEN = 6
+MAVLINK_V2_HEADER_LEN = 10
+MAVLINK_CHECKSUM_LEN = 2
+MAVLINK_SIGNATURE_LEN = 13
+MAVLINK_IFLAG_SIGNED = 0x01
+
+# Message names accepted in target rules (common.xml / ardupilotmega ids).
+MSG_IDS = {
+    "HEARTBEAT": 0, "SYS_STATUS": 1, "SYSTEM_TIME": 2, "PARAM_VALUE": 22, "GPS_RAW_INT": 24,
+    "GPS_STATUS": 25, "SCALED_IMU": 26, "RAW_IMU": 27, "RAW_PRESSURE": 28, "SCALED_PRESSURE": 29,
+    "ATTITUDE": 30, "ATTITUDE_QUATERNION": 31, "LOCAL_POSITION_NED": 32, "GLOBAL_POSITION_INT": 33,
+    "RC_CHANNELS_SCALED": 34, "RC_CHANNELS_RAW": 35, "SERVO_OUTPUT_RAW": 36, "MISSION_CURRENT": 42,
+    "NAV_CONTROLLER_OUTPUT": 62, "RC_CHANNELS": 65, "VFR_HUD": 74, "COMMAND_LONG": 76,
+    "COMMAND_ACK": 77, "HIGHRES_IMU": 105, "TIMESYNC": 111, "SCALED_IMU2": 116, "POWER_STATUS": 125,
+    "SCALED_IMU3": 129, "SCALED_PRESSURE2": 137, "BATTERY_STATUS": 147, "MEMINFO": 152, "AHRS": 163,
+    "AHRS2": 178, "EKF_STATUS_REPORT": 193, "ESTIMATOR_STATUS": 230, "VIBRATION": 241,
+    "HOME_POSITION": 242, "EXTENDED_SYS_STATE": 245, "STATUSTEXT": 253,
+}
+
+# CRC_EXTRA seeds for common.xml and the ardupilotmega messages usually seen on a GCS link.
+# Frames with a msgid missing here are passed through without checksum validation.
+CRC_EXTRA = {
+    0: 50, 1: 124, 2: 137, 4: 237, 5: 217, 6: 104, 7: 119, 11: 89,
+    20: 214, 21: 159, 22: 220, 23: 168, 24: 24, 25: 23, 26: 170, 27: 144,
+    28: 67, 29: 115, 30: 39, 31: 246, 32: 185, 33: 104, 34: 237, 35: 244,
+    36: 222, 37: 212, 38: 9, 39: 254, 40: 230, 41: 28, 42: 28, 43: 132,
+    44: 221, 45: 232, 46: 11, 47: 153, 48: 41, 49: 39, 50: 78, 51: 196,
+    54: 15, 55: 3, 61: 167, 62: 183, 63: 119, 64: 191, 65: 118, 66: 148,
+    67: 21, 69: 243, 70: 124, 73: 38, 74: 20, 75: 158, 76: 152, 77: 143,
+    81: 106, 82: 49, 83: 22, 84: 143, 85: 140, 86: 5, 87: 150, 89: 231,
+    90: 183, 91: 63, 92: 54, 100: 175, 101: 102, 102: 158, 103: 208, 104: 56,
+    105: 93, 106: 138, 107: 108, 108: 32, 109: 185, 110: 84, 111: 34, 112: 174,
+    113: 124, 114: 237, 115: 4, 116: 76, 117: 128, 118: 56, 119: 116, 120: 134,
+    121: 237, 122: 203, 123: 250, 124: 87, 125: 203, 126: 220, 127: 25, 128: 226,
+    129: 46, 130: 29, 131: 223, 132: 85, 133: 6, 134: 229, 135: 203, 136: 1,
+    137: 195, 138: 109, 139: 168, 140: 181, 141: 47, 142: 72, 143: 131, 144: 127,
+    146: 103, 147: 154, 148: 178, 149: 200, 150: 134, 152: 208, 163: 127, 164: 154,
+    165: 21, 166: 21, 178: 47, 193: 71, 230: 163, 231: 105, 232: 151, 233: 35,
+    234: 150, 241: 90, 242: 104, 243: 85, 244: 95, 245: 130, 246: 184, 247: 81,
+    248: 8, 249: 204, 250: 49, 251: 170, 252: 44, 253: 83, 254: 46,
+}
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import socket
+import struct
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from omnilink.telemetry.mavlink_parser import MavlinkParser
+
+DEFAULT_MULTICAST_TTL = 1
+
+
+def open_multicast_sender(ttl: int = DEFAULT_MULTICAST_TTL, iface: str = "") -> socket.socket:
+    """
+    Non-blocking UDP socket for publishing to a multicast group. Loopback stays on so
+    listeners on the same host receive the stream too.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, int(ttl or DEFAULT_MULTICAST_TTL))
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if iface:
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(iface))
+        s.setblocking(False)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+def open_multicast_receiver(group: str, port: int, iface: str = "") -> socket.socket:
+    """
+    UDP socket joined to `group` on `port`. SO_REUSEADDR lets several listeners (QGC, a
+    logger, this helper) share the port on one host.
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Bound to the group so unicast traffic to the same port is not mixed in.
+        s.bind((group, int(port)))
+        mreq = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(iface or "0.0.0.0"))
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+@dataclass
+class ReceiverStats:
+    datagrams: int
+    frames: int
+    bytes: int
+    # Sequence gaps summed over all sources, as a share of frames expected.
+    loss_pct: float
+    crc_errors: int
+
+
+class MulticastListener:
+    """
+    Receiver-side delivery check: joins a group, parses the MAVLink stream and counts
+    frames, bytes and sequence gaps, the way a GCS on the other end would see it.
+    """
+
+    def __init__(self, group: str, port: int, iface: str = ""):
+        self.sock = open_multicast_receiver(group, port, iface)
+        self.parser = MavlinkParser()
+        self.datagrams = 0
+        self.first_rx: Optional[float] = None
+
+    def poll(self, timeout: float) -> int:
+        """Receive for up to `timeout` seconds; returns the number of datagrams read."""
+        n = 0
+        end = time.monotonic() + timeout
+        while True:
+            left = end - time.monotonic()
+            if left <= 0:
+                return n
+            self.sock.settimeout(left)
+            try:
+                data = self.sock.recv(65535)
+            except socket.timeout:
+                return n
+            if self.first_rx is None:
+                self.first_rx = time.monotonic()
+            self.datagrams += 1
+            n += 1
+            self.parser.feed(data)
+
+    def stats(self) -> ReceiverStats:
+        p = self.parser
+        gaps = sum(st["seq_gaps"] for st in p.source_stats().values())
+        expected = p.frames + gaps
+        return ReceiverStats(
+            datagrams=self.datagrams,
+            frames=p.frames,
+            bytes=p.bytes,
+            loss_pct=gaps * 100.0 / expected if expected else 0.0,
+            crc_errors=p.crc_errors,
+        )
+
+    def close(self) -> None:
+        self.sock.close()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import socket
+import time
+from dataclasses import dataclass
+
+from omnilink.telemetry.mavlink_utils import mavlink_v1_heartbeat_packet
+from omnilink.utils import is_valid_ip, is_valid_port
+
+
+@dataclass
+class PrimerSettings:
+    enabled: bool = False
+    upstream_ip: str = ""
+    upstream_port: int = 14550
+    count: int = 3
+    interval_ms: int = 200
+    use_mavlink_heartbeat: bool = True
+
+    def usable(self) -> bool:
+        return self.enabled and is_valid_ip(self.upstream_ip) and is_valid_port(self.upstream_port)
+
+
+def prime_udp(listen_port: int, p: PrimerSettings) -> bool:
+    """
+    Send a few packets from the router's listen port to the upstream radio/companion so it
+    learns where to send telemetry. Blocks for about count * interval_ms.
+    """
+    s = None
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(("0.0.0.0", int(listen_port)))
+        seq = 0
+        for _i in range(max(1, int(p.count))):
+            payload = mavlink_v1_heartbeat_packet(seq) if p.use_mavlink_heartbeat else b"hi"
+            seq = (seq + 1) & 0xFF
+            s.sendto(payload, (p.upstream_ip, int(p.upstream_port)))
+            time.sleep(max(10, int(p.interval_ms)) / 1000.0)
+        return True
+    except OSError:
+        return False
+    finally:
+        if s is not None:
+            s.close()
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from omnilink.telemetry.mavlink_utils import MSG_IDS
+from omnilink.utils import is_multicast_ip, is_valid_ip, is_valid_port
+
+
+INPUT_UDP_SERVER = "udp"
+INPUT_TCP_CLIENT = "tcp"
+
+
+MSGID_MAX = 0xFFFFFF
+
+
+@dataclass
+class TargetRules:
+    """
+    Output options of one UDP target. Filter: empty allow lists let everything through;
+    deny wins over allow. `rates` caps a msgid to N messages per second per source
+    (sysid, compid). A multicast group target also takes a TTL and an outgoing interface.
+    """
+    allow_msgs: List[int] = field(default_factory=list)
+    deny_msgs: List[int] = field(default_factory=list)
+    allow_sysids: List[int] = field(default_factory=list)
+    deny_sysids: List[int] = field(default_factory=list)
+    rates: Dict[int, float] = field(default_factory=dict)
+    # Multicast only; 0 / "" = system default (TTL 1, routing table).
+    ttl: int = 0
+    iface: str = ""
+
+    def filters(self) -> bool:
+        return bool(self.allow_msgs or self.deny_msgs or self.allow_sysids or self.deny_sysids or self.rates)
+
+    def empty(self) -> bool:
+        return not (self.filters() or self.ttl or self.iface)
+
+
+@dataclass
+class RouterSettings:
+    """
+    Routing topology shared by the mavlink-routerd config writer and the built-in engine.
+    """
+    input_mode: str = INPUT_UDP_SERVER
+    listen_port: int = 19856
+    tcp_up_ip: str = ""
+    tcp_up_port: int = 5760
+    tcp_server_port: int = 5760
+    targets: List[tuple[str, int]] = field(default_factory=list)
+    # Only targets that filter anything have an entry.
+    target_rules: Dict[tuple[str, int], TargetRules] = field(default_factory=dict)
+    # UDP port where any GCS sending MAVLink joins the fan-out (0 = off, built-in engine only).
+    discovery_port: int = 0
+    # A discovered client that has sent nothing for this long is dropped.
+    discovery_timeout_s: float = 15.0
+    # Built-in engine socket I/O: recvmmsg/sendmmsg batching (Linux) and the kernel
+    # buffer size asked for on every UDP socket (0 = system default).
+    batch_io: bool = True
+    socket_buffer_kb: int = 1024
+
+
+def _parse_msgid(tok: str, line: str) -> int:
+    tok = tok.strip()
+    if tok.isdigit():
+        msgid = int(tok)
+    else:
+        msgid = MSG_IDS.get(tok.upper(), -1)
+    if not 0 <= msgid <= MSGID_MAX:
+        raise ValueError(f"Msgid tidak dikenal: {tok} ({line})")
+    return msgid
+
+
+def _parse_sysid(tok: str, line: str) -> int:
+    tok = tok.strip()
+    if not tok.isdigit() or not 0 <= int(tok) <= 255:
+        raise ValueError(f"Sysid invalid: {tok} ({line})")
+    return int(tok)
+
+
+def _parse_rules(tokens: List[str], line: str) -> TargetRules:
+    rules = TargetRules()
+    for tok in tokens:
+        key, sep, value = tok.partition("=")
+        items = [v for v in value.split(",") if v.strip()]
+        if not sep or not items:
+            raise ValueError(f"Aturan target invalid: {tok} ({line})")
+        key = key.lower()
+        if key == "allow":
+            rules.allow_msgs += [_parse_msgid(v, line) for v in items]
+        elif key == "deny":
+            rules.deny_msgs += [_parse_msgid(v, line) for v in items]
+        elif key == "sysid":
+            rules.allow_sysids += [_parse_sysid(v, line) for v in items]
+        elif key == "deny_sysid":
+            rules.deny_sysids += [_parse_sysid(v, line) for v in items]
+        elif key == "ttl":
+            if len(items) != 1 or not items[0].isdigit() or not 1 <= int(items[0]) <= 255:
+                raise ValueError(f"TTL invalid: {value} ({line})")
+            rules.ttl = int(items[0])
+        elif key == "iface":
+            if len(items) != 1 or not is_valid_ip(items[0]):
+                raise ValueError(f"Interface invalid: {value} ({line})")
+            rules.iface = items[0]
+        elif key == "rate":
+            for v in items:
+                name, colon, hz = v.rpartition(":")
+                try:
+                    rate = float(hz)
+                except ValueError:
+                    rate = 0.0
+                if not colon or not rate > 0:
+                    raise ValueError(f"Rate invalid: {v} (gunakan MSG:HZ)")
+                rules.rates[_parse_msgid(name, line)] = rate
+        else:
+            raise ValueError(f"Aturan target tidak dikenal: {key} ({line})")
+    return rules
+
+
+def parse_targets_with_rules(text: str) -> Tuple[List[tuple[str, int]], Dict[tuple[str, int], TargetRules]]:
+    """
+    One target per line: IP:PORT followed by optional rules, e.g.
+    "192.168.144.120:14550 deny=RAW_IMU rate=ATTITUDE:10,GLOBAL_POSITION_INT:5".
+    Rules: allow=/deny= msgids (number or name), sysid=/deny_sysid= source system ids and
+    rate=MSG:HZ. Lists are comma separated. A multicast group (224.0.0.0/4) is published
+    once for every listener; it also takes ttl=N and iface=LOCAL_IP.
+    """
+    items: List[tuple[str, int]] = []
+    rules: Dict[tuple[str, int], TargetRules] = {}
+    for raw in text.splitlines():
+        parts = raw.split()
+        if not parts:
+            continue
+        line = " ".join(parts)
+        addr = parts[0]
+        if ":" not in addr:
+            raise ValueError(f"Target invalid: {line} (gunakan IP:PORT)")
+        ip, ps = addr.rsplit(":", 1)
+        if not is_valid_ip(ip):
+            raise ValueError(f"Target IP invalid: {ip}")
+        if not ps.isdigit():
+            raise ValueError(f"Target port invalid: {line}")
+        port = int(ps)
+        if not is_valid_port(port):
+            raise ValueError(f"Target port invalid: {line}")
+        key = (ip, port)
+        r = _parse_rules(parts[1:], line)
+        if (r.ttl or r.iface) and not is_multicast_ip(ip):
+            raise ValueError(f"ttl/iface hanya untuk target multicast: {line}")
+        if key in items and rules.get(key, TargetRules()) != r:
+            raise ValueError(f"Target duplikat dengan aturan berbeda: {addr}")
+        items.append(key)
+        if not r.empty():
+            rules[key] = r
+    return items, rules
+
+
+def parse_targets(text: str) -> List[tuple[str, int]]:
+    return parse_targets_with_rules(text)[0]
+
+
+def unique_targets(targets: List[tuple[str, int]]) -> List[tuple[str, int]]:
+    out: List[tuple[str, int]] = []
+    seen = set()
+    for key in targets:
+        if key in seen:
+            continue
+        seen.add(key)
+        out.append(key)
+    return out
+
+
+def validate_settings(s: RouterSettings) -> None:
+    if s.input_mode == INPUT_UDP_SERVER:
+        if not is_valid_port(s.listen_port):
+            raise ValueError("Listen port invalid")
+    elif s.input_mode == INPUT_TCP_CLIENT:
+        if not is_valid_ip(s.tcp_up_ip):
+            raise ValueError("TCP upstream IP invalid")
+        if not is_valid_port(s.tcp_up_port):
+            raise ValueError("TCP upstream port invalid")
+    else:
+        raise ValueError(f"Input mode invalid: {s.input_mode}")
+    if s.tcp_server_port != 0 and not is_valid_port(s.tcp_server_port):
+        raise ValueError("TCP server port invalid")
+    if s.discovery_port:
+        if not is_valid_port(s.discovery_port):
+            raise ValueError("Discovery port invalid")
+        if s.input_mode == INPUT_UDP_SERVER and s.discovery_port == s.listen_port:
+            raise ValueError("Discovery port sama dengan listen port")
+        if not s.discovery_timeout_s > 0:
+            raise ValueError("Timeout discovery invalid")
+    elif not s.targets:
+        raise ValueError("Target fanout kosong")
+    if s.socket_buffer_kb < 0:
+        raise ValueError("Socket buffer invalid")
+    for key, r in s.target_rules.items():
+        if key not in s.targets:
+            raise ValueError(f"Aturan untuk target yang tidak ada: {key[0]}:{key[1]}")
+        if any(not 0 <= m <= MSGID_MAX for m in r.allow_msgs + r.deny_msgs + list(r.rates)):
+            raise ValueError(f"Msgid invalid untuk target {key[0]}:{key[1]}")
+        if any(not 0 <= x <= 255 for x in r.allow_sysids + r.deny_sysids):
+            raise ValueError(f"Sysid invalid untuk target {key[0]}:{key[1]}")
+        if any(not hz > 0 for hz in r.rates.values()):
+            raise ValueError(f"Rate invalid untuk target {key[0]}:{key[1]}")
+        if (r.ttl or r.iface) and not is_multicast_ip(key[0]):
+            raise ValueError(f"ttl/iface hanya untuk target multicast: {key[0]}:{key[1]}")
+        if not 0 <= r.ttl <= 255 or (r.iface and not is_valid_ip(r.iface)):
+            raise ValueError(f"TTL/interface invalid untuk target {key[0]}:{key[1]}")
+
+
+def build_input_lines(s: RouterSettings) -> List[str]:
+    if s.input_mode == INPUT_UDP_SERVER:
+        return ["[UdpEndpoint input]", "Mode=Server", "Address=0.0.0.0", f"Port={s.listen_port}", ""]
+    return ["[TcpEndpoint input]", "Mode=Client", f"Address={s.tcp_up_ip}", f"Port={s.tcp_up_port}", ""]
+
+
+def build_output_lines(
+    targets: List[tuple[str, int]], rules: Optional[Dict[tuple[str, int], TargetRules]] = None
+) -> List[str]:
+    lines: List[str] = []
+    for i, (ip, port) in enumerate(unique_targets(targets), start=1):
+        lines += [f"[UdpEndpoint gcs{i}]", "Mode=Normal", f"Address={ip}", f"Port={port}"]
+        r = (rules or {}).get((ip, port))
+        if r is not None:
+            # mavlink-routerd has no rate limiting or multicast TTL/interface option;
+            # callers reject `rates`, `ttl` and `iface` for it.
+            for key, ids in (
+                ("AllowMsgIdOut", r.allow_msgs),
+                ("BlockMsgIdOut", r.deny_msgs),
+                ("AllowSrcSysOut", r.allow_sysids),
+                ("BlockSrcSysOut", r.deny_sysids),
+            ):
+                if ids:
+                    lines.append(f"{key}={','.join(str(x) for x in ids)}")
+        lines.append("")
+    return lines
+
+
+def build_config_text(s: RouterSettings) -> str:
+    validate_settings(s)
+
+    lines: List[str] = []
+    lines.append("[General]")
+    lines.append(f"TcpServerPort={s.tcp_server_port}")
+    lines.append("ReportStats=false")
+    lines.append("")
+
+    lines += build_input_lines(s)
+    lines += build_output_lines(s.targets, s.target_rules)
+
+    return "\n".join(lines)
+
+
+@dataclass
+class RouterDiff:
+    """
+    What a live reconfiguration changes, as short "target 1.2.3.4:14550" style items.
+    `restart` is set when the router process had to be restarted (mavlink-routerd);
+    `switch_s` is the time the switch took.
+    """
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    restart: bool = False
+    switch_s: float = 0.0
+
+    def empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    def describe(self) -> str:
+        parts = [f"+{x}" for x in self.added] + [f"-{x}" for x in self.removed] + [f"~{x}" for x in self.changed]
+        return ", ".join(parts) if parts else "no changes"
+
+
+def input_key(s: RouterSettings) -> tuple:
+    if s.input_mode == INPUT_UDP_SERVER:
+        return (s.input_mode, s.listen_port)
+    return (s.input_mode, s.tcp_up_ip, s.tcp_up_port)
+
+
+def describe_input(s: RouterSettings) -> str:
+    if s.input_mode == INPUT_UDP_SERVER:
+        return f"input udp :{s.listen_port}"
+    return f"input tcp {s.tcp_up_ip}:{s.tcp_up_port}"
+
+
+def diff_settings(old: RouterSettings, new: RouterSettings) -> RouterDiff:
+    d = RouterDiff()
+    if input_key(old) != input_key(new):
+        d.changed.append(f"{describe_input(old)} -> {describe_input(new)}")
+
+    old_t = unique_targets(old.targets)
+    new_t = unique_targets(new.targets)
+    d.added += [f"target {ip}:{port}" for ip, port in new_t if (ip, port) not in old_t]
+    d.removed += [f"target {ip}:{port}" for ip, port in old_t if (ip, port) not in new_t]
+    for key in new_t:
+        if key in old_t and old.target_rules.get(key, TargetRules()) != new.target_rules.get(key, TargetRules()):
+            d.changed.append(f"rules {key[0]}:{key[1]}")
+
+    if old.tcp_server_port != new.tcp_server_port:
+        if not old.tcp_server_port:
+            d.added.append(f"tcp server :{new.tcp_server_port}")
+        elif not new.tcp_server_port:
+            d.removed.append(f"tcp server :{old.tcp_server_port}")
+        else:
+            d.changed.append(f"tcp server :{old.tcp_server_port} -> :{new.tcp_server_port}")
+
+    if old.discovery_port != new.discovery_port:
+        if not old.discovery_port:
+            d.added.append(f"discovery :{new.discovery_port}")
+        elif not new.discovery_port:
+            d.removed.append(f"discovery :{old.discovery_port}")
+        else:
+            d.changed.append(f"discovery :{old.discovery_port} -> :{new.discovery_port}")
+    elif new.discovery_port and old.discovery_timeout_s != new.discovery_timeout_s:
+        d.changed.append(f"discovery timeout {new.discovery_timeout_s:g} s")
+
+    if (old.batch_io, old.socket_buffer_kb) != (new.batch_io, new.socket_buffer_kb):
+        d.changed.append("socket I/O options (new sockets only)")
+    return d
@@ -0,0 +1,701 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from omnilink.telemetry.batch_io import HAVE_MMSG, create_batch_datagram_endpoint, tune_socket_buffers
+from omnilink.telemetry.link_stats import LinkMetrics, LinkQuality
+from omnilink.telemetry.mavlink_parser import MavlinkParser
+from omnilink.telemetry.multicast import DEFAULT_MULTICAST_TTL, open_multicast_sender
+from omnilink.telemetry.router_config import (
+    INPUT_TCP_CLIENT,
+    RouterSettings,
+    RouterDiff,
+    TargetRules,
+    diff_settings,
+    input_key,
+    unique_targets,
+    validate_settings,
+)
+from omnilink.utils import is_multicast_ip
+
+log = logging.getLogger(__name__)
+
+# Per-client cap on unsent TCP data; a slow client loses frames instead of growing a queue.
+TCP_CLIENT_MAX_BUFFER = 256 * 1024
+TCP_RECONNECT_S = 1.0
+# Cap on discovered clients; packets from further new addresses are ignored.
+DISCOVERY_MAX_CLIENTS = 64
+
+_MAVLINK_STX = (0xFD, 0xFE)
+
+
+@dataclass
+class DiscoveredClient:
+    address: str
+    port: int
+    idle_s: float
+    rx_packets: int
+    tx_packets: int
+
+
+class TargetFilter:
+    """
+    TargetRules compiled for the hot path: a 256-entry sysid table and one msgid dict
+    mapping to None (drop), 0.0 (pass) or the minimum interval in seconds, so a frame costs
+    two lookups however many rules there are. Rate limits keep one due time per
+    (sysid, compid, msgid).
+    """
+
+    def __init__(self, rules: TargetRules):
+        sys_ok = bytearray([0 if rules.allow_sysids else 1]) * 256
+        for s in rules.allow_sysids:
+            sys_ok[s] = 1
+        for s in rules.deny_sysids:
+            sys_ok[s] = 0
+        self.sys_ok = bytes(sys_ok)
+        self.default: Optional[float] = None if rules.allow_msgs else 0.0
+        table: Dict[int, Optional[float]] = {m: 0.0 for m in rules.allow_msgs}
+        for m, hz in rules.rates.items():
+            if table.get(m, self.default) is not None:
+                table[m] = 1.0 / hz
+        for m in rules.deny_msgs:
+            table[m] = None
+        self.table = table
+        self._due: Dict[int, float] = {}
+
+    def accept(self, sysid: int, compid: int, msgid: int, now: float) -> bool:
+        if not self.sys_ok[sysid]:
+            return False
+        iv = self.table.get(msgid, self.default)
+        if iv is None:
+            return False
+        if not iv:
+            return True
+        key = (sysid << 32) | (compid << 24) | msgid
+        due = self._due.get(key, 0.0)
+        if now < due:
+            return False
+        # Keep the cadence when on time, restart it after a pause.
+        self._due[key] = due + iv if now - due < iv else now + iv
+        return True
+
+
+def _target_filter(rules: Optional[TargetRules]) -> Optional[TargetFilter]:
+    return TargetFilter(rules) if rules is not None and rules.filters() else None
+
+
+class _Endpoint(ABC):
+    """
+    One routing endpoint. `send` is the only method on the hot path and `route` is the
+    precomputed tuple of send callables of the endpoints that take whole chunks, rebuilt
+    only when the topology changes (TCP client connect/disconnect).
+
+    The other endpoints are in `frame_route`: the chunk is parsed and each complete frame
+    is sent on its own. That covers endpoints with a `filter` (only frames it accepts) and,
+    for a `stream` (TCP) source, every datagram endpoint: a TCP chunk can be any size and
+    start or end inside a frame, so only raw bytes go to other streams.
+    """
+
+    stream = False
+
+    def __init__(self, router: "_Router", name: str):
+        self.router = router
+        self.name = name
+        self.route: tuple[Callable[[bytes], None], ...] = ()
+        self.frame_route: tuple[_Endpoint, ...] = ()
+        self.filter: Optional[TargetFilter] = None
+        # Extra per-frame callback of the input endpoint (link quality).
+        self.frame_hook: Optional[Callable[..., None]] = None
+        self.rx_packets = 0
+        self.rx_bytes = 0
+        self.tx_packets = 0
+        self.tx_bytes = 0
+        self.dropped = 0
+        self.filtered = 0
+        self.parser: Optional[MavlinkParser] = None
+        self._now = 0.0
+
+    @abstractmethod
+    def send(self, data: bytes) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+    def _received(self, data: bytes) -> None:
+        self.rx_packets += 1
+        self.rx_bytes += len(data)
+        for send in self.route:
+            send(data)
+        if self.parser is not None:
+            self._now = time.monotonic()
+            self.parser.feed(data)
+
+    def _on_frame(self, frame: memoryview, sysid: int, compid: int, msgid: int, seq: int) -> None:
+        if self.frame_hook is not None:
+            self.frame_hook(frame, sysid, compid, msgid, seq)
+        data = None
+        for ep in self.frame_route:
+            f = ep.filter
+            if f is None or f.accept(sysid, compid, msgid, self._now):
+                if data is None:
+                    data = bytes(frame)
+                ep.send(data)
+            else:
+                ep.filtered += 1
+
+
+class _UdpEndpoint(_Endpoint, asyncio.DatagramProtocol):
+    """
+    peer=None: server mode, replies go to the last sender (mavlink-routerd Mode=Server).
+    peer set: fixed remote address (mavlink-routerd Mode=Normal).
+    """
+
+    def __init__(self, router: "_Router", name: str, peer: Optional[tuple[str, int]] = None):
+        super().__init__(router, name)
+        self.peer = peer
+        self.transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.peer = addr
+        self._received(data)
+
+    def error_received(self, exc):
+        # ICMP port unreachable from an absent GCS is normal, keep sending.
+        pass
+
+    def send(self, data: bytes) -> None:
+        if self.transport is None or self.peer is None:
+            return
+        self.transport.sendto(data, self.peer)
+        self.tx_packets += 1
+        self.tx_bytes += len(data)
+
+    def close(self) -> None:
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+
+class _MulticastEndpoint(_UdpEndpoint):
+    """
+    A multicast group target: each frame is sent once, whatever the number of listeners.
+    Listeners answering by unicast reach this socket, but never change where it publishes.
+    """
+
+    def datagram_received(self, data, addr):
+        self._received(data)
+
+    def set_options(self, rules: TargetRules) -> None:
+        sock = self.transport.get_extra_info("socket") if self.transport else None
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, rules.ttl or DEFAULT_MULTICAST_TTL)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(rules.iface or "0.0.0.0"))
+
+
+class _DiscoveredEndpoint(_Endpoint):
+    """A GCS found on the discovery port; sends through the shared discovery socket."""
+
+    def __init__(self, router: "_Router", server: "_DiscoveryServer", addr: tuple[str, int]):
+        super().__init__(router, f"client {addr[0]}:{addr[1]}")
+        self.server = server
+        self.addr = addr
+        self.last_rx = 0.0
+
+    def send(self, data: bytes) -> None:
+        t = self.server.transport
+        if t is None:
+            return
+        t.sendto(data, self.addr)
+        self.tx_packets += 1
+        self.tx_bytes += len(data)
+
+
+class _DiscoveryServer(asyncio.DatagramProtocol):
+    """
+    UDP port where every address that sends MAVLink becomes a fan-out endpoint. Clients are
+    kept in least recently heard order: a packet is one dict lookup plus move_to_end, and
+    expiry pops idle clients from the front until it meets one that is still active.
+    """
+
+    def __init__(self, router: "_Router", timeout_s: float):
+        self.router = router
+        self.timeout_s = float(timeout_s)
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.clients: "OrderedDict[tuple[str, int], _DiscoveredEndpoint]" = OrderedDict()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._schedule()
+
+    def datagram_received(self, data, addr):
+        c = self.clients.get(addr)
+        if c is None:
+            # Only MAVLink joins; stray probes and scans do not.
+            if not data or data[0] not in _MAVLINK_STX or len(self.clients) >= DISCOVERY_MAX_CLIENTS:
+                return
+            c = _DiscoveredEndpoint(self.router, self, addr)
+            self.clients[addr] = c
+            self.router.attach(c)
+            log.info("discovery: %s:%d joined", addr[0], addr[1])
+        else:
+            self.clients.move_to_end(addr)
+        c.last_rx = time.monotonic()
+        c._received(data)
+
+    def error_received(self, exc):
+        pass
+
+    def expire(self) -> None:
+        now = time.monotonic()
+        while self.clients:
+            addr, c = next(iter(self.clients.items()))
+            if now - c.last_rx < self.timeout_s:
+                break
+            del self.clients[addr]
+            self.router.detach(c)
+            log.info("discovery: %s:%d timed out", addr[0], addr[1])
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self.transport is not None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(min(1.0, self.timeout_s / 4), self.expire)
+
+    def snapshot(self) -> List[DiscoveredClient]:
+        now = time.monotonic()
+        return [
+            DiscoveredClient(a[0], a[1], now - c.last_rx, c.rx_packets, c.tx_packets)
+            for a, c in list(self.clients.items())
+        ]
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+        for c in self.clients.values():
+            self.router.detach(c)
+        self.clients.clear()
+
+
+class _TcpEndpoint(_Endpoint, asyncio.Protocol):
+    stream = True
+
+    def __init__(self, router: "_Router", name: str):
+        super().__init__(router, name)
+        self.transport: Optional[asyncio.Transport] = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.router.attach(self)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self.router.detach(self)
+
+    def data_received(self, data):
+        self._received(data)
+
+    def send(self, data: bytes) -> None:
+        t = self.transport
+        if t is None:
+            return
+        if t.get_write_buffer_size() > TCP_CLIENT_MAX_BUFFER:
+            self.dropped += 1
+            return
+        t.write(data)
+        self.tx_packets += 1
+        self.tx_bytes += len(data)
+
+    def close(self) -> None:
+        if self.transport:
+            self.transport.close()
+
+
+class _Router:
+    def __init__(self, settings: RouterSettings):
+        self.settings = settings
+        self.endpoints: List[_Endpoint] = []
+        self.targets: Dict[tuple[str, int], _UdpEndpoint] = {}
+        self.tcp_server: Optional[asyncio.AbstractServer] = None
+        self.discovery: Optional[_DiscoveryServer] = None
+        self._closing = False
+        self._input_task: Optional[asyncio.Task] = None
+        self._targets_opened = 0
+        # Vehicle-side stream metrics, fed from whatever arrives on the input endpoint.
+        self.link_quality = LinkQuality()
+        self.parser = MavlinkParser(on_crc_error=self.link_quality.on_crc_error)
+
+    def attach(self, ep: _Endpoint) -> None:
+        if ep.name == "input":
+            self.parser.on_frame = ep._on_frame
+            ep.parser = self.parser
+            ep.frame_hook = self.link_quality.on_frame
+        if ep not in self.endpoints:
+            self.endpoints.append(ep)
+            self.rebuild_routes()
+
+    def detach(self, ep: _Endpoint) -> None:
+        # Only an input that was still routed reconnects; a replaced one was removed first.
+        if ep not in self.endpoints:
+            return
+        self.endpoints.remove(ep)
+        self.rebuild_routes()
+        if ep.name == "input" and not self._closing:
+            self._input_task = asyncio.get_running_loop().create_task(self._connect_tcp_input())
+
+    def rebuild_routes(self) -> None:
+        for ep in self.endpoints:
+            others = [o for o in self.endpoints if o is not ep]
+            ep.route = tuple(o.send for o in others if o.filter is None and (o.stream or not ep.stream))
+            ep.frame_route = tuple(o for o in others if o.filter is not None or (ep.stream and not o.stream))
+            if ep.name != "input":
+                # Only parse what a filtered or datagram endpoint needs.
+                if not ep.frame_route:
+                    ep.parser = None
+                elif ep.parser is None:
+                    ep.parser = MavlinkParser(on_frame=ep._on_frame)
+
+    async def open(self) -> None:
+        s = self.settings
+        await self._open_input()
+        for key in unique_targets(s.targets):
+            ep = await self._open_target(key, s)
+            self.targets[key] = ep
+            self.attach(ep)
+        if s.discovery_port:
+            self.discovery = await self._open_discovery(s)
+        if s.tcp_server_port:
+            self.tcp_server = await self._open_tcp_server(s)
+
+    async def _open_input(self) -> None:
+        loop = asyncio.get_running_loop()
+        s = self.settings
+        if s.input_mode == INPUT_TCP_CLIENT:
+            self._input_task = loop.create_task(self._connect_tcp_input())
+        else:
+            _t, ep = await self._udp(s, lambda: _UdpEndpoint(self, "input"), local_addr=("0.0.0.0", s.listen_port))
+            self.attach(ep)
+
+    async def _udp(
+        self,
+        s: RouterSettings,
+        factory,
+        local_addr: Optional[tuple[str, int]] = None,
+        sock: Optional[socket.socket] = None,
+    ):
+        """UDP endpoint on the batched transport when enabled and available, else plain asyncio."""
+        if s.batch_io and HAVE_MMSG:
+            transport, proto = await create_batch_datagram_endpoint(factory, local_addr=local_addr, sock=sock)
+        elif sock is not None:
+            transport, proto = await asyncio.get_running_loop().create_datagram_endpoint(factory, sock=sock)
+        elif local_addr is not None:
+            transport, proto = await asyncio.get_running_loop().create_datagram_endpoint(factory, local_addr=local_addr)
+        else:
+            transport, proto = await asyncio.get_running_loop().create_datagram_endpoint(factory, family=socket.AF_INET)
+        if s.socket_buffer_kb:
+            size = s.socket_buffer_kb * 1024
+            tune_socket_buffers(transport.get_extra_info("socket"), size, size)
+        return transport, proto
+
+    async def _open_target(self, key: tuple[str, int], s: RouterSettings) -> _UdpEndpoint:
+        """The target's endpoint with its filter, not attached yet."""
+        self._targets_opened += 1
+        name = f"gcs{self._targets_opened}"
+        rules = s.target_rules.get(key)
+        if is_multicast_ip(key[0]):
+            opts = rules or TargetRules()
+            _t, ep = await self._udp(
+                s,
+                lambda: _MulticastEndpoint(self, name, key),
+                sock=open_multicast_sender(opts.ttl, opts.iface),
+            )
+        else:
+            _t, ep = await self._udp(s, lambda: _UdpEndpoint(self, name, key))
+        ep.filter = _target_filter(rules)
+        return ep
+
+    async def _open_discovery(self, s: RouterSettings) -> "_DiscoveryServer":
+        _t, server = await self._udp(
+            s,
+            lambda: _DiscoveryServer(self, s.discovery_timeout_s),
+            local_addr=("0.0.0.0", s.discovery_port),
+        )
+        return server
+
+    async def _open_tcp_server(self, s: RouterSettings) -> asyncio.AbstractServer:
+        return await asyncio.get_running_loop().create_server(
+            lambda: _TcpEndpoint(self, "tcp"),
+            host="0.0.0.0",
+            port=s.tcp_server_port,
+            reuse_address=True,
+        )
+
+    async def _connect_tcp_input(self) -> None:
+        loop = asyncio.get_running_loop()
+        s = self.settings
+        while not self._closing:
+            try:
+                await loop.create_connection(lambda: _TcpEndpoint(self, "input"), s.tcp_up_ip, s.tcp_up_port)
+                return
+            except OSError as e:
+                log.debug("tcp input %s:%d: %s", s.tcp_up_ip, s.tcp_up_port, e)
+                await asyncio.sleep(TCP_RECONNECT_S)
+
+    async def apply(self, new: RouterSettings) -> None:
+        """
+        Switch to `new` touching only what differs; endpoints that stay keep their sockets,
+        peers and counters. Every new socket is opened before anything is changed and the
+        switch itself never awaits, so a failed bind (OSError) or a cancellation while
+        opening leaves the router as it was, and `settings` always describes the sockets.
+        """
+        old = self.settings
+        loop = asyncio.get_running_loop()
+        input_changed = input_key(old) != input_key(new)
+        disc_changed = new.discovery_port != old.discovery_port
+        tcp_changed = new.tcp_server_port != old.tcp_server_port
+        wanted = unique_targets(new.targets)
+        opened: list = []
+        new_targets: Dict[tuple[str, int], _UdpEndpoint] = {}
+        try:
+            new_input = None
+            if input_changed and new.input_mode != INPUT_TCP_CLIENT:
+                _t, new_input = await self._udp(
+                    new,
+                    lambda: _UdpEndpoint(self, "input"),
+                    local_addr=("0.0.0.0", new.listen_port),
+                )
+                opened.append(new_input)
+            new_disc = None
+            if disc_changed and new.discovery_port:
+                new_disc = await self._open_discovery(new)
+                opened.append(new_disc)
+            new_tcp = None
+            if tcp_changed and new.tcp_server_port:
+                new_tcp = await self._open_tcp_server(new)
+                opened.append(new_tcp)
+            for key in wanted:
+                if key not in self.targets:
+                    ep = new_targets[key] = await self._open_target(key, new)
+                    opened.append(ep)
+        except BaseException:
+            for x in opened:
+                x.close()
+            raise
+
+        self.settings = new
+        if input_changed:
+            if self._input_task:
+                self._input_task.cancel()
+                self._input_task = None
+            for ep in [ep for ep in self.endpoints if ep.name == "input"]:
+                # Removed before close(), so a TCP input does not reconnect to the old peer.
+                self.endpoints.remove(ep)
+                ep.close()
+            if new_input is not None:
+                self.attach(new_input)
+            else:
+                self._input_task = loop.create_task(self._connect_tcp_input())
+
+        if disc_changed:
+            if self.discovery:
+                self.discovery.close()
+            self.discovery = new_disc
+        elif self.discovery:
+            self.discovery.timeout_s = float(new.discovery_timeout_s)
+
+        if tcp_changed:
+            # Clients already connected stay; only the listening socket moves.
+            if self.tcp_server:
+                self.tcp_server.close()
+            self.tcp_server = new_tcp
+
+        for key in [k for k in self.targets if k not in wanted]:
+            ep = self.targets.pop(key)
+            ep.close()
+            if ep in self.endpoints:
+                self.endpoints.remove(ep)
+        for key in wanted:
+            ep = new_targets.get(key)
+            if ep is not None:
+                self.targets[key] = ep
+                self.attach(ep)
+            elif old.target_rules.get(key) != new.target_rules.get(key):
+                ep = self.targets[key]
+                rules = new.target_rules.get(key)
+                ep.filter = _target_filter(rules)
+                if isinstance(ep, _MulticastEndpoint):
+                    ep.set_options(rules or TargetRules())
+        self.rebuild_routes()
+
+    async def close(self) -> None:
+        self._closing = True
+        if self._input_task:
+            self._input_task.cancel()
+        if self.tcp_server:
+            self.tcp_server.close()
+        if self.discovery:
+            self.discovery.close()
+        for ep in list(self.endpoints):
+            ep.close()
+        self.endpoints.clear()
+        self.targets.clear()
+        await asyncio.sleep(0)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        out: Dict[str, Dict[str, int]] = {}
+        for ep in list(self.endpoints):
+            key = ep.name if ep.name not in out else f"{ep.name}{len(out)}"
+            out[key] = {
+                "rx_packets": ep.rx_packets,
+                "rx_bytes": ep.rx_bytes,
+                "tx_packets": ep.tx_packets,
+                "tx_bytes": ep.tx_bytes,
+                "dropped": ep.dropped,
+                "filtered": ep.filtered,
+            }
+        return out
+
+
+class RouterEngine:
+    """
+    In-process replacement for mavlink-routerd covering the same topology:
+    UDP server or TCP client input, N UDP targets (unicast or multicast groups) and a TCP
+    server port, plus an optional discovery port whose senders join the fan-out until
+    they go quiet.
+    Every packet received on one endpoint is forwarded to all other endpoints; targets
+    with TargetRules get only the frames their filter accepts.
+    All sockets live on one asyncio loop running in a background thread.
+    """
+
+    def __init__(self, settings: RouterSettings):
+        validate_settings(settings)
+        self._settings = settings
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._router: Optional[_Router] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_evt: Optional[asyncio.Event] = None
+
+    @property
+    def settings(self) -> RouterSettings:
+        """The settings the router runs with, i.e. the last ones it actually applied."""
+        router = self._router
+        return router.settings if router is not None else self._settings
+
+    def start(self, timeout: float = 2.0) -> None:
+        """
+        Open all sockets and start forwarding. Raises OSError when a port cannot be bound.
+        """
+        if self.is_running():
+            return
+
+        ready = threading.Event()
+        result: List[Optional[BaseException]] = [None]
+
+        def run():
+            loop = asyncio.new_event_loop()
+            self._loop = loop
+            try:
+                loop.run_until_complete(self._main(ready, result))
+            finally:
+                loop.close()
+                self._loop = None
+
+        self._thread = threading.Thread(target=run, name="omnilink-router", daemon=True)
+        self._thread.start()
+        if not ready.wait(timeout):
+            self.stop()
+            raise OSError("router engine start timeout")
+        if result[0] is not None:
+            self._thread.join(timeout)
+            self._thread = None
+            raise result[0]
+
+    async def _main(self, ready: threading.Event, result: List[Optional[BaseException]]) -> None:
+        self._stop_evt = asyncio.Event()
+        router = _Router(self._settings)
+        try:
+            await router.open()
+        except BaseException as e:
+            await router.close()
+            result[0] = e
+            ready.set()
+            return
+        self._router = router
+        ready.set()
+        try:
+            await self._stop_evt.wait()
+        finally:
+            self._settings = router.settings
+            self._router = None
+            await router.close()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        loop = self._loop
+        if loop is not None and self._stop_evt is not None:
+            try:
+                loop.call_soon_threadsafe(self._stop_evt.set)
+            except RuntimeError:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        router = self._router
+        return router.stats() if router else {}
+
+    def link_quality(self) -> List[LinkMetrics]:
+        router = self._router
+        return router.link_quality.snapshot() if router else []
+
+    def reconfigure(self, settings: RouterSettings, timeout: float = 2.0) -> RouterDiff:
+        """
+        Apply new settings to the running engine without stopping it. Unchanged endpoints
+        keep forwarding throughout. Raises ValueError for invalid settings and OSError when
+        a new port cannot be bound.
+        """
+        validate_settings(settings)
+        diff = diff_settings(self.settings, settings)
+        loop, router = self._loop, self._router
+        if diff.empty() or loop is None or router is None:
+            self._settings = settings
+            return diff
+        t0 = time.monotonic()
+        fut = asyncio.run_coroutine_threadsafe(router.apply(settings), loop)
+        try:
+            fut.result(timeout)
+        except concurrent.futures.TimeoutError:
+            # Cancelled while opening sockets it rolls back; if the switch already ran,
+            # `settings` follows the router, so the next diff starts from what is live.
+            fut.cancel()
+            raise OSError("router reconfigure timeout") from None
+        diff.switch_s = time.monotonic() - t0
+        log.info("router reconfigured in %.1f ms: %s", diff.switch_s * 1000.0, diff.describe())
+        return diff
+
+    def clients(self) -> List[DiscoveredClient]:
+        router = self._router
+        return router.discovery.snapshot() if router and router.discovery else []
@@ -1,29 +1,50 @@
 from __future__ import annotations
 
-import os
-import tempfile
 from typing import List, Optional
 
 from PyQt5 import QtCore, QtWidgets
 
-from omnilink.utils import find_free_tcp_port, is_valid_ip, is_valid_port, set_status_label, which
-from omnilink.telemetry.workers import TcpRxDetector, UdpPrimer
+from omnilink.process import CHILD_BACKOFF, restart_summary
+from omnilink.utils import set_status_label, which
+from omnilink.telemetry.link_stats import LinkMetrics
+from omnilink.telemetry.primer import PrimerSettings
+from omnilink.telemetry.router_config import INPUT_TCP_CLIENT, INPUT_UDP_SERVER, RouterSettings, parse_targets_with_rules
+from omnilink.telemetry.service import ENGINE_BUILTIN, ENGINE_EXTERNAL, RouterService, TelemetryConfig
+from omnilink.telemetry.workers import RouterEvents
+
+PHASE_STARTING = "STARTING"
+PHASE_STOPPING = "STOPPING"
+
+# Index order of the Engine combo box.
+ENGINE_CHOICES = [ENGINE_EXTERNAL, ENGINE_BUILTIN]
+
+LINK_COLUMNS = ["SysID", "Msg/s", "kB/s", "Loss %", "CRC err %", "Last HB"]
 
 
 class RouterWidget(QtWidgets.QWidget):
+    # Emitted once an asynchronous start/stop has finished.
+    started = QtCore.pyqtSignal(bool)
+    stopped = QtCore.pyqtSignal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
 
         self.router_bin = which("mavlink-routerd") or "mavlink-routerd"
-        self.proc = QtCore.QProcess(self)
-        self.proc.setProcessChannelMode(QtCore.QProcess.MergedChannels)
-        self.proc.stateChanged.connect(self._on_proc_state)
-
-        self.primer: Optional[UdpPrimer] = None
-        self.rxdet: Optional[TcpRxDetector] = None
 
-        self._effective_tcp_port = 5760
-        self._mavlink_seen = False
+        # Primer, router and link monitor live in RouterService; this widget only renders it.
+        self.events = RouterEvents(self)
+        self.events.link_changed.connect(self._on_link_changed)
+        self.events.exited.connect(self._on_router_exited)
+        self.events.started.connect(self._on_started)
+        self.events.stopped.connect(self._on_stopped)
+        self.events.reconfigured.connect(self._on_reconfigured)
+        self.service = RouterService(
+            TelemetryConfig(),
+            on_link_change=self.events.link_changed.emit,
+            on_exit=self.events.exited.emit,
+        )
+        # "", PHASE_STARTING or PHASE_STOPPING while an async start/stop is in flight.
+        self._phase = ""
 
         self._build_ui()
         self._apply_input_mode()
@@ -46,16 +67,26 @@ class RouterWidget(QtWidgets.QWidget):
         self.btn_start = QtWidgets.QPushButton("Start Router")
         self.btn_stop = QtWidgets.QPushButton("Stop")
         self.btn_stop.setEnabled(False)
+        self.btn_apply = QtWidgets.QPushButton("Apply")
+        self.btn_apply.setEnabled(False)
+        self.btn_apply.setToolTip("Apply changed ports and targets to the running router without a restart")
 
         self.btn_start.clicked.connect(self.start)
         self.btn_stop.clicked.connect(self.stop)
+        self.btn_apply.clicked.connect(self.apply)
 
         self.state = QtWidgets.QLabel("STOPPED")
         self.state.setStyleSheet("font-weight:700; color: rgb(180, 60, 60);")
 
         top.addWidget(self.btn_start)
         top.addWidget(self.btn_stop)
+        top.addWidget(self.btn_apply)
+        self.apply_lbl = QtWidgets.QLabel("")
+        top.addWidget(self.apply_lbl)
         top.addStretch(1)
+        self.restart_lbl = QtWidgets.QLabel("")
+        self.restart_lbl.setStyleSheet("color: rgb(200, 120, 0);")
+        top.addWidget(self.restart_lbl)
         top.addWidget(QtWidgets.QLabel("Status:"))
         top.addWidget(self.state)
 
@@ -63,6 +94,11 @@ class RouterWidget(QtWidgets.QWidget):
         v.addWidget(gb)
         g = QtWidgets.QGridLayout(gb)
 
+        self.engine_sel = QtWidgets.QComboBox()
+        self.engine_sel.addItems(["mavlink-routerd", "Built-in"])
+        self.engine_sel.setCurrentIndex(ENGINE_CHOICES.index(ENGINE_EXTERNAL if which("mavlink-routerd") else ENGINE_BUILTIN))
+        self.engine_sel.currentIndexChanged.connect(lambda _i: self._apply_input_mode())
+
         self.in_mode = QtWidgets.QComboBox()
         self.in_mode.addItems(["UDP (Server)", "TCP (Client)"])
         self.in_mode.setCurrentIndex(0)
@@ -86,6 +122,15 @@ class RouterWidget(QtWidgets.QWidget):
         self.tcp_port.setRange(0, 65535)
         self.tcp_port.setValue(5760)
 
+        self.discovery_port = QtWidgets.QSpinBox()
+        self.discovery_port.setRange(0, 65535)
+        self.discovery_port.setValue(0)
+        self.discovery_port.setSpecialValueText("Off")
+        self.discovery_port.setToolTip(
+            "Any GCS that sends MAVLink to this UDP port is added to the fan-out and dropped "
+            "again after 15 s of silence (Built-in engine only)"
+        )
+
         self.run_sudo = QtWidgets.QCheckBox("Administrator")
         self.run_sudo.setChecked(False)
 
@@ -94,7 +139,19 @@ class RouterWidget(QtWidgets.QWidget):
 
         self.targets = QtWidgets.QPlainTextEdit()
         self.targets.setPlaceholderText(
-            "One target per line, format: IP:PORT\nExample:\n192.168.144.98:14550\n192.168.144.120:14550"
+            "One target per line, format: IP:PORT [rules]\nExample:\n192.168.144.98:14550\n"
+            "192.168.144.120:14550 deny=RAW_IMU rate=ATTITUDE:10"
+        )
+        self.targets.setToolTip(
+            "Optional rules after a target, comma separated lists:\n"
+            "  allow=MSG,...   only these messages (name or msgid)\n"
+            "  deny=MSG,...    drop these messages\n"
+            "  sysid=N,...     only these source system ids\n"
+            "  deny_sysid=N,.. drop these source system ids\n"
+            "  rate=MSG:HZ,... at most HZ per second per source (Built-in engine only)\n"
+            "A multicast group (224.0.0.0 - 239.255.255.255) is sent once for all listeners:\n"
+            "  ttl=N           hops beyond this network (default 1, Built-in engine only)\n"
+            "  iface=IP        local address of the interface to publish on (Built-in engine only)"
         )
         self.targets.setPlainText("192.168.144.98:14550\n192.168.144.120:14550")
 
@@ -102,7 +159,9 @@ class RouterWidget(QtWidgets.QWidget):
         self.rx_lbl.setStyleSheet("font-weight:600; color: rgb(140, 140, 140);")
 
         g.addWidget(QtWidgets.QLabel("Input mode"), 0, 0)
-        g.addWidget(self.in_mode, 0, 1, 1, 3)
+        g.addWidget(self.in_mode, 0, 1)
+        g.addWidget(QtWidgets.QLabel("Engine"), 0, 2)
+        g.addWidget(self.engine_sel, 0, 3)
 
         g.addWidget(QtWidgets.QLabel("Listen UDP port"), 1, 0)
         g.addWidget(self.listen_port, 1, 1)
@@ -122,10 +181,27 @@ class RouterWidget(QtWidgets.QWidget):
         g.addWidget(self.do_primer, 4, 0, 1, 2)
         g.addWidget(self.run_sudo, 4, 2, 1, 2)
 
-        g.addWidget(QtWidgets.QLabel("Targets"), 5, 0, 1, 4)
-        g.addWidget(self.targets, 6, 0, 1, 4)
+        g.addWidget(QtWidgets.QLabel("Discovery UDP port"), 5, 0)
+        g.addWidget(self.discovery_port, 5, 1)
+        self.clients_lbl = QtWidgets.QLabel("")
+        g.addWidget(self.clients_lbl, 5, 2, 1, 2)
+
+        g.addWidget(QtWidgets.QLabel("Targets"), 6, 0, 1, 4)
+        g.addWidget(self.targets, 7, 0, 1, 4)
+
+        g.addWidget(self.rx_lbl, 8, 0, 1, 4)
 
-        g.addWidget(self.rx_lbl, 7, 0, 1, 4)
+        gb_lq = QtWidgets.QGroupBox("Link Quality")
+        v.addWidget(gb_lq)
+        lq = QtWidgets.QVBoxLayout(gb_lq)
+
+        self.link_table = QtWidgets.QTableWidget(0, len(LINK_COLUMNS))
+        self.link_table.setHorizontalHeaderLabels(LINK_COLUMNS)
+        self.link_table.verticalHeader().setVisible(False)
+        self.link_table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.link_table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+        self.link_table.setMaximumHeight(140)
+        lq.addWidget(self.link_table)
 
         v.addStretch(1)
 
@@ -141,199 +217,198 @@ class RouterWidget(QtWidgets.QWidget):
         self.upstream_ip.setEnabled(not tcp_mode)
         self.upstream_port.setEnabled(not tcp_mode)
 
+        external = ENGINE_CHOICES[self.engine_sel.currentIndex()] == ENGINE_EXTERNAL
+        self.run_sudo.setEnabled(external)
+        self.discovery_port.setEnabled(not external)
+
     # -------------------------
-    # Validation and config build
+    # Settings
     # -------------------------
-    def _parse_targets(self) -> List[tuple[str, int]]:
-        items: List[tuple[str, int]] = []
-        for raw in self.targets.toPlainText().splitlines():
-            line = raw.strip()
-            if not line:
-                continue
-            if ":" not in line:
-                raise ValueError(f"Target invalid: {line} (gunakan IP:PORT)")
-            ip, ps = line.rsplit(":", 1)
-            ip = ip.strip()
-            ps = ps.strip()
-            if not is_valid_ip(ip):
-                raise ValueError(f"Target IP invalid: {ip}")
-            if not ps.isdigit():
-                raise ValueError(f"Target port invalid: {line}")
-            port = int(ps)
-            if not is_valid_port(port):
-                raise ValueError(f"Target port invalid: {line}")
-            items.append((ip, port))
-        if not items:
-            raise ValueError("Target fanout kosong")
-        return items
-
-    def _build_input_lines(self) -> List[str]:
+    def _collect_config(self) -> TelemetryConfig:
         tcp_mode = (self.in_mode.currentIndex() == 1)
-        if not tcp_mode:
-            addr = "0.0.0.0"
-            in_port = int(self.listen_port.value())
-            if not is_valid_port(in_port):
-                raise ValueError("Listen port invalid")
-            return ["[UdpEndpoint input]", "Mode=Server", f"Address={addr}", f"Port={in_port}", ""]
-        tip = self.tcp_up_ip.text().strip()
-        tport = int(self.tcp_up_port.value())
-        if not is_valid_ip(tip):
-            raise ValueError("TCP upstream IP invalid")
-        if not is_valid_port(tport):
-            raise ValueError("TCP upstream port invalid")
-        return ["[TcpEndpoint input]", "Mode=Client", f"Address={tip}", f"Port={tport}", ""]
-
-    def _build_output_lines(self, targets: List[tuple[str, int]]) -> List[str]:
-        lines: List[str] = []
-        seen = set()
-        i = 1
-        for ip, port in targets:
-            key = (ip, port)
-            if key in seen:
-                continue
-            seen.add(key)
-            lines += [f"[UdpEndpoint gcs{i}]", "Mode=Normal", f"Address={ip}", f"Port={port}", ""]
-            i += 1
-        return lines
-
-    def _build_config_text(self) -> str:
-        tcp_ui = int(self.tcp_port.value())
-        tcp_port = find_free_tcp_port(tcp_ui)
-        self._effective_tcp_port = tcp_port
-
-        targets = self._parse_targets()
-
-        lines: List[str] = []
-        lines.append("[General]")
-        lines.append(f"TcpServerPort={tcp_port}")
-        lines.append("ReportStats=false")
-        lines.append("")
-
-        lines += self._build_input_lines()
-        lines += self._build_output_lines(targets)
-
-        return "\n".join(lines)
-
-    def _write_temp_config(self) -> str:
-        text = self._build_config_text()
-        fd, path = tempfile.mkstemp(prefix="omni-link-router-", suffix=".conf")
-        os.close(fd)
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(text)
-        return path
+        router = RouterSettings(
+            input_mode=INPUT_TCP_CLIENT if tcp_mode else INPUT_UDP_SERVER,
+            listen_port=int(self.listen_port.value()),
+            tcp_up_ip=self.tcp_up_ip.text().strip(),
+            tcp_up_port=int(self.tcp_up_port.value()),
+            tcp_server_port=int(self.tcp_port.value()),
+            discovery_port=int(self.discovery_port.value()) if self.discovery_port.isEnabled() else 0,
+        )
+        router.targets, router.target_rules = parse_targets_with_rules(self.targets.toPlainText())
+        primer = PrimerSettings(
+            enabled=self.do_primer.isChecked(),
+            upstream_ip=self.upstream_ip.text().strip(),
+            upstream_port=int(self.upstream_port.value()),
+        )
+        return TelemetryConfig(
+            router=router,
+            engine=ENGINE_CHOICES[self.engine_sel.currentIndex()],
+            router_bin=self.router_bin,
+            sudo=self.run_sudo.isChecked(),
+            primer=primer,
+        )
 
     # -------------------------
-    # RX detection and primer
+    # RX detection
     # -------------------------
-    def _start_rx_detector(self):
-        self._mavlink_seen = False
-        self.rx_lbl.setText("RX: waiting")
-        self.rx_lbl.setStyleSheet("font-weight:600; color: rgb(140, 140, 140);")
-
-        tcp_port = int(self._effective_tcp_port)
-        if tcp_port <= 0:
-            self.rx_lbl.setText("RX: (TCP off)")
-            self.rx_lbl.setStyleSheet("font-weight:600; color: rgb(140, 140, 140);")
-            return
-
-        self.rxdet = TcpRxDetector(tcp_port)
-        self.rxdet.detected.connect(self._on_mavlink_detected)
-        self.rxdet.start()
-
-    def _on_mavlink_detected(self):
-        if self._mavlink_seen:
-            return
-        self._mavlink_seen = True
-        self.rx_lbl.setText("RX: detected")
-        self.rx_lbl.setStyleSheet("font-weight:700; color: rgb(0, 150, 0);")
-        if self.rxdet:
-            self.rxdet.stop()
-
-    def _stop_rx(self):
-        if self.rxdet:
-            self.rxdet.stop()
-            self.rxdet.wait(600)
-            self.rxdet = None
-
-    def _run_primer_blocking(self):
-        if self.in_mode.currentIndex() == 1:
-            return
-        if not self.do_primer.isChecked():
-            return
-
-        up_ip = self.upstream_ip.text().strip()
-        up_port = int(self.upstream_port.value())
-        listen_port = int(self.listen_port.value())
-
-        if not is_valid_ip(up_ip) or not is_valid_port(up_port):
+    def _on_link_changed(self, up: bool):
+        if not self.service.is_running():
             return
+        if up:
+            self.rx_lbl.setText("RX: detected")
+            self.rx_lbl.setStyleSheet("font-weight:700; color: rgb(0, 150, 0);")
+        else:
+            self.rx_lbl.setText("RX: lost")
+            self.rx_lbl.setStyleSheet("font-weight:700; color: rgb(180, 60, 60);")
 
-        self.primer = UdpPrimer(
-            listen_port=listen_port,
-            upstream_ip=up_ip,
-            upstream_port=up_port,
-            count=3,
-            interval_ms=200,
-            use_mavlink_heartbeat=True,
-        )
-        self.primer.start()
-        self.primer.wait(1200)
-        self.primer = None
+    def _show_rx_waiting(self):
+        if self.service.tcp_server_port <= 0:
+            self.rx_lbl.setText("RX: (TCP off)")
+        else:
+            self.rx_lbl.setText("RX: waiting")
+        self.rx_lbl.setStyleSheet("font-weight:600; color: rgb(140, 140, 140);")
 
     # -------------------------
     # Process lifecycle
     # -------------------------
-    def _on_proc_state(self, st: QtCore.QProcess.ProcessState):
-        running = st == QtCore.QProcess.Running
+    def _set_running(self, running: bool):
         self.btn_start.setEnabled(not running)
         self.btn_stop.setEnabled(running)
+        self.btn_apply.setEnabled(running)
+        set_status_label(self.state, "RUNNING" if running else "STOPPED", running)
 
-    def start(self):
-        if self.proc.state() == QtCore.QProcess.Running:
-            return
+    def _set_phase(self, phase: str):
+        self._phase = phase
+        self.btn_start.setEnabled(False)
+        self.btn_stop.setEnabled(phase == PHASE_STARTING)
+        self.btn_apply.setEnabled(False)
+        set_status_label(self.state, phase, phase == PHASE_STARTING)
 
-        if not which("mavlink-routerd") and self.router_bin == "mavlink-routerd":
-            QtWidgets.QMessageBox.critical(self, "OMNI-Link", "mavlink-routerd tidak ditemukan.")
-            return
+    def start(self) -> bool:
+        """Starts asynchronously (primer included); returns False if nothing was started."""
+        if self._phase or self.is_running():
+            return False
 
         try:
-            conf_path = self._write_temp_config()
-        except Exception as e:
+            self.service.cfg = self._collect_config()
+        except ValueError as e:
             QtWidgets.QMessageBox.critical(self, "OMNI-Link", str(e))
+            return False
+
+        self.state.setToolTip("")
+        self.restart_lbl.setText("")
+        self.apply_lbl.setText("")
+        self._set_phase(PHASE_STARTING)
+        self.service.start_async().add_done_callback(lambda f: self.events.started.emit(f.exception()))
+        return True
+
+    def _on_started(self, err: Optional[BaseException]):
+        if self._phase != PHASE_STARTING:
+            self.started.emit(err is None)
             return
-
-        self._run_primer_blocking()
-
-        cmd = self.router_bin
-        args = ["-c", conf_path]
-        if self.run_sudo.isChecked():
-            cmd = "sudo"
-            args = [self.router_bin] + args
-
-        self.proc.start(cmd, args)
-        if not self.proc.waitForStarted(1500):
-            QtWidgets.QMessageBox.critical(self, "OMNI-Link", "Gagal menjalankan mavlink-routerd.")
+        self._phase = ""
+        if err is not None:
+            self._set_running(False)
+            QtWidgets.QMessageBox.critical(self, "OMNI-Link", str(err))
+            self.started.emit(False)
             return
+        self._show_rx_waiting()
+        self._set_running(True)
+        self.started.emit(True)
+
+    def apply(self) -> bool:
+        """Reconfigures the running router asynchronously; returns False if nothing was sent."""
+        if self._phase or not self.is_running():
+            return False
+        try:
+            cfg = self._collect_config()
+        except ValueError as e:
+            QtWidgets.QMessageBox.critical(self, "OMNI-Link", str(e))
+            return False
+        self.btn_apply.setEnabled(False)
+        self.service.reconfigure_async(cfg).add_done_callback(
+            lambda f: self.events.reconfigured.emit(None if f.exception() else f.result(), f.exception())
+        )
+        return True
 
-        self._start_rx_detector()
-        set_status_label(self.state, "RUNNING", True)
-
-    def stop(self):
-        self._stop_rx()
-        if self.proc.state() != QtCore.QProcess.Running:
+    def _on_reconfigured(self, diff, err: Optional[BaseException]):
+        self.btn_apply.setEnabled(self.is_running() and not self._phase)
+        if err is not None:
+            self.apply_lbl.setText("")
+            QtWidgets.QMessageBox.critical(self, "OMNI-Link", str(err))
             return
-        self.proc.terminate()
-        if not self.proc.waitForFinished(1500):
-            self.proc.kill()
-            self.proc.waitForFinished(1500)
-        set_status_label(self.state, "STOPPED", False)
+        if diff.empty():
+            text = "Apply: no changes"
+        else:
+            how = "mavlink-routerd restarted" if diff.restart else "live"
+            text = f"Applied ({how}) in {diff.switch_s * 1000.0:.1f} ms: {diff.describe()}"
+        self.apply_lbl.setText(text if len(text) <= 80 else text[:77] + "...")
+        self.apply_lbl.setToolTip(text)
+
+    def _on_router_exited(self, code: int):
+        self.state.setToolTip("\n".join(self.service.proc_log.tail(15)))
+        self.stop()
+
+    def stop(self) -> bool:
+        """Stops asynchronously; returns False if a stop is already in flight."""
+        if self._phase == PHASE_STOPPING:
+            return False
+        self._set_phase(PHASE_STOPPING)
+        self.service.stop_async().add_done_callback(lambda _f: self.events.stopped.emit())
+        return True
+
+    def _on_stopped(self):
+        self._phase = ""
+        self._set_running(False)
+        self.stopped.emit()
 
     def _refresh_status(self):
-        running = self.proc.state() == QtCore.QProcess.Running
-        if running:
-            set_status_label(self.state, "RUNNING", True)
-        else:
-            set_status_label(self.state, "STOPPED", False)
+        stats = self.service.restart_stats()
+        if not self._phase:
+            if any(s.state == CHILD_BACKOFF for s in stats):
+                set_status_label(self.state, "RESTARTING", False)
+                self.state.setToolTip("\n".join(self.service.proc_log.tail(15)))
+            elif self.is_running():
+                set_status_label(self.state, "RUNNING", True)
+            else:
+                set_status_label(self.state, "STOPPED", False)
+        if stats:
+            summary = restart_summary(stats)
+            self.restart_lbl.setText(f"Restarts: {summary}" if summary else "")
+        self._refresh_link_table()
+        self._refresh_clients()
+
+    def _refresh_clients(self):
+        clients = self.service.clients()
+        if not clients:
+            self.clients_lbl.setText("")
+            self.clients_lbl.setToolTip("")
+            return
+        self.clients_lbl.setText(f"Clients: {len(clients)}")
+        self.clients_lbl.setToolTip("\n".join(f"{c.address}:{c.port}  idle {c.idle_s:.1f} s" for c in clients))
+
+    def link_metrics(self) -> List[LinkMetrics]:
+        return self.service.link_metrics()
+
+    def _refresh_link_table(self):
+        rows = self.link_metrics()
+        self.link_table.setRowCount(len(rows))
+        for r, m in enumerate(rows):
+            hb = "-" if m.since_heartbeat_s is None else f"{m.since_heartbeat_s:.1f} s"
+            cells = [
+                str(m.sysid),
+                f"{m.msgs_per_s:.1f}",
+                f"{m.bytes_per_s / 1000.0:.2f}",
+                f"{m.loss_pct:.1f}",
+                f"{m.crc_error_pct:.1f}",
+                hb,
+            ]
+            for c, text in enumerate(cells):
+                item = self.link_table.item(r, c)
+                if item is None:
+                    item = QtWidgets.QTableWidgetItem()
+                    self.link_table.setItem(r, c, item)
+                item.setText(text)
 
     def is_running(self) -> bool:
-        return self.proc.state() == QtCore.QProcess.Running
+        return self.service.is_running()
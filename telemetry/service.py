@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field, replace
+from typing import Callable, List, Optional
+
+from omnilink.process import SUP_GAVE_UP, AsyncLifecycle, ChildStats, ManagedProcess, RestartPolicy, Supervisor
+from omnilink.telemetry.link_monitor import LinkMonitor
+from omnilink.telemetry.link_stats import LinkMetrics, LinkQuality
+from omnilink.telemetry.primer import PrimerSettings, prime_udp
+from omnilink.telemetry.router_config import (
+    INPUT_UDP_SERVER,
+    RouterDiff,
+    RouterSettings,
+    build_config_text,
+    diff_settings,
+    validate_settings,
+)
+from omnilink.telemetry.router_engine import DiscoveredClient, RouterEngine
+from omnilink.utils import ProcessLogPump, find_free_tcp_port, which
+
+log = logging.getLogger(__name__)
+
+ENGINE_BUILTIN = "builtin"
+ENGINE_EXTERNAL = "mavlink-routerd"
+
+LINK_NAME = "router"
+
+
+@dataclass
+class TelemetryConfig:
+    router: RouterSettings = field(default_factory=RouterSettings)
+    engine: str = ENGINE_BUILTIN
+    # Empty: mavlink-routerd from PATH.
+    router_bin: str = ""
+    sudo: bool = False
+    primer: PrimerSettings = field(default_factory=PrimerSettings)
+    # Watch the router's local TCP server for valid MAVLink (RX detection, link quality).
+    watch_link: bool = True
+    link_silence_s: float = 1.0
+    # Restart a crashed mavlink-routerd with backoff instead of stopping telemetry.
+    auto_restart: bool = True
+
+
+class RouterService(AsyncLifecycle):
+    """
+    Telemetry side without Qt: optional UDP primer, the router itself (built-in engine or
+    mavlink-routerd) and a LinkMonitor on the router's TCP server.
+
+    Callbacks run on worker threads:
+      on_link_change(up)     RX detected / lost
+      on_exit(code)          mavlink-routerd exited without stop() being called and the
+                             supervisor gave up restarting it
+    """
+
+    def __init__(
+        self,
+        cfg: TelemetryConfig,
+        on_link_change: Optional[Callable[[bool], None]] = None,
+        on_exit: Optional[Callable[[int], None]] = None,
+    ):
+        self.cfg = cfg
+        self.on_link_change = on_link_change
+        self.on_exit = on_exit
+        self.settings: Optional[RouterSettings] = None
+        self.engine: Optional[RouterEngine] = None
+        self.proc: Optional[ManagedProcess] = None
+        self.proc_log = ProcessLogPump("mavlink-routerd")
+        self.link_quality = LinkQuality()
+        self.monitor = LinkMonitor(on_change=self._on_link, silence_s=cfg.link_silence_s)
+        self._conf_path = ""
+        # (settings, cfg) of the last built-in engine reconfigure, matched against what the
+        # engine runs.
+        self._pending: Optional[tuple] = None
+        self.supervisor = Supervisor(on_event=self._on_supervisor_event)
+
+    @property
+    def router_bin(self) -> str:
+        return self.cfg.router_bin or which("mavlink-routerd") or "mavlink-routerd"
+
+    def start(self) -> None:
+        """
+        Blocks for the primer (~count * interval) and router startup. Raises ValueError for
+        invalid settings and OSError when the router cannot be started.
+        """
+        if self.is_running():
+            return
+        cfg = self.cfg
+        builtin = cfg.engine == ENGINE_BUILTIN
+        if not builtin and not which(self.router_bin) and not os.access(self.router_bin, os.X_OK):
+            raise OSError("mavlink-routerd tidak ditemukan.")
+
+        settings = replace(cfg.router, tcp_server_port=find_free_tcp_port(cfg.router.tcp_server_port))
+        self._check_settings(settings, builtin)
+        engine = RouterEngine(settings) if builtin else None
+        conf_path = "" if builtin else self._write_config(settings)
+
+        if settings.input_mode == INPUT_UDP_SERVER and cfg.primer.usable():
+            prime_udp(settings.listen_port, cfg.primer)
+
+        if engine is not None:
+            try:
+                engine.start()
+            except OSError as e:
+                raise OSError(f"Gagal menjalankan router built-in: {e}") from e
+        else:
+            argv = [self.router_bin, "-c", conf_path]
+            if cfg.sudo:
+                argv = ["sudo"] + argv
+            proc = ManagedProcess("mavlink-routerd", argv, log_pump=self.proc_log)
+            self.supervisor.policy = RestartPolicy() if cfg.auto_restart else RestartPolicy(max_restarts=0)
+            self.supervisor.watch(proc)
+            try:
+                proc.start()
+            except OSError as e:
+                self.supervisor.unwatch(proc.name)
+                self._remove_config(conf_path)
+                raise OSError("Gagal menjalankan mavlink-routerd.") from e
+            self.proc = proc
+            self._conf_path = conf_path
+
+        self.engine = engine
+        self.settings = settings
+        self._start_link_watch()
+
+    def reconfigure(self, cfg: TelemetryConfig) -> RouterDiff:
+        """
+        Apply changed router settings while running, without the primer and without
+        dropping the endpoints that stay. The built-in engine switches in place;
+        mavlink-routerd cannot reload its config and is restarted (RouterDiff.restart).
+        Engine, binary, sudo or primer changes need stop()/start(). Raises ValueError for
+        invalid settings and OSError when a port cannot be bound or the router restarted.
+        """
+        if not self.is_running():
+            self.cfg = cfg
+            return RouterDiff()
+        if self.engine is not None:
+            self._adopt_engine_settings()
+        old = self.cfg
+        if (cfg.engine, cfg.router_bin, cfg.sudo) != (old.engine, old.router_bin, old.sudo):
+            raise ValueError("Ganti engine/binary router butuh restart (Stop lalu Start)")
+        port = cfg.router.tcp_server_port
+        if port == old.router.tcp_server_port:
+            port = self.settings.tcp_server_port
+        elif port:
+            port = find_free_tcp_port(port)
+        settings = replace(cfg.router, tcp_server_port=port)
+        self._check_settings(settings, self.engine is not None)
+
+        if self.engine is not None:
+            self._pending = (settings, cfg)
+            try:
+                diff = self.engine.reconfigure(settings)
+            except OSError:
+                self._adopt_engine_settings()
+                raise
+        else:
+            diff = diff_settings(self.settings, settings)
+            if not diff.empty():
+                t0 = time.monotonic()
+                self._restart_external(settings)
+                diff.restart = True
+                diff.switch_s = time.monotonic() - t0
+        self.cfg = cfg
+        self._set_settings(settings)
+        return diff
+
+    def _adopt_engine_settings(self) -> None:
+        """
+        A timed-out reconfigure may still have switched the engine (then or later): take
+        over what it actually runs, so the next diff starts from the live endpoints.
+        """
+        live = self.engine.settings
+        if live == self.settings:
+            return
+        if self._pending is not None and live == self._pending[0]:
+            self.cfg = self._pending[1]
+        self._set_settings(live)
+
+    def _set_settings(self, settings: RouterSettings) -> None:
+        tcp_moved = settings.tcp_server_port != self.settings.tcp_server_port
+        self.settings = settings
+        if tcp_moved:
+            self._stop_link_watch()
+            self._start_link_watch()
+
+    def reconfigure_async(self, cfg: TelemetryConfig) -> Future:
+        return self._executor().submit(self.reconfigure, cfg)
+
+    def stop(self) -> None:
+        self.supervisor.clear()
+        self._stop_link_watch()
+        if self.engine is not None:
+            self.engine.stop()
+            self.engine = None
+        self._pending = None
+        if self.proc is not None:
+            self.proc.stop()
+            self.proc = None
+        self._remove_config(self._conf_path)
+        self._conf_path = ""
+
+    def is_running(self) -> bool:
+        if self.engine is not None:
+            return self.engine.is_running()
+        # A supervised router waiting for its restart still counts as running.
+        return self.proc is not None
+
+    def restart_stats(self) -> List[ChildStats]:
+        return self.supervisor.stats()
+
+    def link_up(self) -> bool:
+        return self.monitor.is_up(LINK_NAME)
+
+    def link_metrics(self) -> List[LinkMetrics]:
+        if self.engine is not None:
+            return self.engine.link_quality()
+        if self.proc is not None and self.cfg.watch_link:
+            return self.link_quality.snapshot()
+        return []
+
+    def clients(self) -> List[DiscoveredClient]:
+        """GCS clients currently known on the discovery port (built-in engine only)."""
+        return self.engine.clients() if self.engine is not None else []
+
+    @property
+    def tcp_server_port(self) -> int:
+        return self.settings.tcp_server_port if self.settings else 0
+
+    # -------------------------
+    # Internals
+    # -------------------------
+    @staticmethod
+    def _check_settings(settings: RouterSettings, builtin: bool) -> None:
+        validate_settings(settings)
+        if not builtin and any(r.rates for r in settings.target_rules.values()):
+            raise ValueError("Rate limit target hanya didukung engine Built-in")
+        if not builtin and settings.discovery_port:
+            raise ValueError("Discovery hanya didukung engine Built-in")
+        if not builtin and any(r.ttl or r.iface for r in settings.target_rules.values()):
+            raise ValueError("TTL/interface multicast hanya didukung engine Built-in")
+
+    def _write_config(self, settings: RouterSettings, path: str = "") -> str:
+        text = build_config_text(settings)
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            return path
+        fd, path = tempfile.mkstemp(prefix="omni-link-router-", suffix=".conf")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def _restart_external(self, settings: RouterSettings) -> None:
+        proc = self.proc
+        self.supervisor.unwatch(proc.name)
+        proc.stop()
+        self._write_config(settings, self._conf_path)
+        self.supervisor.watch(proc)
+        try:
+            proc.start()
+        except OSError as e:
+            self.supervisor.unwatch(proc.name)
+            self.proc = None
+            self._stop_link_watch()
+            self._remove_config(self._conf_path)
+            self._conf_path = ""
+            raise OSError("Gagal menjalankan ulang mavlink-routerd.") from e
+
+    @staticmethod
+    def _remove_config(path: str) -> None:
+        if path:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _start_link_watch(self) -> None:
+        if not self.cfg.watch_link or self.tcp_server_port <= 0:
+            return
+        self.link_quality.reset()
+        self.monitor.start()
+        self.monitor.add_tcp(LINK_NAME, "127.0.0.1", self.tcp_server_port, link_quality=self.link_quality)
+
+    def _stop_link_watch(self) -> None:
+        self.monitor.stop()
+
+    def _on_link(self, name: str, up: bool) -> None:
+        if name == LINK_NAME and self.on_link_change is not None:
+            self.on_link_change(up)
+
+    def _on_supervisor_event(self, kind: str, name: str, value: object) -> None:
+        if kind == SUP_GAVE_UP and self.on_exit is not None:
+            self.on_exit(-1 if value is None else value)
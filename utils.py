@@ -1,23 +1,205 @@
 from __future__ import annotations
 
+import collections
+import logging
+import logging.handlers
 import os
+import queue
 import socket
-import subprocess
-from typing import Optional
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Set
 
-from PyQt5 import QtWidgets
+if TYPE_CHECKING:
+    # Only for annotations: utils is shared with the headless runner and must not load Qt.
+    from PyQt5 import QtWidgets
+
+log = logging.getLogger(__name__)
+
+_which_cache: Dict[str, Optional[str]] = {}
+_which_key: Optional[tuple] = None
+
+
+def _path_key(path: str) -> tuple:
+    # PATH plus directory mtimes: installing or removing a binary invalidates the cache.
+    key = [path]
+    for p in path.split(os.pathsep):
+        try:
+            key.append(os.stat(p).st_mtime_ns)
+        except OSError:
+            key.append(None)
+    return tuple(key)
 
 
 def which(cmd: str) -> Optional[str]:
-    for p in os.environ.get("PATH", "").split(os.pathsep):
-        full = os.path.join(p, cmd)
-        if os.path.isfile(full) and os.access(full, os.X_OK):
-            return full
-    return None
+    global _which_key
+    path = os.environ.get("PATH", "")
+    key = _path_key(path)
+    if key != _which_key:
+        _which_cache.clear()
+        _which_key = key
+    if cmd in _which_cache:
+        return _which_cache[cmd]
+
+    found: Optional[str] = None
+    if os.sep in cmd:
+        if os.path.isfile(cmd) and os.access(cmd, os.X_OK):
+            found = cmd
+    else:
+        for p in path.split(os.pathsep):
+            full = os.path.join(p, cmd)
+            if os.path.isfile(full) and os.access(full, os.X_OK):
+                found = full
+                break
+    _which_cache[cmd] = found
+    return found
 
 
 def has_cmd(cmd: str) -> bool:
-    return subprocess.call(["bash", "-lc", f"command -v {cmd} >/dev/null 2>&1"]) == 0
+    return which(cmd) is not None
+
+
+def user_state_dir() -> Path:
+    """Persistent per-user directory for logs and history ($XDG_STATE_HOME/omnilink)."""
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    path = Path(base) / "omnilink"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def user_log_dir() -> Path:
+    path = user_state_dir() / "logs"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+LOG_MAX_BYTES = 2 * 1024 * 1024
+LOG_BACKUPS = 3
+
+
+def setup_logging(level: int = logging.INFO) -> Path:
+    """Application log: rotating file in the user log directory."""
+    path = user_log_dir() / "omnilink.log"
+    root = logging.getLogger()
+    if not any(isinstance(h, logging.handlers.RotatingFileHandler) for h in root.handlers):
+        h = logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+        h.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        root.addHandler(h)
+    root.setLevel(level)
+    return path
+
+
+class ProcessLogPump:
+    """
+    Bounded sink for a child process' output.
+
+    feed() only enqueues the raw bytes. One shared background thread splits them into
+    lines, keeps the last `ring_lines` in memory (tail()) and appends everything to
+    <user_log_dir>/<name>.log, rotated at `max_bytes`. If the writer falls behind, at
+    most `max_queued` bytes are held and the excess is dropped and counted, so memory
+    stays flat however long the process runs.
+
+    `line_handler(line) -> bool` runs on the pump thread; returning True consumes the line
+    (it is neither kept nor written).
+    """
+
+    MAX_LINE = 16 * 1024
+
+    _queue: "queue.SimpleQueue" = queue.SimpleQueue()
+    _thread: Optional[threading.Thread] = None
+    _thread_lock = threading.Lock()
+
+    def __init__(
+        self,
+        name: str,
+        ring_lines: int = 500,
+        max_bytes: int = LOG_MAX_BYTES,
+        backups: int = LOG_BACKUPS,
+        max_queued: int = 4 * 1024 * 1024,
+        line_handler: Optional[Callable[[str], bool]] = None,
+    ):
+        self.name = name
+        self.line_handler = line_handler
+        self.max_queued = int(max_queued)
+        self.dropped_bytes = 0
+        self._queued = 0
+        self._partial = b""
+        self._failed = False
+        self._ring: Deque[str] = collections.deque(maxlen=max(1, int(ring_lines)))
+        self._lock = threading.Lock()
+
+        self._log = logging.getLogger(f"omnilink.proc.{name}")
+        self._log.propagate = False
+        self._log.setLevel(logging.INFO)
+        if not self._log.handlers:
+            try:
+                h = logging.handlers.RotatingFileHandler(
+                    user_log_dir() / f"{name}.log", maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+                )
+                h.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+                self._log.addHandler(h)
+            except OSError:
+                self._log.addHandler(logging.NullHandler())
+        self._ensure_thread()
+
+    @classmethod
+    def _ensure_thread(cls) -> None:
+        with cls._thread_lock:
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._thread = threading.Thread(target=cls._run, name="omnilink-logpump", daemon=True)
+                cls._thread.start()
+
+    @classmethod
+    def _run(cls) -> None:
+        while True:
+            pump, data = cls._queue.get()
+            try:
+                pump._consume(data)
+            except Exception:
+                # The thread is shared by every pump: keep it alive, report once per pump.
+                if not pump._failed:
+                    pump._failed = True
+                    log.exception("log pump %s: output handling failed, later errors are not reported", pump.name)
+
+    def feed(self, data: bytes) -> None:
+        if not data:
+            return
+        n = len(data)
+        with self._lock:
+            if self._queued + n > self.max_queued:
+                self.dropped_bytes += n
+                return
+            self._queued += n
+        self._queue.put((self, bytes(data)))
+
+    def mark(self, text: str) -> None:
+        """Write a marker line (start/exit) in order with the process output."""
+        self.feed(f"--- {text} ---\n".encode("utf-8"))
+
+    def _consume(self, data: bytes) -> None:
+        with self._lock:
+            self._queued -= len(data)
+        buf = self._partial + data
+        lines = buf.split(b"\n")
+        self._partial = lines.pop()
+        if len(self._partial) > self.MAX_LINE:
+            lines.append(self._partial)
+            self._partial = b""
+        for raw in lines:
+            line = raw.rstrip(b"\r").decode("utf-8", "replace")
+            if not line:
+                continue
+            if self.line_handler is not None and self.line_handler(line):
+                continue
+            with self._lock:
+                self._ring.append(line)
+            self._log.info(line)
+
+    def tail(self, n: int = 20) -> List[str]:
+        with self._lock:
+            if n >= len(self._ring):
+                return list(self._ring)
+            return list(self._ring)[-n:]
 
 
 def guess_ip() -> str:
@@ -42,6 +224,11 @@ def is_valid_ip(ip: str) -> bool:
     return all(0 <= n <= 255 for n in nums)
 
 
+def is_multicast_ip(ip: str) -> bool:
+    """IPv4 multicast group (224.0.0.0/4)."""
+    return is_valid_ip(ip) and 224 <= int(ip.strip().split(".")[0]) <= 239
+
+
 def is_valid_port(p: int) -> bool:
     return 1 <= p <= 65535
 
@@ -51,35 +238,68 @@ def looks_like_rtsp(url: str) -> bool:
     return u.startswith("rtsp://") or u.startswith("rtsps://")
 
 
-def parse_ss() -> str:
-    ss_bin = which("ss")
-    if not ss_bin:
-        return ""
-    try:
-        return subprocess.check_output([ss_bin, "-lunpt"], stderr=subprocess.STDOUT, text=True)
-    except Exception:
-        return ""
+_PROC_NET = {
+    "tcp": ("/proc/net/tcp", "/proc/net/tcp6"),
+    "udp": ("/proc/net/udp", "/proc/net/udp6"),
+}
+_TCP_LISTEN = "0A"
+
+
+def listening_ports(proto: str) -> Optional[Set[int]]:
+    """
+    Local ports with a listening TCP socket or a bound UDP socket, read from /proc/net.
+    Returns None when /proc/net is not readable.
+    """
+    proto = proto.lower()
+    ports: Set[int] = set()
+    seen_any = False
+    for path in _PROC_NET.get(proto, ()):
+        try:
+            with open(path, "r", encoding="ascii") as f:
+                next(f, None)
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 4:
+                        continue
+                    if proto == "tcp" and fields[3] != _TCP_LISTEN:
+                        continue
+                    ports.add(int(fields[1].rsplit(":", 1)[1], 16))
+            seen_any = True
+        except (OSError, ValueError):
+            continue
+    return ports if seen_any else None
 
 
-def port_listening(ss_text: str, proto: str, port: int) -> bool:
-    if not ss_text:
+def _bind_in_use(proto: str, port: int) -> bool:
+    kind = socket.SOCK_STREAM if proto.lower() == "tcp" else socket.SOCK_DGRAM
+    s = socket.socket(socket.AF_INET, kind)
+    try:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind(("0.0.0.0", port))
         return False
-    needle = f":{port}"
-    low = ss_text.lower()
-    if proto.lower() == "udp":
-        return ("udp" in low) and (needle in ss_text)
-    if proto.lower() == "tcp":
-        return ("tcp" in low) and (needle in ss_text)
-    return False
+    except OSError:
+        return True
+    finally:
+        s.close()
+
+
+def port_listening(proto: str, port: int, ports: Optional[Set[int]] = None) -> bool:
+    if ports is None:
+        ports = listening_ports(proto)
+    if ports is None:
+        return _bind_in_use(proto, port)
+    return port in ports
 
 
 def find_free_tcp_port(preferred: int, tries: int = 40) -> int:
     if preferred == 0:
         return 0
-    ss_text = parse_ss()
+    ports = listening_ports("tcp")
     port = preferred
     for _ in range(max(1, tries)):
-        if not port_listening(ss_text, "tcp", port):
+        if port > 65535:
+            break
+        if not port_listening("tcp", port, ports):
             return port
         port += 1
     return preferred
@@ -3,6 +3,21 @@ MEDIAMTX_BIN_DEFAULT = "/usr/local/bin/mediamtx"
 RES_CHOICES = ["640x480", "1280x720", "1920x1080"]
 FPS_CHOICES = ["10", "15", "20", "25", "30", "60"]
 
+# V4L2 FourCC -> ffmpeg v4l2 `-input_format`; capture formats outside this table are not offered.
+V4L2_INPUT_FORMATS = {
+    "H264": "h264",
+    "MJPG": "mjpeg",
+    "JPEG": "mjpeg",
+    "YUYV": "yuyv422",
+    "UYVY": "uyvy422",
+    "NV12": "nv12",
+    "YU12": "yuv420p",
+}
+
+# In-app preview frames (rgb24, letterboxed to this size).
+PREVIEW_WIDTH = 320
+PREVIEW_HEIGHT = 180
+
 X264_PARAMS = (
     "nal-hrd=none:"
     "force-cfr=1:"
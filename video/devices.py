@@ -1,12 +1,97 @@
 from __future__ import annotations
 
+import ctypes
+import ctypes.util
+import errno
+import fcntl
+import logging
+import os
 import re
-import shlex
-import subprocess
+import select
+import struct
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
-from omnilink.utils import has_cmd
+from omnilink.video.constants import FPS_CHOICES, RES_CHOICES, V4L2_INPUT_FORMATS
+
+log = logging.getLogger(__name__)
+
+# linux/videodev2.h
+VIDIOC_QUERYCAP = 0x80685600  # _IOR('V', 0, struct v4l2_capability)
+VIDIOC_ENUM_FMT = 0xC0405602  # _IOWR('V', 2, struct v4l2_fmtdesc)
+VIDIOC_ENUM_FRAMESIZES = 0xC02C564A  # _IOWR('V', 74, struct v4l2_frmsizeenum)
+VIDIOC_ENUM_FRAMEINTERVALS = 0xC034564B  # _IOWR('V', 75, struct v4l2_frmivalenum)
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+# Same values for V4L2_FRMSIZE_TYPE_* and V4L2_FRMIVAL_TYPE_*.
+V4L2_FRM_TYPE_DISCRETE = 1
+
+_CAPABILITY = struct.Struct("16s32s32sIII12x")
+_FMTDESC = struct.Struct("III32sII12x")
+# index, pixel_format, type, union (discrete: w, h; stepwise: min_w, max_w, step_w, min_h, max_h, step_h)
+_FRMSIZEENUM = struct.Struct("III6I8x")
+# index, pixel_format, width, height, type, union (discrete: num, den; stepwise: min, max, step fractions)
+_FRMIVALENUM = struct.Struct("IIIII6I8x")
+
+# Relative CPU cost per captured pixel, by FourCC: native H.264 is stream-copied, raw formats
+# only need a pixel format conversion, MJPEG has to be decoded before it is encoded again.
+_CAPTURE_COST = {"H264": 0.0, "NV12": 0.1, "YU12": 0.1, "YUYV": 0.15, "UYVY": 0.15, "MJPG": 1.0, "JPEG": 1.0}
+# H.264 capture that is transcoded anyway: decoding it costs more than MJPEG.
+_H264_DECODE_COST = 1.5
+
+# linux/inotify.h
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+@dataclass(frozen=True)
+class CaptureMode:
+    # FourCC, e.g. "MJPG", "YUYV", "H264".
+    fourcc: str
+    width: int
+    height: int
+    fps: int
+
+    @property
+    def resolution(self) -> str:
+        return f"{self.width}x{self.height}"
+
+    def cost(self, transcode: bool = False) -> float:
+        """
+        Estimated capture-side CPU cost, comparable between modes (lower is cheaper).
+        `transcode`: the main output is encoded again even for H.264 capture.
+        """
+        factor = _H264_DECODE_COST if transcode and self.fourcc == "H264" else _CAPTURE_COST.get(self.fourcc, 1.0)
+        return factor * self.width * self.height * self.fps
+
+    def describe(self) -> str:
+        return f"{self.fourcc} {self.resolution}@{self.fps}"
+
+
+@dataclass
+class VideoDevice:
+    path: str
+    card: str = ""
+    driver: str = ""
+    bus_info: str = ""
+    # FourCC codes reported by VIDIOC_ENUM_FMT, e.g. "MJPG", "YUYV", "H264".
+    formats: List[str] = field(default_factory=list)
+    # Every size/rate the driver lists for a format ffmpeg can capture (V4L2_INPUT_FORMATS).
+    # Empty when the node could not be opened or does not enumerate its sizes.
+    modes: List[CaptureMode] = field(default_factory=list)
+
+    @property
+    def label(self) -> str:
+        return f"{self.path} ({self.card})" if self.card else self.path
 
 
 def list_video_devices() -> List[str]:
@@ -16,14 +101,293 @@ def list_video_devices() -> List[str]:
     return devs
 
 
+def _cstr(raw: bytes) -> str:
+    return raw.split(b"\0", 1)[0].decode("utf-8", "replace").strip()
+
+
+def fourcc_to_str(code: int) -> str:
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip()
+
+
+def _enum_formats(fd: int) -> List[str]:
+    out: List[str] = []
+    for index in range(64):
+        buf = bytearray(_FMTDESC.pack(index, V4L2_BUF_TYPE_VIDEO_CAPTURE, 0, b"", 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_ENUM_FMT, buf)
+        except OSError:
+            break
+        _i, _t, _flags, _desc, pixfmt, _mbus = _FMTDESC.unpack(buf)
+        out.append(fourcc_to_str(pixfmt))
+    return out
+
+
+def _stepwise(values: Iterable[int], lo: int, hi: int, step: int) -> List[int]:
+    return [v for v in values if lo <= v <= hi and (step <= 1 or (v - lo) % step == 0)]
+
+
+def _enum_sizes(fd: int, fourcc: int) -> List[Tuple[int, int]]:
+    """
+    Discrete sizes as listed. Stepwise/continuous ranges are reduced to the RES_CHOICES
+    presets that fall inside them.
+    """
+    out: List[Tuple[int, int]] = []
+    for index in range(256):
+        buf = bytearray(_FRMSIZEENUM.pack(index, fourcc, 0, 0, 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_ENUM_FRAMESIZES, buf)
+        except OSError:
+            break
+        _i, _f, kind, *u = _FRMSIZEENUM.unpack(buf)
+        if kind == V4L2_FRM_TYPE_DISCRETE:
+            out.append((u[0], u[1]))
+            continue
+        min_w, max_w, step_w, min_h, max_h, step_h = u
+        for preset in RES_CHOICES:
+            w, h = (int(x) for x in preset.split("x"))
+            if _stepwise([w], min_w, max_w, step_w) and _stepwise([h], min_h, max_h, step_h):
+                out.append((w, h))
+        break
+    return out
+
+
+def _enum_rates(fd: int, fourcc: int, width: int, height: int) -> List[int]:
+    """Whole frame rates; stepwise/continuous ranges are reduced to the FPS_CHOICES presets."""
+    out: List[int] = []
+    for index in range(256):
+        buf = bytearray(_FRMIVALENUM.pack(index, fourcc, width, height, 0, 0, 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_ENUM_FRAMEINTERVALS, buf)
+        except OSError:
+            break
+        _i, _f, _w, _h, kind, *u = _FRMIVALENUM.unpack(buf)
+        if kind == V4L2_FRM_TYPE_DISCRETE:
+            num, den = u[0], u[1]
+            # A frame interval of num/den seconds; fractional rates (7.5, 29.97) are rounded.
+            if num and den >= num:
+                out.append(int(round(den / num)))
+            continue
+        min_num, min_den, max_num, max_den = u[0], u[1], u[2], u[3]
+        if min_num and max_num and min_den and max_den:
+            lo, hi = max_den / max_num, min_den / min_num
+            out += [int(f) for f in FPS_CHOICES if lo <= int(f) <= hi]
+        break
+    return sorted(set(out), reverse=True)
+
+
+def _enum_modes(fd: int) -> List[CaptureMode]:
+    modes: List[CaptureMode] = []
+    for index in range(64):
+        buf = bytearray(_FMTDESC.pack(index, V4L2_BUF_TYPE_VIDEO_CAPTURE, 0, b"", 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_ENUM_FMT, buf)
+        except OSError:
+            break
+        pixfmt = _FMTDESC.unpack(buf)[4]
+        fourcc = fourcc_to_str(pixfmt)
+        if fourcc not in V4L2_INPUT_FORMATS:
+            continue
+        for w, h in _enum_sizes(fd, pixfmt):
+            modes += [CaptureMode(fourcc, w, h, fps) for fps in _enum_rates(fd, pixfmt, w, h)]
+    return modes
+
+
+def query_device(dev: str) -> Optional[VideoDevice]:
+    """
+    VIDIOC_QUERYCAP + VIDIOC_ENUM_FMT/FRAMESIZES/FRAMEINTERVALS in-process. Returns None for nodes that cannot
+    capture video (metadata, output-only, codec nodes). A node that cannot be opened
+    (permissions) is returned without details so it stays selectable.
+    """
+    try:
+        fd = os.open(dev, os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        return VideoDevice(path=dev)
+    try:
+        buf = bytearray(_CAPABILITY.size)
+        try:
+            fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf)
+        except OSError:
+            return None
+        driver, card, bus_info, _version, caps, device_caps = _CAPABILITY.unpack(buf)
+        if caps & V4L2_CAP_DEVICE_CAPS:
+            caps = device_caps
+        if not caps & V4L2_CAP_VIDEO_CAPTURE:
+            return None
+        formats = _enum_formats(fd)
+        if not formats:
+            return None
+        return VideoDevice(
+            path=dev,
+            card=_cstr(card),
+            driver=_cstr(driver),
+            bus_info=_cstr(bus_info),
+            formats=formats,
+            modes=_enum_modes(fd),
+        )
+    finally:
+        os.close(fd)
+
+
+# path -> ((st_ino, st_rdev, st_ctime_ns), result). Replugging recreates the node, which changes the key.
+_device_cache: Dict[str, Tuple[tuple, Optional[VideoDevice]]] = {}
+
+
+def _cached_query(dev: str) -> Optional[VideoDevice]:
+    try:
+        st = os.stat(dev)
+    except OSError:
+        _device_cache.pop(dev, None)
+        return None
+    key = (st.st_ino, st.st_rdev, st.st_ctime_ns)
+    hit = _device_cache.get(dev)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    info = query_device(dev)
+    _device_cache[dev] = (key, info)
+    return info
+
+
+def discover_capture_devices() -> List[VideoDevice]:
+    out: List[VideoDevice] = []
+    paths = list_video_devices()
+    for dev in list(_device_cache):
+        if dev not in paths:
+            del _device_cache[dev]
+    for dev in paths:
+        info = _cached_query(dev)
+        if info is not None:
+            out.append(info)
+    return out
+
+
 def get_device_label(dev: str) -> str:
-    if has_cmd("v4l2-ctl"):
-        out = subprocess.run(
-            ["bash", "-lc", f"v4l2-ctl -D -d {shlex.quote(dev)} 2>/dev/null | sed -n 's/^Card type[ ]*:[ ]*//p'"],
-            text=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-        ).stdout.strip()
-        if out:
-            return f"{dev} ({out})"
-    return dev
+    info = _cached_query(dev)
+    return info.label if info else dev
+
+
+def get_device_modes(dev: str) -> List[CaptureMode]:
+    info = _cached_query(dev)
+    return list(info.modes) if info else []
+
+
+# -------------------------
+# Capture mode selection
+# -------------------------
+def mode_resolutions(modes: List[CaptureMode]) -> List[str]:
+    """Every size of any format, largest first."""
+    sizes = sorted({(m.width, m.height) for m in modes}, key=lambda s: (s[0] * s[1], s[0]), reverse=True)
+    return [f"{w}x{h}" for w, h in sizes]
+
+
+def mode_rates(modes: List[CaptureMode], resolution: str) -> List[int]:
+    return sorted({m.fps for m in modes if m.resolution == resolution}, reverse=True)
+
+
+def mode_formats(modes: List[CaptureMode], resolution: str, fps: int, transcode: bool = False) -> List[str]:
+    """FourCCs that can deliver resolution@fps, cheapest first."""
+    found = [m for m in modes if m.resolution == resolution and m.fps == int(fps)]
+    return [m.fourcc for m in sorted(found, key=lambda m: m.cost(transcode))]
+
+
+def pick_capture_mode(
+    modes: List[CaptureMode],
+    resolution: str,
+    fps: int,
+    fourcc: str = "",
+    transcode: bool = False,
+) -> Optional[CaptureMode]:
+    """
+    The lowest-cost mode delivering exactly resolution@fps, restricted to `fourcc` when
+    given. None when the device does not list that combination.
+    """
+    found = [
+        m for m in modes
+        if m.resolution == resolution and m.fps == int(fps) and (not fourcc or m.fourcc == fourcc)
+    ]
+    return min(found, key=lambda m: m.cost(transcode)) if found else None
+
+
+class DeviceWatcher:
+    """
+    inotify watch on /dev. `on_change` is called from the watcher thread, debounced,
+    whenever a video* node is created, removed, or has its permissions changed by udev.
+    """
+
+    def __init__(self, on_change: Callable[[], None], debounce_s: float = 0.25):
+        self.on_change = on_change
+        self.debounce_s = float(debounce_s)
+        self._fd = -1
+        self._wake_r = -1
+        self._wake_w = -1
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> bool:
+        """Returns False when inotify is not available."""
+        if self._thread is not None:
+            return True
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1")
+            mask = IN_CREATE | IN_DELETE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO
+            if libc.inotify_add_watch(fd, b"/dev", mask) < 0:
+                err = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(err, "inotify_add_watch")
+        except (OSError, AttributeError) as e:
+            log.debug("inotify unavailable: %s", e)
+            return False
+        self._fd = fd
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = threading.Thread(target=self._run, name="omnilink-devwatch", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        os.write(self._wake_w, b"\0")
+        self._thread.join(1.0)
+        self._thread = None
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        self._fd = self._wake_r = self._wake_w = -1
+
+    def _drain(self) -> bool:
+        hit = False
+        while True:
+            try:
+                data = os.read(self._fd, 4096)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return hit
+                raise
+            off = 0
+            while off + _INOTIFY_EVENT.size <= len(data):
+                _wd, _mask, _cookie, ln = _INOTIFY_EVENT.unpack_from(data, off)
+                name = data[off + _INOTIFY_EVENT.size:off + _INOTIFY_EVENT.size + ln].split(b"\0", 1)[0]
+                if name.startswith(b"video"):
+                    hit = True
+                off += _INOTIFY_EVENT.size + ln
+
+    def _run(self) -> None:
+        pending = False
+        while True:
+            timeout = self.debounce_s if pending else None
+            ready, _w, _x = select.select([self._fd, self._wake_r], [], [], timeout)
+            if self._wake_r in ready:
+                return
+            if self._fd in ready:
+                if self._drain():
+                    pending = True
+                continue
+            if pending:
+                pending = False
+                try:
+                    self.on_change()
+                except Exception:
+                    log.exception("device change callback failed")
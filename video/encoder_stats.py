@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import collections
+import threading
+import time
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+# Keys ffmpeg writes with `-progress`. A block ends with progress=continue|end.
+PROGRESS_KEYS = frozenset((
+    "frame", "fps", "bitrate", "total_size", "out_time_us", "out_time_ms", "out_time",
+    "dup_frames", "drop_frames", "speed", "progress",
+))
+
+# Below this speed the encoder is not keeping up with the input.
+SLOW_SPEED = 0.95
+
+
+@dataclass
+class EncoderSample:
+    t: float
+    frame: int
+    # Rates over the interval since the previous sample (not ffmpeg's run averages).
+    fps: float
+    bitrate_kbps: Optional[float]
+    drop_frames: int
+    dup_frames: int
+    speed: Optional[float]
+
+    def lagging(self) -> bool:
+        return self.speed is not None and self.speed < SLOW_SPEED
+
+
+def _float(text: str) -> Optional[float]:
+    text = text.strip().rstrip("x")
+    if text.endswith("kbits/s"):
+        text = text[:-7]
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+def _int(text: str) -> int:
+    try:
+        return int(text)
+    except ValueError:
+        return 0
+
+
+class EncoderStats:
+    """
+    Parser for ffmpeg `-progress` output, turning each key=value block into an
+    EncoderSample kept in a bounded history.
+
+    feed_line() is meant as a ProcessLogPump line_handler: it returns True for progress
+    lines so they do not end up in the process log. Reads are safe from any thread.
+    """
+
+    def __init__(self, history: int = 600):
+        self._block: Dict[str, str] = {}
+        self._samples: Deque[EncoderSample] = collections.deque(maxlen=max(2, int(history)))
+        self._prev: Optional[tuple[float, int, int, int]] = None  # (t, frame, total_size, out_time_us)
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._block = {}
+            self._samples.clear()
+            self._prev = None
+
+    def feed_line(self, line: str) -> bool:
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or (key not in PROGRESS_KEYS and not key.startswith("stream_")):
+            return False
+        self._block[key] = value.strip()
+        if key == "progress":
+            self._finish_block(time.monotonic())
+        return True
+
+    def _finish_block(self, now: float) -> None:
+        b, self._block = self._block, {}
+        frame = _int(b.get("frame", "0"))
+        size = _int(b.get("total_size", "0"))
+        out_us = _int(b.get("out_time_us", b.get("out_time_ms", "0")))
+
+        fps = _float(b.get("fps", "")) or 0.0
+        kbps = _float(b.get("bitrate", ""))
+        prev = self._prev
+        if prev is not None and now > prev[0]:
+            fps = max(0, frame - prev[1]) / (now - prev[0])
+            if size > prev[2] and out_us > prev[3]:
+                kbps = (size - prev[2]) * 8.0 / ((out_us - prev[3]) / 1e6) / 1000.0
+        self._prev = (now, frame, size, out_us)
+
+        sample = EncoderSample(
+            t=now,
+            frame=frame,
+            fps=fps,
+            bitrate_kbps=kbps,
+            drop_frames=_int(b.get("drop_frames", "0")),
+            dup_frames=_int(b.get("dup_frames", "0")),
+            speed=_float(b.get("speed", "")),
+        )
+        with self._lock:
+            self._samples.append(sample)
+
+    def latest(self) -> Optional[EncoderSample]:
+        with self._lock:
+            return self._samples[-1] if self._samples else None
+
+    def history(self, seconds: Optional[float] = None) -> List[EncoderSample]:
+        with self._lock:
+            out = list(self._samples)
+        if seconds is not None and out:
+            cutoff = out[-1].t - float(seconds)
+            out = [s for s in out if s.t >= cutoff]
+        return out
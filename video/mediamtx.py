@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, List, Optional
+
+from omnilink.process import ChildStats, ManagedProcess, RestartPolicy, Supervisor
+from omnilink.utils import ProcessLogPump
+from omnilink.video.constants import MEDIAMTX_BIN_DEFAULT
+from omnilink.video.pipeline import tcp_port_open, wait_until, write_mediamtx_cfg_user
+
+log = logging.getLogger(__name__)
+
+
+class MediaMtxServer:
+    """
+    One MediaMTX process shared by every video pipeline.
+
+    The published paths live in the generated config file. set_paths() rewrites it while
+    the server runs and MediaMTX hot-reloads it, so adding or removing a pipeline never
+    restarts the server or drops the other paths. A crashed server is restarted by its
+    Supervisor; `on_event(kind, name, value)` receives the supervisor events.
+    """
+
+    NAME = "mediamtx"
+
+    def __init__(
+        self,
+        bin_path: str = MEDIAMTX_BIN_DEFAULT,
+        port: int = 8554,
+        on_event: Optional[Callable[[str, str, object], None]] = None,
+    ):
+        self.bin_path = bin_path
+        self.port = int(port)
+        self.log = ProcessLogPump(self.NAME)
+        self.proc: Optional[ManagedProcess] = None
+        self.supervisor = Supervisor(on_event=on_event)
+        self._paths: List[str] = []
+        self._lock = threading.Lock()
+
+    @property
+    def paths(self) -> List[str]:
+        return list(self._paths)
+
+    def start(self, paths: List[str], auto_restart: bool = True) -> None:
+        """Raises OSError when MediaMTX cannot be started."""
+        with self._lock:
+            if self.proc is not None:
+                return
+            self._paths = list(paths)
+            cfg_path = write_mediamtx_cfg_user(self._paths, self.port)
+            self.supervisor.policy = RestartPolicy() if auto_restart else RestartPolicy(max_restarts=0)
+            proc = ManagedProcess(self.NAME, [self.bin_path, str(cfg_path)], log_pump=self.log)
+            self.supervisor.watch(proc)
+            try:
+                proc.start()
+            except OSError as e:
+                self.supervisor.unwatch(proc.name)
+                raise OSError("mediamtx gagal start") from e
+            self.proc = proc
+
+    def set_paths(self, paths: List[str]) -> None:
+        with self._lock:
+            if list(paths) == self._paths:
+                return
+            self._paths = list(paths)
+            if self.proc is not None:
+                write_mediamtx_cfg_user(self._paths, self.port)
+                log.info("mediamtx paths: %s", ", ".join(self._paths) or "-")
+
+    def wait_ready(self, timeout: float, cancelled: Callable[[], bool] = lambda: False) -> bool:
+        return wait_until(lambda: tcp_port_open("127.0.0.1", self.port), timeout, cancelled)
+
+    def running(self) -> bool:
+        return self.proc is not None
+
+    def cpu_percent(self) -> Optional[float]:
+        proc = self.proc
+        return proc.cpu_percent() if proc is not None else None
+
+    def restart_stats(self) -> List[ChildStats]:
+        return self.supervisor.stats()
+
+    def stop(self) -> None:
+        self.supervisor.clear()
+        with self._lock:
+            proc, self.proc = self.proc, None
+        if proc is not None:
+            proc.stop()
+
@@ -0,0 +1,413 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import socket
+import subprocess
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+from omnilink.utils import user_state_dir, which
+from omnilink.video.constants import PREVIEW_HEIGHT, PREVIEW_WIDTH, X264_PARAMS
+
+POLL_INTERVAL_S = 0.01
+
+INPUT_RTSP = "rtsp"
+INPUT_V4L2 = "v4l2"
+
+ENCODE_AUTO = "auto"
+ENCODE_COPY = "copy"
+ENCODE_TRANSCODE = "transcode"
+
+# H.264 profiles that can be forwarded as-is to low-latency GCS players.
+PASSTHROUGH_PROFILES = ("Constrained Baseline", "Baseline", "Main", "High")
+PASSTHROUGH_PIX_FMTS = ("yuv420p", "yuvj420p")
+
+
+@dataclass
+class Rendition:
+    """
+    Extra simulcast output: the decoded input scaled/re-timed and encoded again, published
+    to its own MediaMTX path next to the main output.
+    """
+
+    path: str = ""
+    # "WxH"; empty keeps the input size.
+    resolution: str = ""
+    bitrate_kbps: int = 600
+    # 0 keeps the input rate.
+    fps: int = 0
+
+
+@dataclass
+class StreamConfig:
+    input_kind: str = INPUT_RTSP
+    rtsp_url: str = ""
+    device: str = ""
+    resolution: str = "1280x720"
+    fps: int = 30
+    bitrate_kbps: int = 2500
+    publish_url: str = ""
+    # ffmpeg v4l2 -input_format (see V4L2_INPUT_FORMATS).
+    input_format: str = "mjpeg"
+    # Resolved mode: ENCODE_COPY or ENCODE_TRANSCODE.
+    encode: str = ENCODE_TRANSCODE
+    x264_params: str = X264_PARAMS
+    # Emit machine-readable `-progress` blocks on stdout (see encoder_stats).
+    progress: bool = False
+    # Simulcast outputs published to rendition_url(); the input is decoded once for all of them.
+    renditions: List[Rendition] = field(default_factory=list)
+    # MPEG-TS copy of the main output for SegmentRecorder (a FIFO path); empty: no recording.
+    record_url: str = ""
+    # Raw rgb24 preview frames for PreviewPipe (a FIFO path); empty: no preview.
+    preview_url: str = ""
+    preview_fps: int = 5
+
+    @property
+    def gop(self) -> int:
+        return 30 if self.input_kind == INPUT_RTSP else int(self.fps)
+
+    @property
+    def target_kbps(self) -> int:
+        """Configured bitrate of all encoded outputs (the main output only when transcoded)."""
+        main = int(self.bitrate_kbps) if self.encode == ENCODE_TRANSCODE else 0
+        return main + sum(int(r.bitrate_kbps) for r in self.renditions)
+
+
+def rendition_url(cfg: StreamConfig, r: Rendition) -> str:
+    return f"{cfg.publish_url.rsplit('/', 1)[0]}/{r.path}"
+
+
+def parse_renditions(text: str) -> List[Rendition]:
+    """
+    One rendition per line: `PATH RESOLUTION KBPS [FPS]`, RESOLUTION "-" keeps the input
+    size. Example: `qgc_low 854x480 600 15`.
+    """
+    items: List[Rendition] = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+        parts = line.split()
+        if len(parts) not in (3, 4) or not all(p.isdigit() for p in parts[2:]):
+            raise ValueError(f"Rendition invalid: {line} (gunakan PATH WxH KBPS [FPS])")
+        res = "" if parts[1] == "-" else parts[1]
+        fps = int(parts[3]) if len(parts) == 4 else 0
+        items.append(Rendition(path=parts[0].lstrip("/"), resolution=res, bitrate_kbps=int(parts[2]), fps=fps))
+    return items
+
+
+def validate_renditions(renditions: List[Rendition], main_path: str) -> Optional[str]:
+    seen = {main_path}
+    for r in renditions:
+        if not r.path or any(c.isspace() for c in r.path):
+            return f"Path rendition tidak valid: {r.path!r}"
+        if r.path in seen:
+            return f"Path rendition duplikat: {r.path}"
+        seen.add(r.path)
+        if r.resolution and not re.match(r"^\d+x\d+$", r.resolution):
+            return f"Resolusi rendition tidak valid: {r.resolution}"
+        if int(r.bitrate_kbps) <= 0:
+            return f"Bitrate rendition tidak valid: {r.path}"
+        if int(r.fps) < 0:
+            return f"FPS rendition tidak valid: {r.path}"
+    return None
+
+
+def build_input_args(cfg: StreamConfig) -> List[str]:
+    if cfg.input_kind == INPUT_RTSP:
+        return ["-rtsp_transport", "tcp", "-i", cfg.rtsp_url]
+    return [
+        "-f", "v4l2",
+        "-input_format", cfg.input_format,
+        "-framerate", str(cfg.fps),
+        "-video_size", cfg.resolution,
+        "-i", cfg.device,
+    ]
+
+
+def build_encode_args(cfg: StreamConfig) -> List[str]:
+    if cfg.encode == ENCODE_COPY:
+        return ["-an", "-c:v", "copy"]
+    br = int(cfg.bitrate_kbps)
+    gop = cfg.gop
+    return [
+        "-an",
+        "-c:v", "libx264",
+        "-preset", "ultrafast",
+        "-tune", "zerolatency",
+        "-pix_fmt", "yuv420p",
+        "-profile:v", "baseline",
+        "-g", str(gop),
+        "-keyint_min", str(gop),
+        "-sc_threshold", "0",
+        "-bf", "0",
+        "-b:v", f"{br}k",
+        "-maxrate", f"{br}k",
+        "-bufsize", f"{br * 2}k",
+        "-x264-params", cfg.x264_params,
+    ]
+
+
+def build_output_args(cfg: StreamConfig) -> List[str]:
+    if cfg.record_url:
+        # Same encoded packets to two muxers. A failing recorder must not stop the stream,
+        # a failing publish must end ffmpeg (so it is restarted); abort is spelled out
+        # because tee otherwise carries on with the remaining slave.
+        return [
+            "-f", "tee",
+            f"[f=rtsp:rtsp_transport=tcp:onfail=abort]{cfg.publish_url}|[f=mpegts:onfail=ignore]{cfg.record_url}",
+        ]
+    return ["-f", "rtsp", "-rtsp_transport", "tcp", cfg.publish_url]
+
+
+def build_global_args(cfg: StreamConfig) -> List[str]:
+    args: List[str] = [
+        "-loglevel", "error",
+        "-fflags", "nobuffer",
+        "-flags", "low_delay",
+    ]
+    if cfg.progress:
+        args += ["-nostats", "-progress", "pipe:1"]
+    if cfg.preview_url:
+        # The preview FIFO already exists; without -y ffmpeg asks before writing to it.
+        args.append("-y")
+    return args
+
+
+def _rendition_filter(r: Rendition) -> str:
+    steps = []
+    if r.resolution:
+        w, h = r.resolution.split("x")
+        steps.append(f"scale={w}:{h}")
+    if r.fps:
+        steps.append(f"fps={int(r.fps)}")
+    return ",".join(steps) or "null"
+
+
+def build_simulcast_args(cfg: StreamConfig) -> List[str]:
+    """
+    Encode and output args for the main output plus every rendition. The input is decoded
+    once and split in a filter graph; a passthrough main output keeps copying 0:v.
+    """
+    transcode_main = cfg.encode != ENCODE_COPY
+    n = len(cfg.renditions) + (1 if transcode_main else 0)
+    chains: List[str] = []
+    if n > 1:
+        pads = [f"[s{i}]" for i in range(n)]
+        chains.append(f"[0:v]split={n}{''.join(pads)}")
+    else:
+        pads = ["[0:v]"]
+
+    if transcode_main:
+        chains.append(f"{pads.pop(0)}null[main]")
+        out = ["-map", "[main]"]
+    else:
+        out = ["-map", "0:v"]
+    out += build_encode_args(cfg) + build_output_args(cfg)
+
+    for i, (pad, r) in enumerate(zip(pads, cfg.renditions)):
+        chains.append(f"{pad}{_rendition_filter(r)}[r{i}]")
+        rcfg = replace(
+            cfg,
+            encode=ENCODE_TRANSCODE,
+            bitrate_kbps=int(r.bitrate_kbps),
+            fps=int(r.fps) or cfg.fps,
+            publish_url=rendition_url(cfg, r),
+            record_url="",
+        )
+        out += ["-map", f"[r{i}]"] + build_encode_args(rcfg) + build_output_args(rcfg)
+
+    return ["-filter_complex", ";".join(chains)] + out
+
+
+def build_preview_args(cfg: StreamConfig) -> List[str]:
+    """
+    Small raw output for the in-app preview, taken from the decoded input (decoded once even
+    when the main output is a stream copy). The fps filter runs first so dropped frames are
+    never scaled.
+    """
+    w, h = PREVIEW_WIDTH, PREVIEW_HEIGHT
+    chain = (
+        f"fps={max(1, int(cfg.preview_fps))},"
+        f"scale={w}:{h}:force_original_aspect_ratio=decrease:flags=fast_bilinear,"
+        f"pad={w}:{h}:-1:-1,format=rgb24"
+    )
+    return ["-map", "0:v", "-an", "-vf", chain, "-f", "rawvideo", cfg.preview_url]
+
+
+def build_ffmpeg_args(cfg: StreamConfig) -> List[str]:
+    args = build_global_args(cfg)
+    args += build_input_args(cfg)
+    if cfg.renditions:
+        args += build_simulcast_args(cfg)
+    else:
+        if cfg.record_url or cfg.preview_url:
+            # The tee muxer only takes explicitly mapped streams, and a second output would
+            # otherwise pick its streams on its own.
+            args += ["-map", "0:v"]
+        args += build_encode_args(cfg)
+        args += build_output_args(cfg)
+    if cfg.preview_url:
+        # Last, so the -progress figures keep describing the main output.
+        args += build_preview_args(cfg)
+    return args
+
+
+@dataclass
+class CodecInfo:
+    codec: str = ""
+    profile: str = ""
+    pix_fmt: str = ""
+    width: int = 0
+    height: int = 0
+    has_b_frames: int = 0
+
+    def describe(self) -> str:
+        parts = [self.codec or "?"]
+        if self.profile:
+            parts.append(self.profile)
+        if self.width and self.height:
+            parts.append(f"{self.width}x{self.height}")
+        return " ".join(parts)
+
+
+def probe_codec(url: str, timeout_s: float = 8.0) -> Optional[CodecInfo]:
+    """Probe the first video stream of an RTSP source with ffprobe. Returns None on failure."""
+    ffprobe = which("ffprobe")
+    if not ffprobe:
+        return None
+    cmd = [
+        ffprobe,
+        "-v", "error",
+        "-rtsp_transport", "tcp",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,profile,pix_fmt,width,height,has_b_frames",
+        "-of", "json",
+        url,
+    ]
+    try:
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=timeout_s, text=True).stdout
+        streams = json.loads(out or "{}").get("streams") or []
+    except (OSError, subprocess.TimeoutExpired, ValueError):
+        return None
+    if not streams:
+        return None
+    st = streams[0]
+    return CodecInfo(
+        codec=str(st.get("codec_name", "")),
+        profile=str(st.get("profile", "")),
+        pix_fmt=str(st.get("pix_fmt", "")),
+        width=int(st.get("width") or 0),
+        height=int(st.get("height") or 0),
+        has_b_frames=int(st.get("has_b_frames") or 0),
+    )
+
+
+def passthrough_compatible(info: Optional[CodecInfo]) -> tuple[bool, str]:
+    if info is None:
+        return False, "probe failed"
+    if info.codec != "h264":
+        return False, f"codec {info.codec or '?'}"
+    if info.profile and info.profile not in PASSTHROUGH_PROFILES:
+        return False, f"profile {info.profile}"
+    if info.pix_fmt and info.pix_fmt not in PASSTHROUGH_PIX_FMTS:
+        return False, f"pix_fmt {info.pix_fmt}"
+    if info.has_b_frames:
+        return False, "B-frames"
+    return True, info.describe()
+
+
+def choose_encode(requested: str, input_kind: str, info: Optional[CodecInfo]) -> tuple[str, str]:
+    """
+    Resolve ENCODE_AUTO into copy/transcode. Returns (mode, reason). For a webcam, `info`
+    describes the capture format; only native H.264 capture can be copied.
+    """
+    if input_kind != INPUT_RTSP:
+        if info is not None and info.codec == "h264" and requested != ENCODE_TRANSCODE:
+            return ENCODE_COPY, f"native {info.describe()}"
+        return ENCODE_TRANSCODE, f"webcam {info.describe()}" if info is not None else "webcam"
+    if requested == ENCODE_COPY:
+        return ENCODE_COPY, "forced"
+    if requested == ENCODE_TRANSCODE:
+        return ENCODE_TRANSCODE, "forced"
+    ok, reason = passthrough_compatible(info)
+    return (ENCODE_COPY if ok else ENCODE_TRANSCODE), reason
+
+
+def mediamtx_cfg_text(path_names: Iterable[str], rtsp_port: int = 8554, host: str = "") -> str:
+    text = f"rtspAddress: {host}:{rtsp_port}\npaths:\n"
+    for name in path_names:
+        text += f"  {name}:\n    source: publisher\n"
+    return text
+
+
+def write_mediamtx_cfg_user(path_names: Iterable[str], rtsp_port: int = 8554) -> Path:
+    cfg_dir = Path.home() / ".config" / "mediamtx"
+    cfg_dir.mkdir(parents=True, exist_ok=True)
+    cfg_path = cfg_dir / "mediamtx.yml"
+    # Replace atomically: a running MediaMTX reloads the file as soon as it changes.
+    tmp = cfg_path.with_suffix(".yml.tmp")
+    tmp.write_text(mediamtx_cfg_text(path_names, rtsp_port))
+    os.replace(tmp, cfg_path)
+    return cfg_path
+
+
+def tcp_port_open(host: str, port: int, timeout: float = 0.2) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+
+def rtsp_describe_status(host: str, port: int, path: str, timeout: float = 0.5) -> Optional[int]:
+    """
+    Send an RTSP DESCRIBE and return the status code. MediaMTX answers 404 until a
+    publisher is live on the path and 200 afterwards.
+    """
+    req = (
+        f"DESCRIBE rtsp://{host}:{port}/{path} RTSP/1.0\r\n"
+        "CSeq: 1\r\n"
+        "Accept: application/sdp\r\n"
+        "\r\n"
+    ).encode("ascii")
+    try:
+        with socket.create_connection((host, port), timeout=timeout) as s:
+            s.sendall(req)
+            head = s.recv(256)
+    except OSError:
+        return None
+    parts = head.split(b" ", 2)
+    if len(parts) < 2 or not parts[0].startswith(b"RTSP/") or not parts[1].isdigit():
+        return None
+    return int(parts[1])
+
+
+def wait_until(
+    check: Callable[[], bool],
+    timeout: float,
+    cancelled: Callable[[], bool] = lambda: False,
+    interval: float = POLL_INTERVAL_S,
+) -> bool:
+    deadline = time.monotonic() + timeout
+    while not cancelled():
+        if check():
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return False
+
+
+def record_startup(entry: dict) -> None:
+    """Append one startup timing record (JSON line) to the persistent startup history."""
+    path = user_state_dir() / "video-startup.jsonl"
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+    except OSError:
+        pass
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import logging
+import os
+import select
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import List, Optional
+
+from omnilink.video.constants import PREVIEW_HEIGHT, PREVIEW_WIDTH
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class PreviewFrame:
+    seq: int
+    width: int
+    height: int
+    # rgb24, width * 3 bytes per line. Never written again once published.
+    data: bytearray
+
+
+class PreviewPipe:
+    """
+    Receives the downscaled raw frames ffmpeg writes into `fifo_path` (see
+    build_preview_args) and keeps only the newest one.
+
+    The reader thread drains the FIFO all the time, whether or not anything is shown, so
+    ffmpeg never blocks on the preview output. Each frame is read into a fresh buffer that
+    is handed out as is; a front end can wrap it without copying.
+    """
+
+    def __init__(self, width: int = PREVIEW_WIDTH, height: int = PREVIEW_HEIGHT):
+        self.width = int(width)
+        self.height = int(height)
+        self.frame_bytes = self.width * self.height * 3
+        self.fifo_path = ""
+        self._tmpdir = ""
+        self._frame: Optional[PreviewFrame] = None
+        self._seq = 0
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Raises OSError when the FIFO cannot be created."""
+        if self._threads:
+            return
+        self._tmpdir = tempfile.mkdtemp(prefix="omnilink-preview-")
+        self.fifo_path = os.path.join(self._tmpdir, "preview.rgb")
+        os.mkfifo(self.fifo_path, 0o600)
+        self._stop.clear()
+        self._threads = [threading.Thread(target=self._read, name="omnilink-preview", daemon=True)]
+        self._threads[0].start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(2.0)
+        self._threads = []
+        self._frame = None
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = ""
+            self.fifo_path = ""
+
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def latest(self) -> Optional[PreviewFrame]:
+        return self._frame
+
+    def _open_fifo(self) -> int:
+        # Non-blocking: open() must not wait for ffmpeg to connect.
+        return os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+
+    def _read(self) -> None:
+        fd = self._open_fifo()
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        buf = bytearray(self.frame_bytes)
+        view = memoryview(buf)
+        filled = 0
+        try:
+            while not self._stop.is_set():
+                if not poller.poll(200):
+                    continue
+                try:
+                    n = os.readv(fd, [view[filled:]])
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    break
+                if n == 0:
+                    # ffmpeg closed its end (exit or restart): drop the partial frame, reopen.
+                    filled = 0
+                    poller.unregister(fd)
+                    os.close(fd)
+                    fd = self._open_fifo()
+                    poller.register(fd, select.POLLIN)
+                    continue
+                filled += n
+                if filled == self.frame_bytes:
+                    self._seq += 1
+                    self._frame = PreviewFrame(self._seq, self.width, self.height, buf)
+                    buf = bytearray(self.frame_bytes)
+                    view = memoryview(buf)
+                    filled = 0
+        finally:
+            os.close(fd)
@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import re
+import select
+import shutil
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from omnilink.utils import user_state_dir
+
+log = logging.getLogger(__name__)
+
+TS_PACKET = 188
+TS_SYNC = 0x47
+PAT_PID = 0
+
+
+def default_record_dir() -> Path:
+    return user_state_dir() / "recordings"
+
+
+@dataclass
+class RecorderStats:
+    # Disk write rate since the previous stats() call.
+    write_kbps: float
+    bytes_written: int
+    # Bytes read from ffmpeg but not yet on disk, now and at the peak since the previous call.
+    queue_bytes: int
+    queue_peak_bytes: int
+    dropped_bytes: int
+    segments: int
+    disk_bytes: int
+    current: str
+    # Why the last segment could not be opened (full or missing card); empty once one opens.
+    error: str = ""
+
+
+def _ts_pid(pkt: bytes) -> int:
+    return ((pkt[1] & 0x1F) << 8) | pkt[2]
+
+
+def _ts_random_access(pkt: bytes) -> bool:
+    """Payload unit start with random_access_indicator set: a keyframe starts here."""
+    if not pkt[1] & 0x40 or not (pkt[3] >> 4) & 0x2:
+        return False
+    return pkt[4] > 0 and bool(pkt[5] & 0x40)
+
+
+def _pat_pmt_pids(pkt: bytes) -> List[int]:
+    if not pkt[1] & 0x40:
+        return []
+    i = 4
+    if (pkt[3] >> 4) & 0x2:
+        i += 1 + pkt[4]
+    i += 1 + pkt[i]  # pointer field
+    if i + 8 > TS_PACKET:
+        return []
+    section_len = ((pkt[i + 1] & 0x0F) << 8) | pkt[i + 2]
+    end = min(i + 3 + section_len - 4, TS_PACKET)
+    pids = []
+    for j in range(i + 8, end - 3, 4):
+        program = (pkt[j] << 8) | pkt[j + 1]
+        if program:
+            pids.append(((pkt[j + 2] & 0x1F) << 8) | pkt[j + 3])
+    return pids
+
+
+class SegmentRecorder:
+    """
+    Local recording of the stream ffmpeg already encodes.
+
+    ffmpeg writes an MPEG-TS copy of its output (tee muxer) into `fifo_path`. A reader
+    thread moves the bytes into a bounded queue so a slow disk never stalls the encoder
+    (the excess is dropped and counted); a writer thread cuts the stream into segment
+    files of about `segment_s` seconds at keyframes, each starting with the PAT/PMT, and
+    deletes the oldest segments beyond `max_bytes`. MPEG-TS needs no trailer, so a
+    segment cut short by a crash or power loss stays playable.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        prefix: str,
+        segment_s: float = 60.0,
+        max_bytes: int = 2 * 1024 ** 3,
+        max_queued: int = 32 * 1024 * 1024,
+    ):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.segment_s = float(segment_s)
+        self.max_bytes = int(max_bytes)
+        self.max_queued = int(max_queued)
+        self.fifo_path = ""
+        self._tmpdir = ""
+        # Only names _open_segment produces: another pipeline's prefix may start with this one.
+        self._segment_re = re.compile(rf"{re.escape(prefix)}-\d{{8}}-\d{{6}}(-\d+)?\.ts")
+        self._error = ""
+        self._queue: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+        self._queued = 0
+        self._peak = 0
+        self._dropped = 0
+        self._written = 0
+        self._segments = 0
+        self._current = ""
+        self._rate_t = 0.0
+        self._rate_bytes = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        """Raises OSError when the directory or the FIFO cannot be created."""
+        if self._threads:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # The FIFO lives in tmp: recordings may go to a FAT SD card without FIFO support.
+        self._tmpdir = tempfile.mkdtemp(prefix="omnilink-rec-")
+        self.fifo_path = os.path.join(self._tmpdir, f"{self.prefix}.ts")
+        os.mkfifo(self.fifo_path, 0o600)
+        self._stop.clear()
+        self._rate_t = time.monotonic()
+        self._rate_bytes = self._written
+        self._threads = [
+            threading.Thread(target=self._read, name=f"omnilink-rec-read-{self.prefix}", daemon=True),
+            threading.Thread(target=self._write, name=f"omnilink-rec-write-{self.prefix}", daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        self._rotate_disk()
+
+    def stop(self) -> None:
+        """Writes out what is queued, then closes the current segment."""
+        self._stop.set()
+        for t in self._threads:
+            t.join(3.0)
+        self._threads = []
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = ""
+            self.fifo_path = ""
+
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    def stats(self) -> RecorderStats:
+        now = time.monotonic()
+        disk = sum(size for _p, size in self._segment_files())
+        with self._lock:
+            dt = now - self._rate_t
+            kbps = (self._written - self._rate_bytes) * 8 / 1000.0 / dt if dt > 0 else 0.0
+            self._rate_t, self._rate_bytes = now, self._written
+            peak, self._peak = self._peak, self._queued
+            return RecorderStats(
+                write_kbps=kbps,
+                bytes_written=self._written,
+                queue_bytes=self._queued,
+                queue_peak_bytes=peak,
+                dropped_bytes=self._dropped,
+                segments=self._segments,
+                disk_bytes=disk,
+                current=self._current,
+                error=self._error,
+            )
+
+    # -------------------------
+    # Reader: FIFO -> queue
+    # -------------------------
+    def _open_fifo(self) -> int:
+        # Non-blocking so open() does not wait for ffmpeg; poll() reports no HUP until a
+        # writer has connected.
+        return os.open(self.fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+
+    def _read(self) -> None:
+        fd = self._open_fifo()
+        poller = select.poll()
+        poller.register(fd, select.POLLIN)
+        try:
+            while not self._stop.is_set():
+                if not poller.poll(200):
+                    continue
+                try:
+                    data = os.read(fd, 256 * 1024)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    break
+                if not data:
+                    # ffmpeg closed its end (exit or restart): finish the segment, reopen.
+                    self._queue.put(None)
+                    poller.unregister(fd)
+                    os.close(fd)
+                    fd = self._open_fifo()
+                    poller.register(fd, select.POLLIN)
+                    continue
+                with self._lock:
+                    if self._queued + len(data) > self.max_queued:
+                        self._dropped += len(data)
+                        continue
+                    self._queued += len(data)
+                    self._peak = max(self._peak, self._queued)
+                self._queue.put(data)
+        finally:
+            os.close(fd)
+            self._queue.put(b"")
+
+    # -------------------------
+    # Writer: queue -> segment files
+    # -------------------------
+    def _write(self) -> None:
+        out: Optional[int] = None
+        seg_start = 0.0
+        partial = b""
+        psi: dict = {}
+        pmt_pids: List[int] = []
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk == b"":
+                    break
+                if chunk is None:
+                    self._close_segment(out)
+                    out = None
+                    partial, psi = b"", {}
+                    continue
+                with self._lock:
+                    self._queued -= len(chunk)
+                data = partial + chunk
+                start = 0
+                while start < len(data) and data[start] != TS_SYNC:
+                    start += 1
+                end = start + (len(data) - start) // TS_PACKET * TS_PACKET
+                partial = data[end:]
+
+                span = start
+                for i in range(start, end, TS_PACKET):
+                    pkt = data[i:i + TS_PACKET]
+                    if pkt[0] != TS_SYNC:
+                        continue
+                    pid = _ts_pid(pkt)
+                    if pid == PAT_PID:
+                        psi[pid] = pkt
+                        pmt_pids = _pat_pmt_pids(pkt) or pmt_pids
+                    elif pid in pmt_pids:
+                        psi[pid] = pkt
+                    elif _ts_random_access(pkt) and (out is None or time.monotonic() - seg_start >= self.segment_s):
+                        if out is not None:
+                            self._put(out, data[span:i])
+                        self._close_segment(out)
+                        # On failure the stream is skipped up to the next keyframe, then retried.
+                        out = self._try_open_segment()
+                        seg_start = time.monotonic()
+                        if out is not None:
+                            self._put(out, b"".join(psi.values()))
+                        span = i
+                if out is not None:
+                    self._put(out, data[span:end])
+        finally:
+            self._close_segment(out)
+
+    def _put(self, fd: int, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            try:
+                n = os.write(fd, view)
+            except OSError as e:
+                log.warning("recording write failed: %s", e)
+                return
+            view = view[n:]
+            with self._lock:
+                self._written += n
+
+    def _try_open_segment(self) -> Optional[int]:
+        try:
+            fd = self._open_segment()
+        except OSError as e:
+            if not self._error:
+                log.warning("recording segment cannot be opened: %s", e)
+            self._error = str(e)
+            return None
+        if self._error:
+            log.info("recording resumed: %s", self._current)
+            self._error = ""
+        return fd
+
+    def _open_segment(self) -> int:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = self.directory / f"{self.prefix}-{stamp}.ts"
+        n = 1
+        while path.exists():
+            n += 1
+            path = self.directory / f"{self.prefix}-{stamp}-{n}.ts"
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        with self._lock:
+            self._segments += 1
+            self._current = path.name
+        self._rotate_disk()
+        return fd
+
+    def _close_segment(self, fd: Optional[int]) -> None:
+        if fd is not None:
+            try:
+                os.fsync(fd)
+            except OSError:
+                pass
+            os.close(fd)
+        with self._lock:
+            self._current = ""
+
+    def _segment_files(self) -> List[Tuple[Path, int]]:
+        """(path, size) of this recorder's segments, oldest first."""
+        files = []
+        for p in self.directory.glob(f"{self.prefix}-*.ts"):
+            if not self._segment_re.fullmatch(p.name):
+                continue
+            try:
+                st = p.stat()
+            except OSError:
+                # Deleted since the glob (operator, or rotated out).
+                continue
+            files.append((st.st_mtime, p, st.st_size))
+        return [(p, size) for _, p, size in sorted(files)]
+
+    def _rotate_disk(self) -> None:
+        files = self._segment_files()
+        total = sum(size for _p, size in files)
+        # Never delete the segment being written (the newest).
+        for p, size in files[:-1]:
+            if total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+                total -= size
+                log.info("recording rotated out: %s", p.name)
+            except OSError:
+                pass
@@ -0,0 +1,605 @@
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from omnilink.process import (
+    SUP_GAVE_UP,
+    SUP_RESTARTED,
+    SUP_RESTARTING,
+    AsyncLifecycle,
+    ChildStats,
+    ManagedProcess,
+    RestartPolicy,
+    Supervisor,
+)
+from omnilink.utils import ProcessLogPump, has_cmd, looks_like_rtsp
+from omnilink.video.constants import MEDIAMTX_BIN_DEFAULT, V4L2_INPUT_FORMATS
+from omnilink.video.devices import get_device_modes, pick_capture_mode
+from omnilink.video.encoder_stats import EncoderStats
+from omnilink.video.mediamtx import MediaMtxServer
+from omnilink.video.pipeline import (
+    ENCODE_AUTO,
+    ENCODE_TRANSCODE,
+    INPUT_RTSP,
+    INPUT_V4L2,
+    CodecInfo,
+    Rendition,
+    StreamConfig,
+    build_ffmpeg_args,
+    choose_encode,
+    probe_codec,
+    record_startup,
+    rtsp_describe_status,
+    validate_renditions,
+    wait_until,
+)
+from omnilink.video.preview import PreviewPipe
+from omnilink.video.recorder import RecorderStats, SegmentRecorder, default_record_dir
+
+log = logging.getLogger(__name__)
+
+# on_event(kind, value) from worker threads.
+EVENT_MODE = "mode"                        # (mode, reason)
+EVENT_MEDIAMTX_READY = "mediamtx_ready"    # ms since start
+EVENT_STREAM_READY = "stream_ready"        # ms since start
+EVENT_STARTUP_FAILED = "startup_failed"    # message
+EVENT_RESTARTING = "restarting"            # (process name, delay s)
+EVENT_RESTARTED = "restarted"              # (process name, restart count)
+EVENT_EXITED = "exited"                    # (process name, return code): exited and not restarted
+
+EventCallback = Callable[[str, object], None]
+
+
+@dataclass
+class VideoConfig:
+    input_kind: str = INPUT_RTSP
+    rtsp_url: str = "rtsp://192.168.144.25:8554/main.264"
+    device: str = ""
+    resolution: str = "1280x720"
+    fps: int = 30
+    # Webcam capture FourCC ("MJPG", "YUYV", "H264", ...); empty picks the cheapest format
+    # the device lists for resolution@fps.
+    input_format: str = ""
+    bitrate_kbps: int = 2500
+    # Requested mode: ENCODE_AUTO, ENCODE_COPY or ENCODE_TRANSCODE.
+    encode: str = ENCODE_AUTO
+    out_port: int = 8554
+    out_path: str = "qgc"
+    mediamtx_bin: str = MEDIAMTX_BIN_DEFAULT
+    port_timeout_s: float = 5.0
+    stream_timeout_s: float = 15.0
+    # Restart a crashed mediamtx/ffmpeg with backoff instead of stopping the pipeline.
+    auto_restart: bool = True
+    # Simulcast: extra encodes of the same decoded input, each on its own MediaMTX path.
+    renditions: List[Rendition] = field(default_factory=list)
+    # Local recording of the main output (same encode), in MPEG-TS segments.
+    record: bool = False
+    # Empty: <state dir>/recordings.
+    record_dir: str = ""
+    segment_s: float = 60.0
+    # Oldest segments are deleted beyond this total.
+    record_max_mb: int = 2048
+    # Downscaled raw frames for the in-app preview, at most preview_fps per second.
+    preview: bool = False
+    preview_fps: int = 5
+
+    @property
+    def path_name(self) -> str:
+        return self.out_path.strip().lstrip("/") or "qgc"
+
+    @property
+    def path_names(self) -> List[str]:
+        return [self.path_name] + [r.path for r in self.renditions]
+
+
+def validate_video_config(cfg: VideoConfig) -> Optional[str]:
+    if not Path(cfg.mediamtx_bin).exists():
+        return f"mediamtx tidak ditemukan: {cfg.mediamtx_bin}"
+    if not has_cmd("ffmpeg"):
+        return "ffmpeg tidak ditemukan"
+    if any(c.isspace() for c in cfg.path_name):
+        return "Path output tidak boleh ada spasi"
+    err = validate_renditions(cfg.renditions, cfg.path_name)
+    if err:
+        return err
+    if cfg.record and (float(cfg.segment_s) <= 0 or int(cfg.record_max_mb) <= 0):
+        return "Durasi segmen / batas rekaman tidak valid"
+    if cfg.preview and not 1 <= int(cfg.preview_fps) <= 30:
+        return f"FPS preview tidak valid: {cfg.preview_fps}"
+
+    if cfg.input_kind == INPUT_RTSP:
+        src = cfg.rtsp_url.strip()
+        if not src:
+            return "RTSP input kosong"
+        if not looks_like_rtsp(src):
+            return "RTSP input harus diawali rtsp://"
+    else:
+        if not cfg.device or not Path(cfg.device).exists():
+            return "Webcam device tidak valid"
+        if not re.match(r"^\d+x\d+$", cfg.resolution.strip()):
+            return "Resolusi tidak valid"
+        if int(cfg.fps) <= 0:
+            return "FPS tidak valid"
+        if cfg.input_format and cfg.input_format not in V4L2_INPUT_FORMATS:
+            return f"Format kamera tidak dikenal: {cfg.input_format}"
+    return None
+
+
+@dataclass
+class PipelineStats:
+    name: str
+    running: bool
+    paths: List[str]
+    # ffmpeg CPU use in percent of one core since the previous stats() call.
+    cpu_pct: Optional[float]
+    fps: Optional[float]
+    restarts: int
+    recording: Optional[RecorderStats] = None
+
+
+class VideoPipeline:
+    """
+    One input -> encode -> publish chain: the ffmpeg side of a VideoConfig, publishing to a
+    MediaMtxServer it does not own.
+
+    start() returns at once; a worker thread resolves the encode mode (ffprobe for RTSP
+    Auto), waits for the server port, starts ffmpeg and waits until every path (main output
+    and renditions) is live, reporting each step through `emit(kind, value)`. ffmpeg runs
+    under the pipeline's own Supervisor.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cfg: VideoConfig,
+        server: MediaMtxServer,
+        emit: EventCallback,
+        proc_name: str = "ffmpeg",
+    ):
+        self.name = name
+        self.cfg = cfg
+        self.server = server
+        self.proc_name = proc_name
+        self.encoder_stats = EncoderStats()
+        self.ff_log = ProcessLogPump(proc_name, line_handler=self.encoder_stats.feed_line)
+        self.ff: Optional[ManagedProcess] = None
+        self.recorder: Optional[SegmentRecorder] = None
+        self.preview: Optional[PreviewPipe] = None
+        self.stream: Optional[StreamConfig] = None
+        self.last_startup: dict = {}
+        self.supervisor = Supervisor(on_event=self._on_supervisor_event)
+        self._emit = emit
+        self._startup: dict = {}
+        self._cancel = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Raises OSError when the recording directory or the preview FIFO cannot be used."""
+        if self.running():
+            return
+        cfg = self.cfg
+        t0 = time.monotonic()
+        self._startup = {"path": cfg.path_name, "mode": "rtsp" if cfg.input_kind == INPUT_RTSP else "webcam"}
+        if self.name:
+            self._startup["pipeline"] = self.name
+        if cfg.renditions:
+            self._startup["renditions"] = len(cfg.renditions)
+        self.stream = StreamConfig(
+            input_kind=cfg.input_kind,
+            rtsp_url=cfg.rtsp_url.strip(),
+            device=cfg.device,
+            resolution=cfg.resolution.strip(),
+            fps=int(cfg.fps),
+            bitrate_kbps=int(cfg.bitrate_kbps),
+            publish_url=f"rtsp://127.0.0.1:{self.server.port}/{cfg.path_name}",
+            progress=True,
+            renditions=list(cfg.renditions),
+        )
+        if cfg.record:
+            recorder = SegmentRecorder(
+                Path(cfg.record_dir) if cfg.record_dir else default_record_dir(),
+                prefix=cfg.path_name,
+                segment_s=float(cfg.segment_s),
+                max_bytes=int(cfg.record_max_mb) * 1024 * 1024,
+            )
+            try:
+                recorder.start()
+            except OSError as e:
+                raise OSError(f"rekaman gagal: {e}") from e
+            self.recorder = recorder
+            self.stream.record_url = recorder.fifo_path
+            self._startup["record"] = True
+        if cfg.preview:
+            preview = PreviewPipe()
+            try:
+                preview.start()
+            except OSError:
+                if self.recorder is not None:
+                    self.recorder.stop()
+                    self.recorder = None
+                raise
+            self.preview = preview
+            self.stream.preview_url = preview.fifo_path
+            self.stream.preview_fps = int(cfg.preview_fps)
+        self.supervisor.policy = RestartPolicy() if cfg.auto_restart else RestartPolicy(max_restarts=0)
+        # The worker gets its own copies: one that outlives stop()'s join must not see
+        # the state of a later start() (or None).
+        self._cancel = threading.Event()
+        self._worker = threading.Thread(
+            target=self._bring_up,
+            args=(t0, cfg, self.stream, self._startup, self._cancel),
+            name=f"omnilink-video-{self.proc_name}",
+            daemon=True,
+        )
+        self._worker.start()
+
+    def _bring_up(self, t0: float, cfg: VideoConfig, stream: StreamConfig, startup: dict, cancel: threading.Event) -> None:
+        cancelled = cancel.is_set
+
+        def failed(msg: str) -> None:
+            if not cancelled():
+                self._startup_failed(startup, msg)
+
+        info: list[Optional[CodecInfo]] = [None]
+        if cfg.input_kind == INPUT_V4L2:
+            info[0], err = self._resolve_capture(cfg, stream, startup)
+            if err:
+                failed(err)
+                return
+        probe: Optional[threading.Thread] = None
+        if cfg.input_kind == INPUT_RTSP and cfg.encode == ENCODE_AUTO:
+            probe = threading.Thread(target=lambda: info.__setitem__(0, probe_codec(stream.rtsp_url)), daemon=True)
+            probe.start()
+
+        if not self.server.wait_ready(cfg.port_timeout_s, cancelled):
+            failed(f"mediamtx tidak siap di port {self.server.port}")
+            return
+        if cancelled():
+            return
+        startup["mediamtx_ready_ms"] = round((time.monotonic() - t0) * 1000.0, 1)
+        self._emit(EVENT_MEDIAMTX_READY, startup["mediamtx_ready_ms"])
+
+        if probe is not None:
+            # probe_codec has its own timeout; stop() must not wait for it.
+            wait_until(lambda: not probe.is_alive(), 3600.0, cancelled)
+            if cancelled():
+                return
+        mode, reason = choose_encode(cfg.encode, cfg.input_kind, info[0])
+        stream.encode = mode
+        startup["encode"] = mode
+        self._emit(EVENT_MODE, (mode, reason))
+
+        with self._lock:
+            if cancelled():
+                return
+            self.encoder_stats.reset()
+            ff = ManagedProcess(self.proc_name, ["ffmpeg"] + build_ffmpeg_args(stream), log_pump=self.ff_log)
+            self.supervisor.watch(ff)
+            try:
+                ff.start()
+            except OSError:
+                self.supervisor.unwatch(ff.name)
+                self._startup_failed(startup, "ffmpeg gagal start")
+                return
+            self.ff = ff
+
+        pending = list(cfg.path_names)
+        port = self.server.port
+
+        def all_live() -> bool:
+            pending[:] = [p for p in pending if rtsp_describe_status("127.0.0.1", port, p) != 200]
+            return not pending
+
+        deadline = t0 + cfg.stream_timeout_s
+        live = wait_until(
+            all_live,
+            max(0.0, deadline - time.monotonic()),
+            cancelled,
+            interval=0.05,
+        )
+        if cancelled():
+            return
+        if not live:
+            failed(f"stream belum tersedia di mediamtx: {', '.join(pending)}")
+            return
+        startup["first_frame_ms"] = round((time.monotonic() - t0) * 1000.0, 1)
+        startup["ts"] = round(time.time(), 3)
+        self.last_startup = dict(startup)
+        record_startup(self.last_startup)
+        self._emit(EVENT_STREAM_READY, startup["first_frame_ms"])
+
+    def _resolve_capture(self, cfg: VideoConfig, stream: StreamConfig, startup: dict) -> Tuple[Optional[CodecInfo], str]:
+        """
+        Picks the webcam capture format. Returns (capture format, error). The format is None
+        when the device does not list its modes; MJPEG is then assumed unless one was chosen.
+        """
+        modes = get_device_modes(cfg.device)
+        if not modes:
+            if cfg.input_format:
+                stream.input_format = V4L2_INPUT_FORMATS[cfg.input_format]
+            return None, ""
+        mode = pick_capture_mode(
+            modes, stream.resolution, stream.fps, cfg.input_format, transcode=cfg.encode == ENCODE_TRANSCODE
+        )
+        if mode is None:
+            return None, f"mode kamera tidak didukung: {cfg.input_format or 'auto'} {stream.resolution}@{stream.fps}"
+        stream.input_format = V4L2_INPUT_FORMATS[mode.fourcc]
+        startup["capture"] = mode.describe()
+        return CodecInfo(codec=stream.input_format, width=mode.width, height=mode.height), ""
+
+    def _startup_failed(self, startup: dict, msg: str) -> None:
+        startup["error"] = msg
+        startup["ts"] = round(time.time(), 3)
+        record_startup(dict(startup))
+        self._emit(EVENT_STARTUP_FAILED, msg)
+
+    def _on_supervisor_event(self, kind: str, name: str, value: object) -> None:
+        if self._cancel.is_set():
+            return
+        if kind == SUP_RESTARTED:
+            self.encoder_stats.reset()
+        _forward_supervisor_event(self._emit, kind, name, value)
+
+    def running(self) -> bool:
+        return self.ff is not None or (self._worker is not None and self._worker.is_alive())
+
+    def cpu_percent(self) -> Optional[float]:
+        ff = self.ff
+        return ff.cpu_percent() if ff is not None else None
+
+    def recorder_stats(self) -> Optional[RecorderStats]:
+        recorder = self.recorder
+        return recorder.stats() if recorder is not None else None
+
+    def stop(self) -> None:
+        self._cancel.set()
+        self.supervisor.clear()
+        if self._worker is not None and self._worker is not threading.current_thread():
+            self._worker.join(2.0)
+            if self._worker.is_alive():
+                # Blocked in a probe; it only holds its own copies and starts nothing now.
+                log.warning("%s: startup worker still busy after stop", self.proc_name)
+        self._worker = None
+        with self._lock:
+            ff, self.ff = self.ff, None
+        if ff is not None:
+            ff.stop()
+        # After ffmpeg: the recorder writes out what ffmpeg sent before closing the segment.
+        if self.recorder is not None:
+            self.recorder.stop()
+            self.recorder = None
+        if self.preview is not None:
+            self.preview.stop()
+            self.preview = None
+        self.stream = None
+
+
+def _forward_supervisor_event(emit: EventCallback, kind: str, name: str, value: object) -> None:
+    if kind == SUP_RESTARTING:
+        emit(EVENT_RESTARTING, (name, value))
+    elif kind == SUP_RESTARTED:
+        emit(EVENT_RESTARTED, (name, value))
+    elif kind == SUP_GAVE_UP:
+        emit(EVENT_EXITED, (name, value))
+
+
+class PipelineManager(AsyncLifecycle):
+    """
+    Many independent video pipelines published through one shared MediaMTX.
+
+    Each pipeline is started and stopped on its own: the server's path list follows the
+    running pipelines and is hot-reloaded, so the server itself keeps running. Events
+    arrive as `on_event(source, kind, value)` where source is the pipeline name, or
+    MediaMtxServer.NAME for server restarts. stats() reports per-pipeline ffmpeg CPU use so
+    the number of streams a host can carry can be measured.
+    """
+
+    def __init__(
+        self,
+        mediamtx_bin: str = MEDIAMTX_BIN_DEFAULT,
+        port: int = 8554,
+        on_event: Optional[Callable[[str, str, object], None]] = None,
+        auto_restart: bool = True,
+    ):
+        self.on_event = on_event
+        self.auto_restart = auto_restart
+        self.server = MediaMtxServer(mediamtx_bin, port, on_event=self._on_server_event)
+        self.pipelines: Dict[str, VideoPipeline] = {}
+        self._lock = threading.RLock()
+
+    def _emit(self, source: str, kind: str, value: object) -> None:
+        if self.on_event is not None:
+            try:
+                self.on_event(source, kind, value)
+            except Exception:
+                log.exception("video event callback failed")
+
+    def _on_server_event(self, kind: str, name: str, value: object) -> None:
+        _forward_supervisor_event(lambda k, v: self._emit(MediaMtxServer.NAME, k, v), kind, name, value)
+
+    def configure_server(self, mediamtx_bin: str, port: int, auto_restart: bool = True) -> None:
+        """Only takes effect while the server is stopped."""
+        with self._lock:
+            if self.server.running():
+                return
+            self.server.bin_path = mediamtx_bin
+            self.server.port = int(port)
+            self.auto_restart = auto_restart
+
+    def add(self, name: str, cfg: VideoConfig, proc_name: str = "") -> VideoPipeline:
+        with self._lock:
+            if name in self.pipelines:
+                raise ValueError(f"pipeline sudah ada: {name}")
+            pipe = VideoPipeline(
+                name, cfg, self.server,
+                emit=lambda kind, value, n=name: self._emit(n, kind, value),
+                proc_name=proc_name or f"ffmpeg-{name}",
+            )
+            self.pipelines[name] = pipe
+            return pipe
+
+    def remove(self, name: str) -> None:
+        self.stop_pipeline(name)
+        with self._lock:
+            self.pipelines.pop(name, None)
+
+    def _running_paths(self, exclude: str = "") -> List[str]:
+        return [p for n, pipe in self.pipelines.items() if n != exclude and pipe.running() for p in pipe.cfg.path_names]
+
+    def start_pipeline(self, name: str) -> None:
+        """
+        Raises KeyError for an unknown pipeline, ValueError for invalid settings or a path
+        already published by another pipeline, and OSError when MediaMTX cannot be started.
+        """
+        with self._lock:
+            pipe = self.pipelines[name]
+            if pipe.running():
+                return
+            cfg = replace(pipe.cfg, mediamtx_bin=self.server.bin_path, out_port=self.server.port)
+            err = validate_video_config(cfg)
+            if err:
+                raise ValueError(f"{name}: {err}" if len(self.pipelines) > 1 else err)
+            others = self._running_paths(exclude=name)
+            taken = sorted(set(others) & set(cfg.path_names))
+            if taken:
+                raise ValueError(f"{name}: path sudah dipakai: {', '.join(taken)}")
+            pipe.cfg = cfg
+            paths = others + cfg.path_names
+            if self.server.running():
+                self.server.set_paths(paths)
+            else:
+                self.server.start(paths, self.auto_restart)
+            pipe.start()
+
+    def stop_pipeline(self, name: str) -> None:
+        with self._lock:
+            pipe = self.pipelines.get(name)
+            if pipe is None:
+                return
+            pipe.stop()
+            self.server.set_paths(self._running_paths())
+
+    def start(self) -> None:
+        for name in list(self.pipelines):
+            self.start_pipeline(name)
+
+    def stop(self) -> None:
+        with self._lock:
+            for pipe in self.pipelines.values():
+                pipe.stop()
+            self.server.stop()
+
+    def is_running(self) -> bool:
+        return self.server.running() or any(p.running() for p in self.pipelines.values())
+
+    def restart_stats(self) -> List[ChildStats]:
+        stats = self.server.restart_stats()
+        for pipe in self.pipelines.values():
+            stats += pipe.supervisor.stats()
+        return stats
+
+    def stats(self) -> List[PipelineStats]:
+        out: List[PipelineStats] = []
+        for name, pipe in list(self.pipelines.items()):
+            sample = pipe.encoder_stats.latest() if pipe.ff is not None else None
+            out.append(PipelineStats(
+                name=name,
+                running=pipe.running(),
+                paths=pipe.cfg.path_names,
+                cpu_pct=pipe.cpu_percent(),
+                fps=sample.fps if sample is not None else None,
+                restarts=sum(s.restarts for s in pipe.supervisor.stats()),
+                recording=pipe.recorder_stats(),
+            ))
+        return out
+
+    def server_cpu_percent(self) -> Optional[float]:
+        return self.server.cpu_percent()
+
+
+class VideoService(AsyncLifecycle):
+    """
+    Single-pipeline video service (GUI Video tab): a PipelineManager with one pipeline
+    whose MediaMTX is started and stopped together with it.
+
+    Both children run under a Supervisor: a child that exits on its own is restarted alone
+    (EVENT_RESTARTING/EVENT_RESTARTED); EVENT_EXITED means it was given up.
+    """
+
+    PIPELINE = "video"
+
+    def __init__(self, cfg: VideoConfig, on_event: Optional[EventCallback] = None):
+        self.cfg = cfg
+        self.on_event = on_event
+        self.manager = PipelineManager(on_event=self._on_manager_event)
+        self.pipeline = self.manager.add(self.PIPELINE, cfg, proc_name="ffmpeg")
+
+    def _on_manager_event(self, _source: str, kind: str, value: object) -> None:
+        if self.on_event is not None:
+            try:
+                self.on_event(kind, value)
+            except Exception:
+                log.exception("video event callback failed")
+
+    def start(self) -> None:
+        """Raises ValueError for invalid settings and OSError when MediaMTX cannot be started."""
+        if self.is_running():
+            return
+        cfg = self.cfg
+        self.manager.configure_server(cfg.mediamtx_bin, cfg.out_port, cfg.auto_restart)
+        self.pipeline.cfg = cfg
+        self.manager.start_pipeline(self.PIPELINE)
+
+    def stop(self) -> None:
+        self.manager.stop()
+
+    def is_running(self) -> bool:
+        return self.manager.is_running()
+
+    def restart_stats(self) -> List[ChildStats]:
+        return self.manager.restart_stats()
+
+    def cpu_percent(self) -> Optional[float]:
+        return self.pipeline.cpu_percent()
+
+    def recorder_stats(self) -> Optional[RecorderStats]:
+        return self.pipeline.recorder_stats()
+
+    @property
+    def preview(self) -> Optional[PreviewPipe]:
+        return self.pipeline.preview
+
+    @property
+    def mt(self) -> Optional[ManagedProcess]:
+        return self.manager.server.proc
+
+    @property
+    def mt_log(self) -> ProcessLogPump:
+        return self.manager.server.log
+
+    @property
+    def ff(self) -> Optional[ManagedProcess]:
+        return self.pipeline.ff
+
+    @property
+    def ff_log(self) -> ProcessLogPump:
+        return self.pipeline.ff_log
+
+    @property
+    def encoder_stats(self) -> EncoderStats:
+        return self.pipeline.encoder_stats
+
+    @property
+    def stream(self) -> Optional[StreamConfig]:
+        return self.pipeline.stream
+
+    @property
+    def last_startup(self) -> dict:
+        return self.pipeline.last_startup
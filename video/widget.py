@@ -1,37 +1,124 @@
 from __future__ import annotations
 
-import re
-from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+from omnilink.process import CHILD_BACKOFF, restart_summary
+from omnilink.utils import ProcessLogPump, guess_ip, set_status_label
+from omnilink.video.constants import FPS_CHOICES, MEDIAMTX_BIN_DEFAULT, PREVIEW_HEIGHT, PREVIEW_WIDTH, RES_CHOICES
+from omnilink.video.devices import (
+    CaptureMode,
+    discover_capture_devices,
+    list_video_devices,
+    mode_formats,
+    mode_rates,
+    mode_resolutions,
+)
+from omnilink.video.encoder_stats import EncoderSample
+from omnilink.video.preview import PreviewFrame
+from omnilink.video.recorder import default_record_dir
+from omnilink.video.pipeline import (
+    ENCODE_AUTO,
+    ENCODE_COPY,
+    ENCODE_TRANSCODE,
+    INPUT_RTSP,
+    INPUT_V4L2,
+    parse_renditions,
+)
+from omnilink.video.service import (
+    EVENT_EXITED,
+    EVENT_MODE,
+    EVENT_RESTARTING,
+    EVENT_STARTUP_FAILED,
+    EVENT_STREAM_READY,
+    VideoConfig,
+    VideoService,
+)
+from omnilink.video.workers import CameraWatcher, VideoEvents
+
+PHASE_STARTING = "STARTING"
+PHASE_STOPPING = "STOPPING"
+
+# Index order of the Encode combo box.
+ENCODE_CHOICES = [ENCODE_AUTO, ENCODE_COPY, ENCODE_TRANSCODE]
+
+
+class PreviewView(QtWidgets.QWidget):
+    """
+    Paints the newest PreviewFrame. The QImage wraps the frame buffer (no copy) and is drawn
+    directly, without a QPixmap conversion.
+    """
 
-from PyQt5 import QtCore, QtWidgets
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setMinimumSize(PREVIEW_WIDTH, PREVIEW_HEIGHT)
+        self._frame: Optional[PreviewFrame] = None
+        self._image: Optional[QtGui.QImage] = None
 
-from omnilink.utils import guess_ip, has_cmd, looks_like_rtsp, set_status_label
-from omnilink.video.constants import FPS_CHOICES, MEDIAMTX_BIN_DEFAULT, RES_CHOICES, X264_PARAMS
-from omnilink.video.devices import get_device_label, list_video_devices
+    def set_frame(self, frame: Optional[PreviewFrame]) -> None:
+        if frame is self._frame:
+            return
+        # Keep the frame referenced for as long as the QImage points into its buffer.
+        self._frame = frame
+        self._image = None if frame is None else QtGui.QImage(
+            frame.data, frame.width, frame.height, frame.width * 3, QtGui.QImage.Format_RGB888
+        )
+        self.update()
+
+    def paintEvent(self, _event) -> None:
+        p = QtGui.QPainter(self)
+        p.fillRect(self.rect(), QtCore.Qt.black)
+        if self._image is not None:
+            size = self._image.size().scaled(self.size(), QtCore.Qt.KeepAspectRatio)
+            target = QtCore.QRect(QtCore.QPoint(0, 0), size)
+            target.moveCenter(self.rect().center())
+            p.drawImage(target, self._image)
+        p.end()
 
 
 class VideoWidget(QtWidgets.QWidget):
+    # Emitted once an asynchronous start/stop has finished.
+    started = QtCore.pyqtSignal(bool)
+    stopped = QtCore.pyqtSignal()
+
     def __init__(self, parent=None):
         super().__init__(parent)
 
-        self.mt: Optional[QtCore.QProcess] = None
-        self.ff: Optional[QtCore.QProcess] = None
-
-        self.watchdog = QtCore.QTimer(self)
-        self.watchdog.setInterval(500)
-        self.watchdog.timeout.connect(self._watch_processes)
+        # Process lifecycle lives in VideoService; this widget only renders it.
+        self.events = VideoEvents(self)
+        self.events.event.connect(self._on_service_event)
+        self.events.started.connect(self._on_started)
+        self.events.stopped.connect(self._on_stopped)
+        self.service = VideoService(VideoConfig(), on_event=self.events.event.emit)
+        self._failed_log: Optional[ProcessLogPump] = None
+        # "", PHASE_STARTING or PHASE_STOPPING while an async start/stop is in flight.
+        self._phase = ""
 
         self._build_ui()
         self._update_out_url()
         self._apply_input_mode()
 
+        # Camera hotplug: inotify on /dev, or a cheap /dev listing poll when inotify is unavailable.
+        self._cam_nodes: List[str] = list_video_devices()
+        self.cam_watch = CameraWatcher(self)
+        self.cam_watch.changed.connect(self._refresh_cameras)
+        self._cam_poll = QtCore.QTimer(self)
+        self._cam_poll.setInterval(2000)
+        self._cam_poll.timeout.connect(self._poll_cameras)
+        if not self.cam_watch.start():
+            self._cam_poll.start()
+
         self._ui_timer = QtCore.QTimer(self)
         self._ui_timer.setInterval(600)
         self._ui_timer.timeout.connect(self._refresh_status)
         self._ui_timer.start()
         self._refresh_status()
 
+        self._preview_timer = QtCore.QTimer(self)
+        self._preview_timer.timeout.connect(self._refresh_preview)
+        self.preview_fps.valueChanged.connect(lambda _v: self._apply_preview())
+
     # -------------------------
     # UI
     # -------------------------
@@ -65,9 +152,19 @@ class VideoWidget(QtWidgets.QWidget):
         g.addWidget(self.out_url, 1, 1, 1, 4)
         g.addWidget(btn_copy, 1, 5)
 
+        self.renditions = QtWidgets.QPlainTextEdit()
+        self.renditions.setPlaceholderText(
+            "Optional simulcast, one per line: PATH WxH KBPS [FPS] (\"-\" keeps the input size)\n"
+            "Example:\nqgc_low 854x480 600 15"
+        )
+        self.renditions.setFixedHeight(60)
+        g.addWidget(QtWidgets.QLabel("Renditions"), 2, 0)
+        g.addWidget(self.renditions, 2, 1, 1, 5)
+
         self.out_ip.textChanged.connect(self._update_out_url)
         self.out_path.textChanged.connect(self._update_out_url)
         self.out_port.valueChanged.connect(lambda _v: self._update_out_url())
+        self.renditions.textChanged.connect(self._update_out_url)
 
         gb_in = QtWidgets.QGroupBox("Video Input")
         v.addWidget(gb_in)
@@ -82,22 +179,28 @@ class VideoWidget(QtWidgets.QWidget):
         self.in_rtsp.setPlaceholderText("rtsp://ip:port/path")
 
         self.cam_combo = QtWidgets.QComboBox()
-        self.btn_refresh_cam = QtWidgets.QPushButton("Refresh")
-        self.btn_refresh_cam.clicked.connect(self._refresh_cameras)
+        # Capture modes of the listed cameras, by device path.
+        self._cam_modes: Dict[str, List[CaptureMode]] = {}
 
+        # Filled per camera with the sizes/rates/formats it lists (presets if it lists none).
         self.res = QtWidgets.QComboBox()
-        self.res.addItems(RES_CHOICES)
-        self.res.setCurrentText("1280x720")
-
         self.fps = QtWidgets.QComboBox()
-        self.fps.addItems(FPS_CHOICES)
-        self.fps.setCurrentText("30")
+        self.in_fmt = QtWidgets.QComboBox()
+        self.in_fmt.setToolTip("Auto picks the cheapest capture format for this size and rate")
+        self.cam_combo.currentIndexChanged.connect(lambda _i: self._apply_camera_modes())
+        self.res.currentIndexChanged.connect(lambda _i: self._apply_camera_rates())
+        self.fps.currentIndexChanged.connect(lambda _i: self._apply_camera_formats())
 
         self.bitrate = QtWidgets.QSpinBox()
         self.bitrate.setRange(200, 20000)
         self.bitrate.setValue(2500)
         self.bitrate.setSuffix(" kbps")
 
+        self.encode_sel = QtWidgets.QComboBox()
+        self.encode_sel.addItems(["Auto", "Passthrough", "Transcode"])
+        self.encode_sel.setCurrentIndex(0)
+        self.encode_sel.currentIndexChanged.connect(lambda _i: self._apply_camera_formats())
+
         ig.addWidget(QtWidgets.QLabel("Input mode"), 0, 0)
         ig.addWidget(self.mode, 0, 1, 1, 3)
 
@@ -105,8 +208,9 @@ class VideoWidget(QtWidgets.QWidget):
         ig.addWidget(self.in_rtsp, 1, 1, 1, 3)
 
         ig.addWidget(QtWidgets.QLabel("Webcam"), 2, 0)
-        ig.addWidget(self.cam_combo, 2, 1, 1, 2)
-        ig.addWidget(self.btn_refresh_cam, 2, 3)
+        ig.addWidget(self.cam_combo, 2, 1)
+        ig.addWidget(QtWidgets.QLabel("Format"), 2, 2)
+        ig.addWidget(self.in_fmt, 2, 3)
 
         ig.addWidget(QtWidgets.QLabel("Resolution"), 3, 0)
         ig.addWidget(self.res, 3, 1)
@@ -115,6 +219,8 @@ class VideoWidget(QtWidgets.QWidget):
 
         ig.addWidget(QtWidgets.QLabel("Bitrate"), 4, 0)
         ig.addWidget(self.bitrate, 4, 1)
+        ig.addWidget(QtWidgets.QLabel("Encode"), 4, 2)
+        ig.addWidget(self.encode_sel, 4, 3)
 
         gb_ctl = QtWidgets.QGroupBox("Control")
         v.addWidget(gb_ctl)
@@ -126,6 +232,9 @@ class VideoWidget(QtWidgets.QWidget):
         self.btn_stop = QtWidgets.QPushButton("Stop")
         self.btn_stop.setEnabled(False)
 
+        self.record = QtWidgets.QCheckBox("Record")
+        self.record.setToolTip(f"Save the stream as MPEG-TS segments in {default_record_dir()}")
+
         self.status = QtWidgets.QLabel("STOPPED")
         self.status.setStyleSheet("font-weight:700; color: rgb(180, 60, 60);")
 
@@ -136,10 +245,56 @@ class VideoWidget(QtWidgets.QWidget):
         h.addWidget(self.mediamtx_bin, 1)
         h.addWidget(self.btn_start)
         h.addWidget(self.btn_stop)
+        h.addWidget(self.record)
         h.addStretch(1)
+        self.mode_lbl = QtWidgets.QLabel("")
+        self.mode_lbl.setStyleSheet("color: rgb(140, 140, 140);")
+        self.startup_lbl = QtWidgets.QLabel("")
+        self.startup_lbl.setStyleSheet("color: rgb(140, 140, 140);")
+        self.restart_lbl = QtWidgets.QLabel("")
+        self.restart_lbl.setStyleSheet("color: rgb(200, 120, 0);")
+        h.addWidget(self.mode_lbl)
+        h.addWidget(self.startup_lbl)
+        h.addWidget(self.restart_lbl)
         h.addWidget(QtWidgets.QLabel("Status:"))
         h.addWidget(self.status)
 
+        gb_enc = QtWidgets.QGroupBox("Encoder")
+        v.addWidget(gb_enc)
+        eh = QtWidgets.QHBoxLayout(gb_enc)
+        self.enc_fps = QtWidgets.QLabel("-")
+        self.enc_bitrate = QtWidgets.QLabel("-")
+        self.enc_frames = QtWidgets.QLabel("-")
+        self.enc_speed = QtWidgets.QLabel("-")
+        self.enc_cpu = QtWidgets.QLabel("-")
+        self.enc_rec = QtWidgets.QLabel("-")
+        for title, lbl in (("FPS", self.enc_fps), ("Bitrate", self.enc_bitrate),
+                           ("Drop/Dup", self.enc_frames), ("Speed", self.enc_speed), ("CPU", self.enc_cpu),
+                           ("Rec", self.enc_rec)):
+            eh.addWidget(QtWidgets.QLabel(title + ":"))
+            eh.addWidget(lbl)
+            eh.addSpacing(16)
+        eh.addStretch(1)
+
+        # Frames come from the running ffmpeg (no second decoder); Preview and Max FPS are
+        # part of the pipeline config and apply from the next start.
+        self.gb_preview = QtWidgets.QGroupBox("Preview")
+        self.gb_preview.setCheckable(True)
+        self.gb_preview.setChecked(False)
+        v.addWidget(self.gb_preview)
+        ph = QtWidgets.QHBoxLayout(self.gb_preview)
+        self.preview_view = PreviewView()
+        self.preview_view.setVisible(False)
+        self.preview_fps = QtWidgets.QSpinBox()
+        self.preview_fps.setRange(1, 15)
+        self.preview_fps.setValue(5)
+        self.preview_fps.setSuffix(" fps")
+        self.preview_fps.setToolTip("Upper limit for preview frames; applies from the next start")
+        ph.addWidget(self.preview_view, 1)
+        ph.addWidget(QtWidgets.QLabel("Max"), 0, QtCore.Qt.AlignTop)
+        ph.addWidget(self.preview_fps, 0, QtCore.Qt.AlignTop)
+        self.gb_preview.toggled.connect(self._apply_preview)
+
         self._refresh_cameras()
         v.addStretch(1)
 
@@ -148,208 +303,278 @@ class VideoWidget(QtWidgets.QWidget):
         port = int(self.out_port.value())
         path = (self.out_path.text().strip().lstrip("/") or "qgc")
         self.out_url.setText(f"rtsp://{ip}:{port}/{path}")
+        try:
+            extra = [f"rtsp://{ip}:{port}/{r.path}" for r in parse_renditions(self.renditions.toPlainText())]
+        except ValueError as e:
+            extra = [str(e)]
+        self.out_url.setToolTip("\n".join(extra))
 
     def _apply_input_mode(self) -> None:
         rtsp = (self.mode.currentIndex() == 0)
         self.in_rtsp.setEnabled(rtsp)
 
         self.cam_combo.setEnabled(not rtsp)
-        self.btn_refresh_cam.setEnabled(not rtsp)
         self.res.setEnabled(not rtsp)
         self.fps.setEnabled(not rtsp)
+        self.in_fmt.setEnabled(not rtsp)
 
     def _refresh_cameras(self) -> None:
+        current = self.cam_combo.currentData()
+        devs = discover_capture_devices()
+        self._cam_modes = {d.path: d.modes for d in devs}
+        self.cam_combo.blockSignals(True)
         self.cam_combo.clear()
-        devs = list_video_devices()
         for d in devs:
-            self.cam_combo.addItem(get_device_label(d), userData=d)
+            self.cam_combo.addItem(d.label, userData=d.path)
         if devs:
-            self.cam_combo.setCurrentIndex(0)
+            idx = self.cam_combo.findData(current)
+            self.cam_combo.setCurrentIndex(idx if idx >= 0 else 0)
+        self.cam_combo.blockSignals(False)
+        self._apply_camera_modes()
+
+    def _current_modes(self) -> List[CaptureMode]:
+        return self._cam_modes.get(str(self.cam_combo.currentData() or ""), [])
+
+    @staticmethod
+    def _fill_combo(combo: QtWidgets.QComboBox, items: List[str], preferred: str) -> None:
+        keep = combo.currentText() or preferred
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItems(items)
+        for text in (keep, preferred):
+            if text in items:
+                combo.setCurrentText(text)
+                break
+        combo.blockSignals(False)
+
+    def _apply_camera_modes(self) -> None:
+        modes = self._current_modes()
+        self._fill_combo(self.res, mode_resolutions(modes) or RES_CHOICES, "1280x720")
+        self._apply_camera_rates()
+
+    def _apply_camera_rates(self) -> None:
+        modes = self._current_modes()
+        rates = [str(r) for r in mode_rates(modes, self.res.currentText())]
+        self._fill_combo(self.fps, rates or FPS_CHOICES, "30")
+        self._apply_camera_formats()
+
+    def _apply_camera_formats(self) -> None:
+        fps = self.fps.currentText()
+        transcode = ENCODE_CHOICES[self.encode_sel.currentIndex()] == ENCODE_TRANSCODE
+        formats = mode_formats(self._current_modes(), self.res.currentText(), int(fps) if fps.isdigit() else 0, transcode)
+        current = self.in_fmt.currentData()
+        self.in_fmt.blockSignals(True)
+        self.in_fmt.clear()
+        self.in_fmt.addItem(f"Auto ({formats[0]})" if formats else "Auto", userData="")
+        for fourcc in formats:
+            self.in_fmt.addItem(fourcc, userData=fourcc)
+        idx = self.in_fmt.findData(current)
+        self.in_fmt.setCurrentIndex(idx if idx >= 0 else 0)
+        self.in_fmt.blockSignals(False)
+
+    def _poll_cameras(self) -> None:
+        nodes = list_video_devices()
+        if nodes != self._cam_nodes:
+            self._cam_nodes = nodes
+            self._refresh_cameras()
 
     # -------------------------
-    # Validation
+    # Settings
     # -------------------------
-    def _write_mediamtx_cfg_user(self, path_name: str) -> Path:
-        cfg_dir = Path.home() / ".config" / "mediamtx"
-        cfg_dir.mkdir(parents=True, exist_ok=True)
-        cfg_path = cfg_dir / "mediamtx.yml"
-        cfg_path.write_text(f"paths:\n  {path_name}:\n    source: publisher\n")
-        return cfg_path
-
-    def _validate(self) -> Optional[str]:
-        mtbin = self.mediamtx_bin.text().strip() or MEDIAMTX_BIN_DEFAULT
-        if not Path(mtbin).exists():
-            return f"mediamtx tidak ditemukan: {mtbin}"
-        if not has_cmd("ffmpeg"):
-            return "ffmpeg tidak ditemukan"
-
-        path = self.out_path.text().strip().lstrip("/") or "qgc"
-        if any(c.isspace() for c in path):
-            return "Path output tidak boleh ada spasi"
-
+    def _collect_config(self) -> VideoConfig:
+        cfg = VideoConfig(
+            bitrate_kbps=int(self.bitrate.value()),
+            encode=ENCODE_CHOICES[self.encode_sel.currentIndex()],
+            out_port=int(self.out_port.value()),
+            out_path=self.out_path.text(),
+            mediamtx_bin=self.mediamtx_bin.text().strip() or MEDIAMTX_BIN_DEFAULT,
+            renditions=parse_renditions(self.renditions.toPlainText()),
+            record=self.record.isChecked(),
+            preview=self.gb_preview.isChecked(),
+            preview_fps=int(self.preview_fps.value()),
+        )
         if self.mode.currentIndex() == 0:
-            src = self.in_rtsp.text().strip()
-            if not src:
-                return "RTSP input kosong"
-            if not looks_like_rtsp(src):
-                return "RTSP input harus diawali rtsp://"
+            cfg.input_kind = INPUT_RTSP
+            cfg.rtsp_url = self.in_rtsp.text().strip()
         else:
-            if self.cam_combo.count() == 0:
-                return "Webcam tidak terdeteksi (/dev/video*)"
-            dev = str(self.cam_combo.currentData())
-            if not dev or not Path(dev).exists():
-                return "Webcam device tidak valid"
-
-            res = self.res.currentText().strip()
-            if not re.match(r"^\d+x\d+$", res):
-                return "Resolusi tidak valid"
-
+            cfg.input_kind = INPUT_V4L2
+            cfg.device = str(self.cam_combo.currentData() or "")
+            cfg.resolution = self.res.currentText().strip()
+            cfg.input_format = str(self.in_fmt.currentData() or "")
             fps = self.fps.currentText().strip()
-            if not fps.isdigit():
-                return "FPS tidak valid"
-
-        return None
+            cfg.fps = int(fps) if fps.isdigit() else 0
+        return cfg
 
     # -------------------------
     # Process lifecycle
     # -------------------------
-    def start_stream(self) -> None:
-        if self.mt or self.ff:
-            return
+    def start_stream(self) -> bool:
+        """Starts asynchronously; returns False if nothing was started (see `started`)."""
+        if self._phase or self.service.is_running():
+            return False
+
+        try:
+            cfg = self._collect_config()
+        except ValueError as e:
+            QtWidgets.QMessageBox.critical(self, "OMNI-Link", str(e))
+            return False
+        if cfg.input_kind == INPUT_V4L2 and self.cam_combo.count() == 0:
+            QtWidgets.QMessageBox.critical(self, "OMNI-Link", "Webcam tidak terdeteksi (/dev/video*)")
+            return False
+
+        self.service.cfg = cfg
+        self._failed_log = None
+        self.status.setToolTip("")
+        self.startup_lbl.setText("")
+        self.restart_lbl.setText("")
+        self.mode_lbl.setText("Mode: probing" if cfg.input_kind == INPUT_RTSP and cfg.encode == ENCODE_AUTO else "")
+        self._set_phase(PHASE_STARTING)
+        self.service.start_async().add_done_callback(lambda f: self.events.started.emit(f.exception()))
+        return True
+
+    def _set_phase(self, phase: str) -> None:
+        self._phase = phase
+        self.btn_start.setEnabled(False)
+        self.btn_stop.setEnabled(phase == PHASE_STARTING)
+        set_status_label(self.status, phase, phase == PHASE_STARTING)
 
-        err = self._validate()
-        if err:
-            QtWidgets.QMessageBox.critical(self, "OMNI-Link", err)
+    def _on_started(self, err: Optional[BaseException]) -> None:
+        if self._phase != PHASE_STARTING:
+            # A stop was requested meanwhile; it finishes the UI update.
+            self.started.emit(err is None)
             return
-
-        mtbin = self.mediamtx_bin.text().strip() or MEDIAMTX_BIN_DEFAULT
-        out_port = int(self.out_port.value())
-        out_path = (self.out_path.text().strip().lstrip("/") or "qgc")
-        br = int(self.bitrate.value())
-
-        cfg_path = self._write_mediamtx_cfg_user(out_path)
-        publish_url = f"rtsp://127.0.0.1:{out_port}/{out_path}"
-
-        self.mt = QtCore.QProcess(self)
-        self.mt.setProcessChannelMode(QtCore.QProcess.MergedChannels)
-        self.mt.finished.connect(lambda _c, _s: self.stop_stream())
-        self.mt.start(mtbin, [str(cfg_path)])
-
-        if not self.mt.waitForStarted(2000):
-            self.mt = None
-            QtWidgets.QMessageBox.critical(self, "OMNI-Link", "mediamtx gagal start")
+        self._phase = ""
+        if err is not None:
+            self.btn_start.setEnabled(True)
+            self.btn_stop.setEnabled(False)
+            self.mode_lbl.setText("")
+            set_status_label(self.status, "STOPPED", False)
+            QtWidgets.QMessageBox.critical(self, "OMNI-Link", str(err))
+            self.started.emit(False)
             return
-
-        def start_ffmpeg():
-            if not self.mt:
-                return
-
-            self.ff = QtCore.QProcess(self)
-            self.ff.setProcessChannelMode(QtCore.QProcess.MergedChannels)
-            self.ff.finished.connect(lambda _c, _s: self.stop_stream())
-
-            args: List[str] = [
-                "-loglevel", "error",
-                "-fflags", "nobuffer",
-                "-flags", "low_delay",
-            ]
-
-            if self.mode.currentIndex() == 0:
-                src = self.in_rtsp.text().strip()
-                args += [
-                    "-rtsp_transport", "tcp",
-                    "-i", src,
-                ]
-                gop = 30
-            else:
-                dev = str(self.cam_combo.currentData())
-                res = self.res.currentText().strip()
-                fps = int(self.fps.currentText().strip())
-                gop = fps
-
-                args += [
-                    "-f", "v4l2",
-                    "-input_format", "mjpeg",
-                    "-framerate", str(fps),
-                    "-video_size", res,
-                    "-i", dev,
-                ]
-
-            args += [
-                "-an",
-                "-c:v", "libx264",
-                "-preset", "ultrafast",
-                "-tune", "zerolatency",
-                "-pix_fmt", "yuv420p",
-                "-profile:v", "baseline",
-                "-g", str(gop),
-                "-keyint_min", str(gop),
-                "-sc_threshold", "0",
-                "-bf", "0",
-                "-b:v", f"{br}k",
-                "-maxrate", f"{br}k",
-                "-bufsize", f"{br * 2}k",
-                "-x264-params", X264_PARAMS,
-                "-f", "rtsp",
-                "-rtsp_transport", "tcp",
-                publish_url,
-            ]
-
-            self.ff.start("ffmpeg", args)
-
-        QtCore.QTimer.singleShot(700, start_ffmpeg)
-
-        self.watchdog.start()
         self.btn_start.setEnabled(False)
         self.btn_stop.setEnabled(True)
         set_status_label(self.status, "RUNNING", True)
+        self.started.emit(True)
 
-    def _watch_processes(self) -> None:
-        if self.mt and self.mt.state() == QtCore.QProcess.NotRunning:
-            self.stop_stream()
+    def _on_service_event(self, kind: str, value: object) -> None:
+        if not self.service.is_running():
             return
-        if self.ff and self.ff.state() == QtCore.QProcess.NotRunning:
+        if kind == EVENT_MODE:
+            mode, reason = value
+            label = "PASSTHROUGH" if mode == ENCODE_COPY else "TRANSCODE"
+            self.mode_lbl.setText(f"Mode: {label} ({reason})")
+        elif kind == EVENT_STREAM_READY:
+            self.startup_lbl.setText(f"Startup: {value:.0f} ms")
+        elif kind == EVENT_STARTUP_FAILED:
+            if self.service.ff is None:
+                self.stop_stream()
+                QtWidgets.QMessageBox.critical(self, "OMNI-Link", str(value))
+            else:
+                self.startup_lbl.setText("Startup: timeout")
+        elif kind == EVENT_RESTARTING:
+            name, delay = value
+            self._failed_log = self._log_for(name)
+            set_status_label(self.status, f"RESTARTING {name}", False)
+            self.restart_lbl.setText(f"{name} restart in {delay:.1f} s")
+        elif kind == EVENT_EXITED:
+            name, _code = value
+            self._failed_log = self._log_for(name)
             self.stop_stream()
-            return
 
-    def stop_stream(self) -> None:
-        self.watchdog.stop()
-
-        if self.ff:
-            try:
-                self.ff.terminate()
-                if not self.ff.waitForFinished(1200):
-                    self.ff.kill()
-                    self.ff.waitForFinished(1200)
-            except Exception:
-                pass
-
-        if self.mt:
-            try:
-                self.mt.terminate()
-                if not self.mt.waitForFinished(1200):
-                    self.mt.kill()
-                    self.mt.waitForFinished(1200)
-            except Exception:
-                pass
-
-        if self.ff:
-            self.ff.deleteLater()
-            self.ff = None
-        if self.mt:
-            self.mt.deleteLater()
-            self.mt = None
+    def _log_for(self, name: str) -> ProcessLogPump:
+        return self.service.ff_log if name == "ffmpeg" else self.service.mt_log
+
+    @property
+    def last_startup(self) -> dict:
+        return self.service.last_startup
+
+    def stop_stream(self) -> bool:
+        """Stops asynchronously; returns False if a stop is already in flight (see `stopped`)."""
+        if self._phase == PHASE_STOPPING:
+            return False
+        self._set_phase(PHASE_STOPPING)
+        self.service.stop_async().add_done_callback(lambda _f: self.events.stopped.emit())
+        return True
 
+    def _on_stopped(self) -> None:
+        self._phase = ""
         self.btn_start.setEnabled(True)
         self.btn_stop.setEnabled(False)
+        self.mode_lbl.setText("")
         set_status_label(self.status, "STOPPED", False)
+        self.stopped.emit()
 
     def _refresh_status(self) -> None:
-        running = bool(self.mt or self.ff)
-        if running:
-            set_status_label(self.status, "RUNNING", True)
+        stats = self.service.restart_stats()
+        if not self._phase:
+            waiting = [s.name for s in stats if s.state == CHILD_BACKOFF]
+            if waiting:
+                set_status_label(self.status, f"RESTARTING {waiting[0]}", False)
+            elif self.service.is_running():
+                set_status_label(self.status, "RUNNING", True)
+            else:
+                set_status_label(self.status, "STOPPED", False)
+        if stats:
+            summary = restart_summary(stats)
+            self.restart_lbl.setText(f"Restarts: {summary}" if summary else "")
+        if self._failed_log is not None:
+            self.status.setToolTip("\n".join(self._failed_log.tail(15)))
+        self._refresh_encoder(self.service.encoder_stats.latest() if self.service.ff else None)
+        self._refresh_recorder()
+
+    def _apply_preview(self) -> None:
+        on = self.gb_preview.isChecked()
+        self.preview_view.setVisible(on)
+        if on:
+            self._preview_timer.start(max(1, 1000 // int(self.preview_fps.value())))
         else:
-            set_status_label(self.status, "STOPPED", False)
+            self._preview_timer.stop()
+            self.preview_view.set_frame(None)
+
+    def _refresh_preview(self) -> None:
+        pipe = self.service.preview
+        self.preview_view.set_frame(pipe.latest() if pipe is not None else None)
+
+    def _refresh_recorder(self) -> None:
+        r = self.service.recorder_stats()
+        if r is None:
+            self.enc_rec.setText("-")
+            self.enc_rec.setToolTip("")
+            self.enc_rec.setStyleSheet("")
+            return
+        self.enc_rec.setText(f"{r.write_kbps:.0f} kbps, queue {r.queue_peak_bytes // 1024} kB")
+        self.enc_rec.setToolTip(
+            f"{r.current or '-'}\n{r.segments} segments, {r.disk_bytes / 1e6:.0f} MB on disk"
+            + (f"\n{r.dropped_bytes // 1024} kB dropped (disk too slow)" if r.dropped_bytes else "")
+            + (f"\nCannot open segment: {r.error}" if r.error else "")
+        )
+        if r.error:
+            self.enc_rec.setText("error, retrying at next keyframe")
+        self.enc_rec.setStyleSheet("color: rgb(200, 120, 0); font-weight:700;" if r.dropped_bytes or r.error else "")
+
+    def _refresh_encoder(self, s: Optional[EncoderSample]) -> None:
+        cpu = self.service.cpu_percent()
+        self.enc_cpu.setText("-" if cpu is None else f"{cpu:.0f}%")
+        if s is None:
+            for lbl in (self.enc_fps, self.enc_bitrate, self.enc_frames, self.enc_speed):
+                lbl.setText("-")
+                lbl.setStyleSheet("")
+            return
+        stream = self.service.stream
+        target_fps = stream.fps if stream and stream.input_kind == INPUT_V4L2 else None
+        self.enc_fps.setText(f"{s.fps:.1f}" + (f" / {target_fps}" if target_fps else ""))
+        target_br = stream.target_kbps if stream and stream.renditions else int(self.bitrate.value())
+        br = "?" if s.bitrate_kbps is None else f"{s.bitrate_kbps:.0f}"
+        self.enc_bitrate.setText(f"{br} / {target_br} kbps")
+        self.enc_frames.setText(f"{s.drop_frames} / {s.dup_frames}")
+        self.enc_speed.setText("?" if s.speed is None else f"{s.speed:.2f}x")
+        warn = "color: rgb(200, 120, 0); font-weight:700;"
+        self.enc_speed.setStyleSheet(warn if s.lagging() else "")
+        self.enc_frames.setStyleSheet(warn if s.drop_frames else "")
+
+    def encoder_history(self, seconds: Optional[float] = None) -> List[EncoderSample]:
+        return self.service.encoder_stats.history(seconds)
 
     def is_running(self) -> bool:
-        return bool(self.mt or self.ff)
+        return self.service.is_running()
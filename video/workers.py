@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from PyQt5 import QtCore
+
+from omnilink.video.devices import DeviceWatcher
+
+
+class CameraWatcher(QtCore.QObject):
+    """
+    Qt front for DeviceWatcher: hotplug events arrive on the GUI thread as a queued signal.
+    """
+
+    changed = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watcher = DeviceWatcher(on_change=self.changed.emit)
+
+    def start(self) -> bool:
+        return self.watcher.start()
+
+    def stop(self) -> None:
+        self.watcher.stop()
+
+
+class VideoEvents(QtCore.QObject):
+    """
+    Qt front for VideoService: service events and start_async/stop_async completion arrive
+    on the GUI thread as queued signals. `started` carries the start() exception or None.
+    """
+
+    event = QtCore.pyqtSignal(str, object)
+    started = QtCore.pyqtSignal(object)
+    stopped = QtCore.pyqtSignal()